@@ -0,0 +1,191 @@
+def test_cached_limits():
+    import visvis as vv
+
+    class Box(vv.Wobject):
+        size = 1
+
+        def _GetLimits(self):
+            return vv.Wobject._GetLimits(self, 0, self.size, 0, 2, 0, 3)
+
+    parent = vv.Wobject(None)
+    child = Box(parent)
+    t = vv.Transform_Translate(10, 0, 0)
+    child.transformations.append(t)
+
+    xlim, ylim, zlim = parent._GetCachedLimits()
+    assert (xlim.min, xlim.max) == (10, 11)
+    assert (zlim.min, zlim.max) == (0, 3)
+    assert parent._GetCachedLimits() is parent._GetCachedLimits()
+
+    # Changing the transform of the child is detected, also by the parent
+    t.dx = 20
+    xlim, ylim, zlim = child._GetCachedLimits()
+    assert (xlim.min, xlim.max) == (20, 21)
+    t.dx = 30
+    xlim, ylim, zlim = parent._GetCachedLimits()
+    assert (xlim.min, xlim.max) == (30, 31)
+
+    # Calling Draw on the child invalidates the parent
+    child.size = 5
+    child.Draw()
+    xlim, ylim, zlim = parent._GetCachedLimits()
+    assert (xlim.min, xlim.max) == (30, 35)
+    child.size, t.dx = 1, 20
+
+    # Rotation and scaling
+    child.transformations.append(vv.Transform_Scale(2, 2, 2))
+    child.transformations.append(vv.Transform_Rotate(90, 0, 0, 1))
+    xlim, ylim, zlim = child._GetCachedLimits()
+    assert abs(xlim.min - 16) < 1e-9 and abs(xlim.max - 20) < 1e-9
+    assert abs(ylim.min - 0) < 1e-9 and abs(ylim.max - 2) < 1e-9
+
+
+def test_instanced_mesh_merged():
+    import numpy as np
+    import visvis as vv
+    from visvis.functions.solidBox import getBox
+
+    vertices, normals = getBox()
+    base = vv.BaseMesh(vertices, None, normals, verticesPerFace=4)
+    translations = np.array([(0, 0, 0), (10, 0, 0), (0, 10, 0)], np.float32)
+    m = vv.InstancedMesh(None, base, translations, scalings=2, colors=[1, 0, 0])
+
+    assert m.instanceCount == 3
+    assert m.scalings.shape == (3, 3)
+
+    # Rotate the last instance 90 degrees around the z-axis
+    q = vv.Quaternion.create_from_axis_angle(np.pi / 2, 0, 0, 1)
+    rotations = np.array([(1, 0, 0, 0)] * 3, np.float32)
+    rotations[2] = q.w, q.x, q.y, q.z
+    m.SetInstances(rotations=rotations)
+
+    vertices2, faces, normals2, values = m._GetMergedData()
+    assert vertices2.shape == (72, 3)
+    assert faces is None
+    assert values.shape == (72, 4) and tuple(values[0]) == (1, 0, 0, 1)
+    assert np.allclose(vertices2[24:48], vertices.data * 2 + (10, 0, 0))
+    expected = vertices.data[:, [1, 0, 2]] * (-2, 2, 2) + (0, 10, 0)
+    assert np.allclose(vertices2[48:], expected, atol=1e-6)
+
+    xlim, ylim, zlim = m._GetLimits()
+    assert np.allclose((xlim.min, xlim.max), (-1, 11))
+    assert np.allclose((ylim.min, ylim.max), (-1, 11))
+
+
+def test_spheres_radius():
+    import numpy as np
+    import visvis as vv
+
+    # With 3 spheres, 3 radii are one per sphere, not one per axis
+    pp = np.array([(0, 0, 0), (5, 0, 0), (0, 5, 0)], np.float32)
+    m = vv.spheres(pp, [1, 2, 3], axesAdjust=False, axes=vv.Wobject(None))
+    assert np.array_equal(m.scalings, [(1, 1, 1), (2, 2, 2), (3, 3, 3)])
+    m = vv.spheres(pp, 2, axesAdjust=False, axes=vv.Wobject(None))
+    assert (m.scalings == 2).all()
+
+
+def test_mesh_batch():
+    import numpy as np
+    import visvis as vv
+
+    from visvis.functions.solidBox import getBox
+
+    vertices, normals = getBox()
+    batch = vv.MeshBatch(None)
+    m1 = vv.Mesh(batch, vertices, normals=normals, verticesPerFace=4)
+    m2 = vv.Mesh(batch, vertices, normals=normals, verticesPerFace=4)
+    m3 = vv.Mesh(batch, vertices, normals=normals, verticesPerFace=4)
+    m2.transformations.append(vv.Transform_Translate(10, 0, 0))
+    m3.faceShading = "flat"
+    assert batch.batchCount == 2
+
+    # The merged data has the transformations applied
+    b1 = batch._batches[batch._signatures[m1][0]]
+    b3 = batch._batches[batch._signatures[m3][0]]
+    n = len(vertices)
+    assert len(b1._vertices) == 2 * n and b1._faces is None
+    assert np.allclose(b1._vertices[n:], vertices.data + (10, 0, 0))
+
+    # Hiding a part only changes the faces of its batch
+    v1 = b1._vertices
+    m2.visible = False
+    batch._SyncBatches()
+    assert list(b1._faces) == list(range(n))
+    assert batch._batches[batch._signatures[m1][0]] is b1
+    assert b1._vertices is v1
+
+    # Changing a mesh only rebuilds its batch
+    v3 = b3._vertices
+    m1.SetVertices(vertices.data * 2)
+    batch._SyncBatches()
+    assert np.allclose(b1._vertices[:n], vertices.data * 2)
+    assert b3._vertices is v3
+
+    # Data that is changed in place is detected once Draw() is called
+    expected = m3._vertices + 1
+    m3._vertices[:] += 1
+    m3.Draw()
+    batch._SyncBatches()
+    assert np.allclose(b3._vertices, expected)
+
+    # Changing the transformation of a mesh is detected without Draw()
+    m2.transformations[0].dx = 20
+    batch._CheckSync()
+    assert np.allclose(b1._vertices[n:], m2._vertices + (20, 0, 0))
+
+
+def test_axis_ticks():
+    from visvis.core.axises import GetTicks, GetTickTexts
+    from visvis.core.misc import Range
+    from visvis.utils.pypoints import Point
+
+    p0, p1 = Point(0, 0, 0), Point(400, 0, 0)
+    ticks, positions, texts = GetTicks(p0, p1, Range(0, 1))
+    assert len(ticks) == 11 and texts[0] == "0.0" and texts[-1] == "1.0"
+    assert abs(positions[3].x - 120) < 1e-3
+
+    # Ticks have the same value when panning, so text objects can be reused
+    ticks2, _, texts2 = GetTicks(p0, p1, Range(0.25, 1.25))
+    assert ticks2[0] == ticks[3] and texts2[-1] == "1.2"
+    assert GetTickTexts(ticks2) == texts2
+    assert GetTickTexts([1e10, 2e10]) == ["1.000e+10", "2.000e+10"]
+
+
+def test_axis_grid_lines():
+    import numpy as np
+    from visvis.core.axises import GetGridLines
+    from visvis.utils.pypoints import Point
+
+    corner, gv1, gv2 = Point(0, 0, 0), Point(0, 5, 0), Point(0, 0, 2)
+    pp = GetGridLines(corner, 0, [1, 3], gv1, gv2)
+    assert pp.shape == (8, 3)
+    assert np.allclose(pp[:4], [(1, 0, 0), (1, 5, 0), (1, 5, 0), (1, 5, 2)])
+    assert np.allclose(pp[4:, 0], 3)
+
+
+def test_text_batch():
+    import numpy as np
+    from visvis.text.text_base import FontManager
+
+    class RecordingFontManager(FontManager):
+        def _DrawBatch(self, texture, vertices, texcords, colors):
+            self.drawn.append((texture, vertices, texcords, colors))
+
+    fm = RecordingFontManager()
+    fm.drawn = []
+    vertices = np.zeros((4, 3), np.float32)
+    texcords = np.ones((4, 2), np.float32)
+    assert not fm._AddToBatch("atlas", vertices, texcords, (1, 0, 0), 0, 0, 0)
+
+    fm.BeginBatch()
+    assert fm._AddToBatch("atlas", vertices, texcords, (1, 0, 0), 10, 20, 0.5)
+    fm._AddToBatch("atlas", vertices + 1, texcords, (0, 1, 0), 0, 0, 0)
+    fm._AddToBatch("atlas", vertices[:0], texcords[:0], (0, 0, 1), 0, 0, 0)
+    fm.EndBatch()
+
+    assert len(fm.drawn) == 1
+    texture, vertices2, texcords2, colors = fm.drawn[0]
+    assert vertices2.shape == (8, 3) and texcords2.shape == (8, 2)
+    assert tuple(vertices2[0]) == (10, 20, 0.5) and tuple(vertices2[4]) == (1, 1, 1)
+    assert tuple(colors[3]) == (1, 0, 0) and tuple(colors[4]) == (0, 1, 0)
+    assert (vertices == 0).all()  # The final data of the text is not changed
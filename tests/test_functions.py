@@ -15,3 +15,667 @@ def test_mesh_read_write():
     m = vv.meshRead("bunny.ssdf")
     assert isinstance(m, vv.BaseMesh)
     vv.meshWrite(os.path.expanduser("~/bunny2.stl"), m)
+
+
+def test_isosurface_blocks(monkeypatch):
+    import numpy as np
+    import pytest
+
+    pytest.importorskip("skimage")
+    import visvis as vv
+    from visvis.utils.iso import BlockIsosurface
+
+    z, y, x = np.mgrid[:40, :30, :50]
+    vol = np.sin(x / 5.0) + np.cos(y / 4.0) + np.sin(z / 6.0)
+
+    for step in (1, 2):
+        m1 = vv.isosurface(vol, 0.5, step)
+        m2 = vv.isosurface(vol, 0.5, step, blockSize=16)
+        assert len(m2._faces) == len(m1._faces)
+        assert np.allclose(m2._vertices.min(0), m1._vertices.min(0))
+        assert np.allclose(m2._vertices.max(0), m1._vertices.max(0))
+
+    # Blocks are cached per isovalue
+    iso = BlockIsosurface(vol, 16)
+    m = iso.GetMesh(0.5)
+    assert len(iso._cache) > 0
+    assert iso._Submit(0.5) == {}
+    assert len(iso.GetMesh(0.5)._faces) == len(m._faces)
+
+    # Blocks without surface are skipped, other errors are raised
+    with pytest.raises(RuntimeError):
+        iso.GetMesh(vol.max())
+    iso.Close()
+
+    def marching_cubes(*args, **kwargs):
+        raise ValueError("Invalid spacing.")
+
+    monkeypatch.setattr(vv.utils.iso, "marching_cubes", marching_cubes)
+    iso = BlockIsosurface(vol, 16)
+    with pytest.raises(ValueError):
+        iso.GetMesh(0.5)
+    iso.Close()
+
+
+def test_stl_read_write(tmp_path):
+    import numpy as np
+    import visvis as vv
+    from visvis.vvio.stl import StlReader, StlWriter
+
+    vertices = np.random.normal(0, 1, (300, 3)).astype(np.float32)
+    for bin in (True, False):
+        fname = str(tmp_path / "mesh.stl")
+        StlWriter.write(fname, vertices, "test", bin)
+        m = vv.meshRead(fname)
+        assert np.allclose(m._vertices, vertices, atol=1e-5)
+        m = StlReader.read(fname, check=True)
+        assert np.allclose(m._vertices, vertices, atol=1e-5)
+
+    # A binary file whose header starts with "solid"
+    StlWriter.write(fname, vertices, "test", True)
+    data = open(fname, "rb").read()
+    open(fname, "wb").write(b"solid" + data[5:])
+    m = StlReader.read(fname)
+    assert np.array_equal(m._vertices, vertices)
+
+    # An ascii file with lowercase exponents and another layout
+    text = "solid test\n"
+    for face in vertices.reshape(-1, 3, 3)[:4]:
+        text += "facet normal 0 0 1 outer loop\n"
+        text += "".join("  vertex %e %e %e\n" % tuple(v) for v in face)
+        text += "endloop endfacet\n"
+    open(fname, "wb").write(text.encode("ascii") + b"endsolid test\n")
+    m = StlReader.read(fname)
+    assert np.allclose(m._vertices, vertices[:12], atol=1e-5)
+
+    # Unsigned exponents, uppercase keywords, and facets without a normal
+    face = "facet normal 0 0 1\nouter loop\n%s%s%sendloop\nendfacet\n" % (
+        "vertex 1e5 0 0\n",
+        "vertex 0 2.5E-1 0\n",
+        "vertex 0 0 3\n",
+    )
+    expected = [(1e5, 0, 0), (0, 0.25, 0), (0, 0, 3)] * 2
+    for text in [face, face.upper(), face.replace(" 0 0 1", "")]:
+        text = "solid test\n" + text * 2 + "endsolid test\n"
+        open(fname, "wb").write(text.encode("ascii"))
+        m = StlReader.read(fname)
+        assert np.allclose(m._vertices, expected)
+
+
+def test_obj_read_write(tmp_path):
+    import numpy as np
+    import visvis as vv
+    from visvis.vvio.wavefront import WavefrontReader
+
+    # Faces with different indices for vertices, texcords and normals
+    fname = str(tmp_path / "mesh.obj")
+    with open(fname, "wb") as f:
+        f.write(b"v 0 0 0\nv 1 0 0\nv 0 1 0\nv 1 1 0\nvt 0 0\nvt 1 1\n")
+        f.write(b"vn 0 0 1\nvn 0 0 -1\nf 1/1/1 2/2/1 3/1/2\nf 2/2/1 4/1/1 3/1/2\n")
+    m = vv.meshRead(fname)
+    assert m._faces.tolist() == [0, 1, 2, 1, 3, 2]
+    assert m._vertices[3].tolist() == [1, 1, 0]
+    assert m._normals[:, 2].tolist() == [1, 1, -1, 1]
+    assert m._values.tolist() == [[0, 0], [1, 1], [0, 0], [0, 0]]
+
+    # Round trip, and read from cache
+    vv.meshWrite(fname, m)
+    m2 = WavefrontReader.read(fname, cache=True)
+    m3 = WavefrontReader.read(fname, cache=True)
+    assert os.path.isfile(fname + ".cache.bsdm")
+    for m in (m2, m3):
+        assert np.array_equal(m._vertices, m2._vertices)
+        assert np.array_equal(m._faces, [0, 1, 2, 1, 3, 2])
+        assert np.array_equal(m._values, m2._values)
+
+
+def test_bsdm_read_write(tmp_path):
+    import numpy as np
+    import visvis as vv
+    from visvis.vvio.bsdm import BsdmReader, BsdmWriter
+
+    # Round trip, with the smallest dtype for the faces and normals
+    m = vv.meshRead("bunny.ssdf")
+    fname = str(tmp_path / "bunny.bsdm")
+    BsdmWriter.write(fname, m, lods=2)
+    m2 = vv.meshRead(fname)
+    assert isinstance(m2._vertices, np.memmap)
+    assert np.array_equal(m2._vertices, m._vertices)
+    assert np.array_equal(m2._faces, m._faces)
+    assert m2._faces.dtype == np.uint16
+    assert m2._normals is not None
+    s = vv.ssdf.load(fname)
+    assert np.allclose(s.bbox, [m._vertices.min(0), m._vertices.max(0)])
+
+    # Levels of detail
+    m3, m4 = BsdmReader.read(fname, lod=1), BsdmReader.read(fname, lod=2)
+    assert len(m._faces) > len(m3._faces) > len(m4._faces) > 0
+    assert m4._faces.max() < len(m4._vertices)
+
+    # Cache next to an STL file, which is refreshed when the file changes
+    fname = str(tmp_path / "mesh.stl")
+    vv.meshWrite(fname, m)
+    m5 = vv.meshRead(fname, cache=True)
+    assert os.path.isfile(fname + ".cache.bsdm")
+    m6 = vv.meshRead(fname, cache=True)
+    assert isinstance(m6._normals, np.memmap)
+    assert np.array_equal(m6._vertices, m5._vertices)
+    vv.meshWrite(fname, m4)
+    m7 = vv.meshRead(fname, cache=True)
+    assert len(m7._vertices) == len(m4._faces)
+
+
+def test_ssdf_mmap(tmp_path):
+    import numpy as np
+    import visvis as vv
+
+    s = vv.ssdf.new()
+    s.vol = np.random.rand(20, 30, 40).astype(np.float32)
+    s.sub = vv.ssdf.new()
+    s.sub.vertices = np.random.rand(100, 3)
+    s.sub.items = [1, "a", np.arange(3)]
+    s.empty = np.zeros((0, 3), np.int16)
+
+    fname = str(tmp_path / "test.bsdf")
+    vv.ssdf.save(fname, s, compress=False)
+    assert open(fname, "rb").read(4) == b"BSDR"
+
+    # Arrays are memory mapped and aligned, sub-structs are loaded lazily
+    s2 = vv.ssdf.load(fname)
+    assert "sub" in s2 and not vv.ssdf.isstruct(s2.__dict__["sub"])
+    assert isinstance(s2.vol, np.memmap) and s2.vol.ctypes.data % 64 == 0
+    assert s2 == s
+    assert vv.ssdf.loadb(vv.ssdf.saveb(s, False)) == s
+
+    # Loading without mapping, and via volread
+    assert vv.ssdf.load(fname, False) == s
+    assert (vv.volread(fname) == s.vol).all()
+
+    # Modify a mapped struct and save it to the same file
+    s2.vol[0] = 7
+    s2.extra = "x"
+    vv.ssdf.save(fname, s2, compress=False)
+    s3 = vv.ssdf.load(fname)
+    assert (s3.vol[0] == 7).all() and (s3.vol[1:] == s.vol[1:]).all()
+    assert s3.extra == "x" and s3.sub == s.sub
+    assert os.listdir(str(tmp_path)) == ["test.bsdf"]
+
+
+def test_ssdf_partitions():
+    import numpy as np
+    import visvis as vv
+    from visvis.utils.ssdf import ssdf_bin
+
+    # Multiple partitions, compressed in parallel. The original format is
+    # used by default, the codec is stored in the header otherwise.
+    s = vv.ssdf.new()
+    s.vol = np.random.randint(0, 9, (40, 256, 256)).astype(np.uint8)
+    bb = vv.ssdf.saveb(s)
+    assert bb[:4] == b"BSDF" and vv.ssdf.loadb(bb) == s
+    assert vv.ssdf.saveb(s, False)[:4] == b"BSDR"
+    bb = vv.ssdf.saveb(s, "zlib", True)
+    assert bb[:9] == b"BSDI\x04zlib" and vv.ssdf.loadb(bb) == s
+    bb = vv.ssdf.saveb(s, "lz4")
+    if "lz4" in ssdf_bin._CODECS:
+        assert bb[:8] == b"BSDI\x03lz4"
+    else:
+        assert bb[:4] == b"BSDF"
+    assert vv.ssdf.loadb(bb) == s
+
+    # Seek using the index
+    data = s.vol.tobytes()
+    f = ssdf_bin._VirtualFile()
+    fc = ssdf_bin._CompressedFile(f, "zlib")
+    fc.write(data)
+    fc.flush()
+    fc = ssdf_bin._CompressedFile(ssdf_bin._VirtualFile(f.get_bytes()), "zlib")
+    for pos in [2**21 + 7, 3, len(data) - 4]:
+        fc.seek(pos)
+        assert fc.read(4) == data[pos : pos + 4]
+
+    # Files without codec and index can still be read
+    f = ssdf_bin._VirtualFile()
+    f.write(b"BSDF")
+    fc = ssdf_bin._CompressedFile(f)
+    fc.write(b"N\x00\x01a\x00")
+    fc.flush()
+    assert vv.ssdf.loadb(f.get_bytes()).a is None
+
+
+def test_ssdf_update_iterload(tmp_path, monkeypatch):
+    import zlib
+    import numpy as np
+    import visvis as vv
+    from visvis.utils.ssdf import ssdf_bin
+
+    # Count the partitions that are decompressed
+    decompressed = []
+
+    def decompress(data):
+        decompressed.append(len(data))
+        return zlib.decompress(data)
+
+    monkeypatch.setattr(ssdf_bin, "_PARTITION_SIZE", 2**12)
+    monkeypatch.setitem(ssdf_bin._CODECS, "zlib", (zlib.compress, decompress))
+
+    # Update keeps the codec and index
+    fname = str(tmp_path / "test.bsdf")
+    s = vv.ssdf.new()
+    s.big = np.random.randint(0, 9, 2**18).astype(np.uint8)
+    vv.ssdf.save(fname, s, compress="zlib", index=True)
+    vv.ssdf.update(fname, {"frames": [1, 2, 3]})
+    assert open(fname, "rb").read(9) == b"BSDI\x04zlib"
+
+    # Iterating over a list skips the other items, using the index
+    decompressed[:] = []
+    assert list(vv.ssdf.iterload(fname, "frames")) == [1, 2, 3]
+    assert len(decompressed) < 4
+    assert np.array_equal(vv.ssdf.load(fname).big, s.big)
+    assert len(decompressed) > 64
+
+
+def test_ssdf_text_arrays():
+    import numpy as np
+    import visvis as vv
+
+    s = vv.ssdf.loads("a = array 2x2 float32 1.5,2,3,-4e3\n")
+    assert s.a.dtype == np.float32 and s.a.tolist() == [[1.5, 2], [3, -4000]]
+
+    # Numbers that cannot be parsed or represented become 0 or nan
+    assert vv.ssdf.loads("a = array 2 uint8 300,4\n").a.tolist() == [0, 4]
+    assert vv.ssdf.loads("a = array 3 int16 1,x,3\n").a.tolist() == [1, 0, 3]
+    a = vv.ssdf.loads("a = array 2 float32 1e50,4\n").a
+    assert np.isnan(a[0]) and a[1] == 4
+
+
+def test_ssdf_stream(tmp_path):
+    import numpy as np
+    import visvis as vv
+
+    for compress in (True, False):
+        fname = str(tmp_path / "log.bsdf")
+        with vv.ssdf.StreamWriter(fname, compress) as w:
+            w.write("meta", {"rate": 10, "sub": {"x": [1, 2]}})
+            for i in range(20):
+                w.append("frames", np.full((8, 8), i, np.uint16))
+                w.append("times", i * 0.5)
+
+        # Readable by load(), with the interleaved lists joined
+        assert open(fname, "rb").read(4) == (b"BSDF" if compress else b"BSDR")
+        s = vv.ssdf.load(fname)
+        assert s.meta.sub.x == [1, 2] and s.meta.rate == 10
+        assert len(s.frames) == 20 and s.frames[7][0, 0] == 7
+        assert s.times == [i * 0.5 for i in range(20)]
+
+        # Iterate lazily
+        names = [name for name, value in vv.ssdf.iterload(fname)]
+        assert names[:3] == ["meta", "frames", "times"] and len(names) == 41
+        frames = list(vv.ssdf.iterload(fname, "frames"))
+        assert [frame[0, 0] for frame in frames] == list(range(20))
+
+
+def test_volume_source(tmp_path):
+    import time
+    import numpy as np
+    import visvis as vv
+
+    vol = np.random.randint(0, 1000, (50, 40, 30)).astype(np.int16)
+    fname = str(tmp_path / "vol.raw")
+    vol.tofile(fname)
+
+    vs = vv.volread(fname, lazy=True, shape=vol.shape, dtype="int16", slabSize=4)
+    assert vs.shape == vol.shape and vs.dtype == vol.dtype and vs.ndim == 3
+    assert vs.sampling == (1, 1, 1) and not vs._cache
+
+    # Indexing reads slabs on demand
+    assert (vs[7] == vol[7]).all() and sorted(vs._cache) == [1]
+    assert (vs[5:23, 2] == vol[5:23, 2]).all()
+    assert (vs[:, :, 4] == vol[:, :, 4]).all()
+    assert (vs[::7] == vol[::7]).all() and (np.asarray(vs) == vol).all()
+
+    # Slabs in the direction of motion are prefetched
+    vs.Close()
+    vs[20], vs[24]
+    for i in range(100):
+        if 7 in vs._cache:
+            break
+        time.sleep(0.01)
+    assert 7 in vs._cache and 8 in vs._cache
+    vs.Close()
+
+    # Ssdf files store sampling
+    fname = str(tmp_path / "vol.bsdf")
+    vv.ssdf.save(fname, {"vol": vol, "sampling": [2, 1, 1]}, compress=False)
+    vs = vv.volread(fname, lazy=True)
+    assert vs.sampling == (2, 1, 1) and (vs[-1] == vol[-1]).all()
+
+    # For a volume that does not fit in the cache, an x-slice only reads
+    # the indexed part of each slab
+    class Source:
+        def __init__(self, data):
+            self.data, self.shape, self.dtype = data, data.shape, data.dtype
+            self.bytesRead = 0
+
+        def __getitem__(self, index):
+            part = np.array(self.data[index])
+            self.bytesRead += part.nbytes
+            return part
+
+    source = Source(np.memmap(str(tmp_path / "vol.raw"), np.int16, "r", 0, vol.shape))
+    vs = vv.VolumeSource(source, slabSize=4, cacheSize=0.01, prefetch=0)
+    assert (vs[:, :, 4] == vol[:, :, 4]).all()
+    assert source.bytesRead == vol[:, :, 4].nbytes
+
+
+def test_ims_read_write(tmp_path):
+    import numpy as np
+    from visvis.vvmovie import images2ims
+
+    # Write from a generator, read back in order
+    ims = [np.full((8, 10), i, np.uint8) for i in range(25)]
+    fname = str(tmp_path / "ims" / "im*.png")
+    assert images2ims.writeIms(fname, (im for im in ims), workers=3) == 25
+    for workers in (1, 3):
+        ims2 = images2ims.readIms(fname, workers=workers)
+        assert [im[0, 0] for im in ims2] == list(range(25))
+    frames = images2ims.iterIms(fname)
+    assert next(frames).shape == (8, 10)
+
+
+FAKE_FFMPEG = """
+import sys
+args = sys.argv[1:]
+src = args[args.index("-i") + 1]
+if src == "-":  # Write: store size and raw frames
+    size = args[args.index("-s") + 1].encode()
+    with open(args[-1], "wb") as f:
+        f.write(size + b"\\n" + sys.stdin.buffer.read())
+else:  # Read: report the size and write raw frames
+    with open(src, "rb") as f:
+        size, data = f.read().split(b"\\n", 1)
+    w, h = size.decode().split("x")
+    sys.stderr.write("Input #0, matroska, from '%s':\\n" % src)
+    sys.stderr.write("  Stream #0:0: Video: h264, yuv420p, %sx%s, 10 fps\\n" % (h, w))
+    sys.stderr.write("    Side data: displaymatrix: rotation of -90.00 degrees\\n")
+    sys.stderr.write("Output #0, rawvideo, to 'pipe:':\\n")
+    sys.stderr.write("  Stream #0:0: Video: rawvideo, rgb24(pc), %sx%s, 10 fps\\n" % (w, h))
+    sys.stderr.flush()
+    sys.stdout.buffer.write(data)
+"""
+
+
+def test_avi_pipes(tmp_path, monkeypatch):
+    import sys
+    import numpy as np
+    from visvis.vvmovie import images2avi
+
+    script = tmp_path / "ffmpeg.py"
+    script.write_text(FAKE_FFMPEG)
+    monkeypatch.setattr(images2avi, "FFMPEG_EXE", [sys.executable, str(script)])
+
+    # Frames are streamed through the pipes unchanged
+    ims = [np.random.randint(0, 256, (6, 8, 3)).astype(np.uint8) for i in range(20)]
+    fname = str(tmp_path / "movie.mkv")
+    images2avi.writeAvi(fname, iter(ims), queueSize=2)
+    ims2 = images2avi.readAvi(fname, queueSize=2)
+    assert len(ims2) == 20
+    assert all(np.array_equal(im1, im2) for im1, im2 in zip(ims, ims2))
+
+    # Stop reading early
+    frames = images2avi.iterAvi(fname, queueSize=1)
+    assert np.array_equal(next(frames), ims[0])
+    frames.close()
+
+
+def test_movie_stream_writers(tmp_path):
+    import numpy as np
+    from visvis.vvmovie import movieWriter, readGif, readSwf
+
+    ims = [np.random.rand(20, 30, 3).astype(np.float32) for i in range(4)]
+    for ext in (".gif", ".swf"):
+        fname = str(tmp_path / ("movie" + ext))
+        with movieWriter(fname, 0.1) as writer:
+            for im in ims:
+                writer.AddFrame(im)
+        assert writer.count == 4
+        ims2 = readGif(fname) if ext == ".gif" else readSwf(fname)
+        assert len(ims2) == 4
+        assert ims2[0].shape[:2] == (20, 30)
+    assert np.array_equal(ims2[2][:, :, :3], (ims[2] * 255).astype(np.uint8))
+
+    # An empty stream raises without leaving a truncated file behind
+    import pytest
+    from visvis.vvmovie import movieWrite
+
+    for ext in (".gif", ".swf"):
+        fname = tmp_path / ("empty" + ext)
+        with pytest.warns(UserWarning), pytest.raises(ValueError):
+            movieWrite(str(fname), iter([]))
+        assert not fname.exists()
+
+
+def test_swf_bits(tmp_path):
+    import numpy as np
+    from visvis.vvmovie import images2swf
+
+    assert str(images2swf.intToBits(5, 8)) == "00000101"
+    assert str(images2swf.signedIntToBits(-3, 6)) == "111101"
+    assert images2swf.twitsToBits([0, 10]).ToBytes() == b"H\x01\x90"
+    assert images2swf.getTypeAndLen(b"\x3f\x09\x10\x00\x00\x00") == (36, 16, 22)
+
+    # ARGB packing round trips for RGBA images
+    ims = [np.random.randint(0, 256, (10, 12, 4)).astype(np.uint8) for i in range(2)]
+    fname = str(tmp_path / "movie.swf")
+    images2swf.writeSwf(fname, ims)
+    for im1, im2 in zip(ims, images2swf.readSwf(fname)):
+        assert np.array_equal(im1, im2)
+
+
+def test_gif_neuquant():
+    import numpy as np
+    from PIL import Image
+    from visvis.vvmovie.images2gif import GifWriter, NeuQuant
+
+    y, x = np.mgrid[0:60, 0:80]
+    ims = [np.dstack([x * 3, y * 4, x * 0 + 50 * i]).astype(np.uint8) for i in range(3)]
+
+    # The palette approximates the colors
+    im = Image.fromarray(ims[0]).convert("RGBA")
+    nq = NeuQuant(im, 10)
+    q = nq.quantize(im)
+    palette = np.array(q.getpalette()[:768]).reshape(-1, 3)
+    assert np.abs(palette[np.asarray(q)] - ims[0]).mean() < 8
+    assert nq.getLUT().shape == (32, 32, 32)
+
+    # Converting in parallel gives the same result
+    gifWriter = GifWriter()
+    ims1 = gifWriter.convertImagesToPIL(ims, False, 10, workers=1)
+    ims2 = gifWriter.convertImagesToPIL(ims, False, 10, workers=3)
+    for im1, im2 in zip(ims1, ims2):
+        assert im1.tobytes() == im2.tobytes()
+        assert im1.getpalette() == im2.getpalette()
+
+
+def test_gif_shared_palette(tmp_path):
+    import numpy as np
+    from visvis.vvmovie.images2gif import writeGif, readGif
+
+    y, x = np.mgrid[0:60, 0:80]
+    ims = []
+    for i in range(6):
+        im = np.dstack([x * 3, y * 4, x * 0 + 50]).astype(np.uint8)
+        im[20:30, i * 10 : i * 10 + 10] = 255
+        ims.append(im)
+
+    # All frames use the global palette, so there are no local palettes
+    fname1, fname2 = str(tmp_path / "a.gif"), str(tmp_path / "b.gif")
+    writeGif(fname1, ims)
+    writeGif(fname2, ims, sharedPalette=True)
+    with open(fname2, "rb") as f:
+        assert f.read()[10] & 0x80  # global color table flag
+    assert os.path.getsize(fname2) < os.path.getsize(fname1)
+
+    ims2 = readGif(fname2)
+    assert len(ims2) == len(ims)
+    for im1, im2 in zip(ims, ims2):
+        assert np.abs(im2[:, :, :3].astype(float) - im1).mean() < 8
+
+
+def test_gif_shared_pipeline(tmp_path, monkeypatch):
+    import numpy as np
+    from visvis.vvmovie import images2gif
+
+    # Count the frames that are quantized before the first one is written
+    quantized, counts = [], []
+    lookup = images2gif.PaletteLUT.lookup
+    writeFrame = images2gif.GifWriter.writeFrame
+
+    def countingLookup(self, im):
+        quantized.append(im)
+        return lookup(self, im)
+
+    def countingWriteFrame(self, *args, **kwargs):
+        counts.append(len(quantized))
+        return writeFrame(self, *args, **kwargs)
+
+    monkeypatch.setattr(images2gif, "_MAX_WORKERS", 1)
+    monkeypatch.setattr(images2gif.PaletteLUT, "lookup", countingLookup)
+    monkeypatch.setattr(images2gif.GifWriter, "writeFrame", countingWriteFrame)
+
+    ims = [np.random.randint(0, 256, (8, 10, 3)).astype(np.uint8) for i in range(20)]
+    images2gif.writeGif(str(tmp_path / "a.gif"), ims, sharedPalette=True)
+    assert len(counts) == 20 and counts[0] <= 5
+
+
+def test_screenshot_upscale():
+    import numpy as np
+    from visvis.functions.screenshot import upscale
+
+    im = np.random.rand(23, 31, 3).astype(np.float32) * 0.5 + 0.25
+    im2 = upscale(im, 3)
+    assert im2.shape == (67, 91, 3) and im2.dtype == np.float32
+    assert np.allclose(im2[::3, ::3], im)
+
+    # Linear gradients are reproduced (away from the edges)
+    ramp = np.tile(np.linspace(0, 1, 31, dtype=np.float32), (23, 1))
+    expected = np.linspace(0, 1, 61)[2:-2]
+    assert np.allclose(upscale(ramp, 4)[:, 4:-4:2], expected, atol=1e-5)
+
+    # Tiling does not matter, uint8 gives nearly the same result
+    assert np.array_equal(upscale(im, 3, tileSize=1000), im2)
+    im3 = upscale((im * 255).round().astype(np.uint8), 3, dtype=np.uint8)
+    assert np.abs(im3 / 255.0 - im2).max() < 0.01
+
+
+def test_getframe_read(monkeypatch):
+    import importlib
+    import numpy as np
+    import pytest
+
+    module = importlib.import_module("visvis.functions.getframe")
+
+    # Fake OpenGL, the value of each pixel is its row in OpenGL coordinates
+    calls = []
+
+    def glReadPixels(x, y, w, h, format, type, out):
+        calls.append((x, y, w, h))
+        out[:] = (y + np.arange(h)).reshape(-1, 1, 1)
+
+    monkeypatch.setattr(module.gl, "glReadPixels", glReadPixels)
+    monkeypatch.setattr(module.gl, "glPixelStorei", lambda *args: None)
+    monkeypatch.setattr(module, "_getFrameRect", lambda ob, fig, pr: (10, 20, 50, 40))
+
+    # The crop rectangle has its origin at the top-left
+    im = module._readFrame(None, None, 1, np.uint8, crop=(5, 10, 20, 15))
+    assert calls[-1] == (15, 35, 20, 15)
+    assert im.shape == (15, 20, 3) and im.dtype == np.uint8
+    assert list(im[:, 0, 0]) == list(range(49, 34, -1))
+    with pytest.raises(ValueError):
+        module._readFrame(None, None, 1, crop=(40, 10, 20, 15))
+
+    # Reading into a given array, with or without flipping
+    out = np.empty((40, 50, 4), np.float32)
+    assert module._readFrame(None, None, 1, alpha=True, out=out) is out
+    assert list(out[:, 0, 0]) == list(range(59, 19, -1))
+    im = module._readFrame(None, None, 1, alpha=True, out=out, copy=False)
+    assert im.base is out and out[0, 0, 0] == 20 and im[0, 0, 0] == 59
+    for out in [np.empty((40, 50, 3), np.float32), np.empty((40, 50, 4), np.uint8)]:
+        with pytest.raises(ValueError):
+            module._readFrame(None, None, 1, alpha=True, out=out)
+    with pytest.raises(ValueError):
+        module._readFrame(None, None, 1, out=np.empty((40, 100, 3), np.float32)[:, ::2])
+
+    # Rows are flipped in blocks
+    im = np.arange(14).reshape(7, 2)
+    module._flipRows(im, 2)
+    assert np.array_equal(im, np.arange(14).reshape(7, 2)[::-1])
+
+
+def test_recorder(monkeypatch):
+    import importlib
+    import threading
+    import numpy as np
+    import visvis as vv
+    from visvis.core.events import BaseEvent
+
+    module = importlib.import_module("visvis.functions.record")
+    getframe = importlib.import_module("visvis.functions.getframe")
+
+    # RGBA frames, stored bottom to top as read by OpenGL
+    ims = [np.random.randint(0, 256, (6, 8, 4)).astype(np.uint8) for i in range(8)]
+    grabbed = []
+
+    class FakeGrabber:
+        def Grab(self, rect):
+            grabbed.append(rect)
+            return [(ims[len(grabbed) - 1][::-1].tobytes(), 8, 6)]
+
+        def Finish(self):
+            return []
+
+        def Release(self):
+            pass
+
+    class FakeFigure:
+        _devicePixelRatio = 1
+
+        def __init__(self):
+            self.eventAfterDraw = BaseEvent(self)
+
+        def GetFigure(self):
+            return self
+
+        def _SetCurrent(self):
+            pass
+
+    monkeypatch.setattr(module, "_FrameGrabber", FakeGrabber)
+    monkeypatch.setattr(getframe, "_getFrameRect", lambda ob, fig, pr: (0, 0, 8, 6))
+
+    # Only every n-th draw is captured, frames are flipped and made RGB
+    fig = FakeFigure()
+    rec = module.Recorder(fig, every=2)
+    for i in range(7):
+        fig.eventAfterDraw.Fire()
+    frames = rec.GetFrames()
+    assert len(grabbed) == 4 and rec.count == 4 and rec.dropped == 0
+    assert all(np.array_equal(im1, im2[:, :, :3]) for im1, im2 in zip(frames, ims))
+    assert frames[0].flags.c_contiguous
+    rec.Close()
+
+    # Frames that do not fit in the queue are dropped, and not counted
+    grabbed[:] = []
+    rec = module.Recorder(fig, queueSize=2)
+    rec._thread = threading.Thread(target=rec._Work)
+    for i in range(4):
+        fig.eventAfterDraw.Fire()
+    assert rec.count == 2 and rec.dropped == 2
+    rec._thread.start()
+    assert len(rec.GetFrames()) == 2
+
+    # Export passes the frames and arguments on to movieWrite
+    calls = []
+    monkeypatch.setattr(vv, "movieWrite", lambda *args, **kwargs: calls.append(args))
+    rec.Export("movie.gif", 0.5, False)
+    assert calls[0][0] == "movie.gif" and calls[0][2:] == (0.5, False)
+    assert len(calls[0][1]) == 2
+    rec.Close()
@@ -130,3 +130,31 @@ def test_statistics():
     assert d.percentile(0.7)
     assert d.histogram()
     assert d.kde()
+
+
+def test_line2mesh_batch():
+    import numpy as np
+    import visvis as vv
+    from visvis.processing.lineToMesh import getSpanVectors, getSpanVectorsAlongLine
+
+    # Span vectors transported along the line match doing it step by step
+    normals = np.random.normal(0, 1, (500, 3))
+    normals /= np.sqrt((normals**2).sum(1)).reshape(-1, 1)
+    normals[100:110] = 0, 0, 1  # degenerate steps
+    normals[105] = 0, 1, 0
+    aa, bb = getSpanVectorsAlongLine(normals)
+    a, b = np.array([0.0, 0.0, 1.0]), np.array([0.0, 1.0, 0.0])
+    for i in range(len(normals)):
+        a, b = getSpanVectors(normals[i], a, b)
+        assert np.allclose(a, aa[i]) and np.allclose(b, bb[i])
+
+    # Multiple lines in one mesh
+    pp1 = vv.Pointset(np.random.normal(0, 10, (20, 3)).astype(np.float32))
+    pp2 = vv.Pointset(np.random.normal(0, 10, (30, 3)).astype(np.float32))
+    m1 = vv.processing.lineToMesh(pp1, 1, 8)
+    m2 = vv.processing.lineToMesh(pp2, 2, 8)
+    m = vv.processing.lineToMesh([pp1, pp2], [1, 2], 8)
+    n1 = len(m1._vertices)
+    assert len(m._vertices) == n1 + len(m2._vertices)
+    assert np.allclose(m._vertices[n1:], m2._vertices)
+    assert (m._faces[len(m1._faces) :] == m2._faces + n1).all()
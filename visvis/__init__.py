@@ -52,6 +52,7 @@ __version__ = "1.15.0"
 
 # Loose sub-modules and sub-packages
 from visvis.utils.pypoints import Point, Pointset, Aarray, Quaternion
+from visvis.utils.volumeSource import VolumeSource
 from visvis.utils import ssdf
 
 # The core
@@ -12,6 +12,7 @@ by the Axes.
 """
 
 import OpenGL.GL as gl
+import numpy as np
 
 from visvis.utils.pypoints import Pointset
 
@@ -32,6 +33,10 @@ from visvis.core.axises import BaseAxis, CartesianAxis, PolarAxis2D
 from visvis.core.light import Light
 
 
+# Culling tests against a frustum that is this much larger than the view
+_CULLING_MARGIN = 1.05
+
+
 def _Screenshot():
     """_Screenshot()
 
@@ -185,6 +190,9 @@ class Axes(base.Wibject):
         self._motionBlur = 0.0
         self._useBuffer = True
 
+        # whether to skip drawing wobjects that are outside of the view
+        self._frustumCulling = True
+
         # varialble to keep track of the position correction to fit labels
         self._xCorr, self._yCorr = 0, 0
 
@@ -280,8 +288,11 @@ class Axes(base.Wibject):
         rX, rY, rZ = rangeX, rangeY, rangeZ
 
         if None in [rX, rY, rZ]:
-            # find outmost range
+            # find outmost range (clear the cached limits, so that
+            # changes that were not followed by a Draw() are seen too)
             wobjects = self.FindObjects(base.Wobject)
+            for ob in wobjects:
+                ob._limitsCache = None
             for ob in wobjects:
                 # Ask object what it's limits are
                 tmp = ob._GetLimits()
@@ -756,6 +767,23 @@ class Axes(base.Wibject):
 
         return locals()
 
+    @PropWithDraw
+    def frustumCulling():
+        """Get/Set whether wobjects that are entirely outside of the
+        view are skipped when drawing (default True). This test is based
+        on the (cached) limits of the wobjects in the scene. If you modify
+        the data of a wobject in-place, call its Draw() method to update
+        its limits.
+        """
+
+        def fget(self):
+            return self._frustumCulling
+
+        def fset(self, value):
+            self._frustumCulling = bool(value)
+
+        return locals()
+
     @Property
     def motionBlur():
         """Get/Set the amount of motion blur when interacting with
@@ -926,10 +954,14 @@ class Axes(base.Wibject):
             gl.glMatrixMode(gl.GL_MODELVIEW)
             gl.glLoadIdentity()
 
-            # Draw
-            for item in self._wobjects:
-                if isinstance(item, BaseAxis):
-                    item._DrawTree(DRAW_SCREEN)
+            # Draw (the text of the axis is drawn at once)
+            fig._fontManager.BeginBatch()
+            try:
+                for item in self._wobjects:
+                    if isinstance(item, BaseAxis):
+                        item._DrawTree(DRAW_SCREEN)
+            finally:
+                fig._fontManager.EndBatch()
 
         # Prepare for drawing child wibjects in screen coordinates
         if True:
@@ -998,7 +1030,7 @@ class Axes(base.Wibject):
 
             # Draw stuff, but wait with lines
             lines2draw = []
-            for item in self._wobjects:
+            for item in self._CullWobjects(self._wobjects):
                 if isinstance(item, (Line, BaseAxis)):
                     lines2draw.append(item)
                 else:
@@ -1032,12 +1064,67 @@ class Axes(base.Wibject):
             # Allow wobjects to draw in screen coordinates
             # Note that the axis for the 2d camera needs to draw beyond
             # the viewport of the axes, and is therefore drawn later.
+            # The text of all wobjects is collected and drawn at once.
             gl.glEnable(gl.GL_DEPTH_TEST)
             is2dcam = isinstance(self.camera, cameras.TwoDCamera)
-            for item in self._wobjects:
-                if is2dcam and isinstance(item, BaseAxis):
-                    continue
-                item._DrawTree(DRAW_SCREEN)
+            fontManager = self.GetFigure()._fontManager
+            fontManager.BeginBatch()
+            try:
+                for item in self._wobjects:
+                    if is2dcam and isinstance(item, BaseAxis):
+                        continue
+                    item._DrawTree(DRAW_SCREEN)
+            finally:
+                fontManager.EndBatch()
+
+    def _CullWobjects(self, wobjects):
+        """_CullWobjects(wobjects)
+
+        Get the list of wobjects that (potentially) intersect with the
+        view frustum of the current camera. Should be called after the
+        camera has set the view. Wobjects that have no limits (and the
+        axis) are never culled.
+
+        """
+        if not self._frustumCulling:
+            return wobjects
+
+        # Collect the bounding boxes of the wobjects that have limits
+        boxes, indices = [], []
+        for i, ob in enumerate(wobjects):
+            if isinstance(ob, BaseAxis) or not ob._visible:
+                continue
+            lim = ob._GetCachedLimits()
+            if lim:
+                xlim, ylim, zlim = lim
+                boxes.append(
+                    (xlim.min, xlim.max, ylim.min, ylim.max, zlim.min, zlim.max)
+                )
+                indices.append(i)
+        if not boxes:
+            return wobjects
+
+        # Get the eight corners of each box in homogeneous coordinates
+        boxes = np.array(boxes, dtype=np.float64)
+        corners = np.ones((len(boxes), 8, 4), dtype=np.float64)
+        for j, (ix, iy, iz) in enumerate(np.ndindex(2, 2, 2)):
+            corners[:, j, 0] = boxes[:, ix]
+            corners[:, j, 1] = boxes[:, 2 + iy]
+            corners[:, j, 2] = boxes[:, 4 + iz]
+
+        # Project to clip coordinates. OpenGL matrices are column-major,
+        # so with row vectors we can use them as-is.
+        modelview = gl.glGetDoublev(gl.GL_MODELVIEW_MATRIX)
+        projection = gl.glGetDoublev(gl.GL_PROJECTION_MATRIX)
+        clip = corners.dot(np.dot(modelview, projection))
+
+        # A box is outside if all its corners are outside of the same plane.
+        # We allow a small margin for line widths, markers, etc.
+        w = clip[:, :, 3:] * _CULLING_MARGIN
+        outside = (clip[:, :, :3] > w).all(1) | (clip[:, :, :3] < -w).all(1)
+        culled = set(np.array(indices)[outside.any(1)])
+
+        return [ob for i, ob in enumerate(wobjects) if i not in culled]
 
     def _OnMouseDown(self, event):
         self.MakeCurrent()
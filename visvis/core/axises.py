@@ -22,6 +22,7 @@ import OpenGL.GLU as glu
 
 import numpy as np
 import math
+from collections import OrderedDict
 
 from visvis.utils.pypoints import Pointset, Point
 
@@ -49,6 +50,15 @@ for e in range(-10, 98):
     for i in [10, 20, 25, 50]:
         _tickUnits.append(i * 10**e)
 
+# Cache of formatted tick labels, keyed by the tuple of tick values. While
+# panning or zooming, the same sets of ticks come by over and over again.
+_tickTextCache = OrderedDict()
+_TICK_TEXT_CACHE_SIZE = 256
+
+# The maximum number of tick labels per axis that are kept (hidden) after
+# they went out of view, so they need not be recompiled when they return.
+_TEXT_CACHE_SIZE = 64
+
 
 class AxisText(Text):
     """Text with a disabled Draw() method."""
@@ -165,6 +175,25 @@ class AxisLabel(AxisText):
 def GetTickTexts(ticks):
     """GetTickTexts(ticks)
 
+    Get tick labels of maximally 9 characters (plus sign char).
+    The results are cached, see _FormatTickTexts() for details.
+
+    """
+    key = tuple(ticks)
+    try:
+        texts = _tickTextCache[key]
+    except KeyError:
+        texts = _tickTextCache[key] = _FormatTickTexts(ticks)
+        while len(_tickTextCache) > _TICK_TEXT_CACHE_SIZE:
+            _tickTextCache.popitem(last=False)
+    else:
+        _tickTextCache.move_to_end(key)
+    return list(texts)
+
+
+def _FormatTickTexts(ticks):
+    """_FormatTickTexts(ticks)
+
     Get tick labels of maximally 9 characters (plus sign char).
 
     All ticks will be formatted in the same manner, and with the same number
@@ -279,6 +308,22 @@ def GetTickText_deprecated(tick):
     return text
 
 
+def GetTickRange(lim, tickUnit, end=0):
+    """GetTickRange(lim, tickUnit, end=0)
+
+    Get the tick values for the given range and tick unit as a list.
+    The ticks are integer multiples of tickUnit, such that a tick has
+    exactly the same value for any range it falls in (which makes the
+    values suitable as keys to reuse text objects). At least one tick is
+    returned, and at most 1002. Use end=-1 to leave out the last tick.
+
+    """
+    first = np.ceil(lim.min / tickUnit)
+    n = np.floor(lim.max / tickUnit) + end - first + 1
+    n = int(min(max(n, 1), 1002)) if np.isfinite(n) else 1
+    return ((first + np.arange(n)) * tickUnit).tolist()
+
+
 def GetTicks(p0, p1, lim, minTickDist=40, givenTicks=None):
     """GetTicks(p0, p1, lim, minTickDist=40, ticks=None)
 
@@ -305,7 +350,7 @@ def GetTicks(p0, p1, lim, minTickDist=40, givenTicks=None):
             return [], [], []
 
         # Pixels per unit (use float64 to prevent inf for large numbers)
-        pixelsPerUnit = float(vec.norm() / lim.range)
+        pixelsPerUnit = float(vec.norm()[0] / lim.range)
 
         # Try all tickunits, starting from the smallest, until we find
         # one which results in a distance between ticks more than
@@ -325,16 +370,7 @@ def GetTicks(p0, p1, lim, minTickDist=40, givenTicks=None):
             return [], [], []
 
         # Calculate the ticks (the values) themselves
-        firstTick = np.ceil(lim.min / tickUnit) * tickUnit
-        lastTick = np.floor(lim.max / tickUnit) * tickUnit
-        count = 0
-        tickValues.append(firstTick)
-        while tickValues[-1] < lastTick - tickUnit / 2:
-            count += 1
-            t = firstTick + count * tickUnit
-            tickValues.append(t)
-            if count > 1000:
-                break  # Safety
+        tickValues = GetTickRange(lim, tickUnit)
         # Get tick texts
         tickTexts = GetTickTexts(tickValues)
 
@@ -389,6 +425,25 @@ def GetTicks(p0, p1, lim, minTickDist=40, givenTicks=None):
     return tickValues, tickPositions, tickTexts
 
 
+def GetGridLines(corner, d, ticks, *vectors):
+    """GetGridLines(corner, d, ticks, *vectors)
+
+    Get grid lines as an Nx3 array in which the pairs of points represent
+    the line pieces (for GL_LINES). For each tick, a path starts at the
+    corner with the tick value for dimension d, and follows the given
+    vectors one after the other.
+
+    """
+    p = np.repeat(corner.data.astype(np.float64), len(ticks), 0)
+    p[:, d] = ticks
+    pieces = []
+    for vec in vectors:
+        q = p + vec.data
+        pieces.append(np.stack([p, q], 1))
+        p = q
+    return np.concatenate(pieces, 1).reshape(-1, 3)
+
+
 class BaseAxis(base.Wobject):
     """BaseAxis(parent)
 
@@ -484,6 +539,22 @@ class BaseAxis(base.Wobject):
         # of time (if done every draw).
         self._textDicts = [{}, {}, {}]
 
+        # Tick texts that went out of view, keyed by (tick, text). These are
+        # hidden rather than destroyed, so that they can be reused when
+        # panning back, without compiling the text again.
+        self._textCache = OrderedDict()
+
+        # The lines of the last draw, and the state they were calculated for
+        self._lines = None
+        self._linesKey = None
+        self._pps = None
+        self._ppsScreen = None
+
+    def Draw(self, fast=False):
+        # A property has changed, so recalculate the lines and labels
+        self._linesKey = None
+        return base.Wobject.Draw(self, fast)
+
     ## Properties
 
     @PropWithDraw
@@ -822,18 +893,28 @@ class BaseAxis(base.Wobject):
         if not axes:
             return
 
-        # Calculate lines and labels (or get from argument)
+        # Calculate lines and labels (or get from argument). The lines
+        # are reused if the view has not changed since the last draw.
         if ppc_pps_ppg:
             ppc, pps, ppg = ppc_pps_ppg
+            self._linesKey = None
         else:
-            try:
-                ppc, pps, ppg = self._CreateLinesAndLabels(axes)
-            except Exception:
-                self.Destroy()  # So the error message does not repeat itself
-                raise
+            key = self._GetLinesKey(axes)
+            if key == self._linesKey:
+                ppc, pps, ppg = self._lines
+            else:
+                try:
+                    ppc, pps, ppg = self._CreateLinesAndLabels(axes)
+                except Exception:
+                    self.Destroy()  # So the error message does not repeat itself
+                    raise
+                self._lines = ppc, pps, ppg
+                self._linesKey = key
 
         # Store lines to be drawn in screen coordinates
-        self._pps = pps
+        if pps is not self._pps:
+            self._pps = pps
+            self._ppsScreen = None
 
         # Prepare for drawing lines
         gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
@@ -872,12 +953,15 @@ class BaseAxis(base.Wobject):
             return
 
         # get pointset
-        if not hasattr(self, "_pps") or not self._pps:
+        if not self._pps:
             return
-        pps = self._pps.copy()
-        pps[:, 2] = depthToZ(pps[:, 2])
+        if self._ppsScreen is None:
+            pps = self._pps.copy()
+            pps[:, 2] = depthToZ(pps[:, 2])
+            self._ppsScreen = pps
 
         # Prepare for drawing lines
+        pps = self._ppsScreen
         gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
         gl.glVertexPointerf(pps.data)
         if isinstance(axes.camera, TwoDCamera):
@@ -901,6 +985,59 @@ class BaseAxis(base.Wobject):
         if self._children:
             for child in self.children:
                 child.Destroy()
+        self._textCache.clear()
+
+    def _GetTickText(self, textDict, key, text, pos):
+        """Get a text object for the tick with the given key, and put it
+        at the given position. The object from the previous draw is reused
+        if its text is still the same, otherwise one is taken from the text
+        cache, or a new one is created.
+        """
+        t = textDict.pop(key, None)
+        if t is not None and t.text != text:
+            self._ReleaseTexts([{key: t}])
+            t = None
+        if t is None:
+            t = self._textCache.pop((key, text), None)
+        if t is None or t._parent is not self:
+            t = AxisText(self, text, pos.x, pos.y, pos.z)
+        else:
+            t.x, t.y, t.z = pos.x, pos.y, pos.z
+        return t
+
+    def _ReleaseTexts(self, textDicts):
+        """Clean up the text objects in the given dicts that are not used
+        anymore. Tick texts are hidden and stored in the text cache (the
+        least recently used are destroyed), labels are destroyed.
+        """
+        for textDict in textDicts:
+            for key, t in textDict.items():
+                if isinstance(t, AxisLabel) or t._parent is not self:
+                    t.Destroy()
+                else:
+                    t._visible = False
+                    other = self._textCache.pop((key, t.text), t)
+                    if other is not t:
+                        other.Destroy()
+                    self._textCache[(key, t.text)] = t
+        while len(self._textCache) > _TEXT_CACHE_SIZE:
+            self._textCache.popitem(last=False)[1].Destroy()
+
+    def _GetLinesKey(self, axes):
+        """Get a key that represents the view for which the lines and
+        labels are calculated: the transformation matrices, the viewport,
+        the limits and the size of the figure.
+        """
+        fig, cam = axes.GetFigure(), axes.camera
+        lims = list(axes.GetLimits()) + [cam._xlim, cam._ylim, cam._zlim]
+        return (
+            np.asarray(gl.glGetDoublev(gl.GL_MODELVIEW_MATRIX)).tobytes(),
+            np.asarray(gl.glGetDoublev(gl.GL_PROJECTION_MATRIX)).tobytes(),
+            np.asarray(gl.glGetIntegerv(gl.GL_VIEWPORT)).tobytes(),
+            tuple((lim.min, lim.max) for lim in lims),
+            tuple(axes.daspect),
+            fig and tuple(fig.position.size),
+        )
 
     def _CalculateCornerPositions(self, xlim, ylim, zlim):
         """Calculate the corner positions in world coorinates
@@ -942,16 +1079,7 @@ class BaseAxis(base.Wobject):
             return []
 
         # Create ticks
-        count = 0
-        ticks = [firstTick]
-        while ticks[-1] < lastTick - tickUnit:
-            count += 1
-            #             tmp = firstTick + count*tickUnit
-            #             if abs(tmp/tickUnit) < 10**-10:
-            #                 tmp = 0 # due round-off err, 0 can otherwise be 0.5e-17 or so
-            #             ticks.append(tmp)
-            ticks.append(firstTick + count * tickUnit)
-        return ticks
+        return GetTickRange(lim, tickUnit, -1)
 
     def _NextCornerIndex(self, i, d, vector_s):
         """Calculate the next corner index."""
@@ -1139,13 +1267,7 @@ class CartesianAxis2D(BaseAxis):
                 pps.append(p1s - tmp)
 
                 # Put a textlabel at tick
-                textDict = self._textDicts[d]
-                if tick in textDict and textDict[tick] in self._children:
-                    t = textDict.pop(tick)
-                    t.text = text
-                    t.x, t.y, t.z = p2.x, p2.y, p2.z
-                else:
-                    t = AxisText(self, text, p2.x, p2.y, p2.z)
+                t = self._GetTickText(self._textDicts[d], tick, text, p2)
                 # Add to dict
                 newTextDicts[d][tick] = t
                 # Set other properties right
@@ -1185,16 +1307,9 @@ class CartesianAxis2D(BaseAxis):
                 # Get more gridlines if required
                 if drawMinorGrid[d]:
                     ticks = self._GetTicks(tickUnit / 5, lim)
-                # Get positions
-                for tick in ticks:
-                    # Get tick location
-                    p1 = firstCorner.copy()
-                    p1[d] = tick
-                    # Add gridlines
-                    p3 = p1 + gv1
-                    # p4 = p3+gv2
-                    ppg.append(p1)
-                    ppg.append(p3)
+                # Add gridlines
+                if len(ticks):
+                    ppg.extend(GetGridLines(firstCorner, d, ticks, gv1))
 
             # Apply label
             textDict = self._textDicts[d]
@@ -1229,9 +1344,7 @@ class CartesianAxis2D(BaseAxis):
         ppg.data[:, 2] = 0.0
 
         # Clean up the text objects that are left
-        for tmp in self._textDicts:
-            for t in list(tmp.values()):
-                t.Destroy()
+        self._ReleaseTexts(self._textDicts)
 
         # Store text object dictionaries for next time ...
         self._textDicts = newTextDicts
@@ -1423,12 +1536,7 @@ class CartesianAxis3D(BaseAxis):
                     text += "  "
 
                 # Put textlabel at tick
-                textDict = self._textDicts[d]
-                if tick in textDict and textDict[tick] in self._children:
-                    t = textDict.pop(tick)
-                    t.x, t.y, t.z = p2.x, p2.y, p2.z
-                else:
-                    t = AxisText(self, text, p2.x, p2.y, p2.z)
+                t = self._GetTickText(self._textDicts[d], tick, text, p2)
                 # Add to dict
                 newTextDicts[d][tick] = t
                 # Set other properties right
@@ -1453,27 +1561,13 @@ class CartesianAxis3D(BaseAxis):
                 # get more gridlines if required
                 if drawMinorGrid[d]:
                     ticks = self._GetTicks(tickUnit / 5, lim)
-                # get positions
-                for tick in ticks:
-                    # get tick location
-                    p1 = firstCorner.copy()
-                    p1[d] = tick
-                    if tick not in [lim.min, lim.max]:  # not ON the box
-                        # add gridlines (back and front)
-                        if True:
-                            p3 = p1 + gv1
-                            p4 = p3 + gv2
-                            ppg.append(p1)
-                            ppg.append(p3)
-                            ppg.append(p3)
-                            ppg.append(p4)
-                        if draw4:
-                            p5 = p1 + gv2
-                            p6 = p5 + gv1
-                            ppg.append(p1)
-                            ppg.append(p5)
-                            ppg.append(p5)
-                            ppg.append(p6)
+                # get positions, not ON the box
+                ticks = [t for t in ticks if t not in (lim.min, lim.max)]
+                if len(ticks):
+                    # add gridlines (back and front)
+                    ppg.extend(GetGridLines(firstCorner, d, ticks, gv1, gv2))
+                    if draw4:
+                        ppg.extend(GetGridLines(firstCorner, d, ticks, gv2, gv1))
 
             # Apply label
             textDict = self._textDicts[d]
@@ -1503,9 +1597,7 @@ class CartesianAxis3D(BaseAxis):
             t._textDict = newTextDicts[d]
 
         # Clean up the text objects that are left
-        for tmp in self._textDicts:
-            for t in list(tmp.values()):
-                t.Destroy()
+        self._ReleaseTexts(self._textDicts)
 
         # Store text object dictionaries for next time ...
         self._textDicts = newTextDicts
@@ -1575,14 +1667,7 @@ def GetPolarTicks(p0, radius, lim, angularRefPos, sense, minTickDist=100, ticks=
             return [], [], []
 
         # Calculate the ticks (the values) themselves
-        ticks = []
-        firstTick = np.ceil(lim.min / tickUnit) * tickUnit
-        lastTick = np.floor(lim.max / tickUnit) * tickUnit
-        count = 0
-        ticks = [firstTick]
-        while ticks[-1] < lastTick - tickUnit / 2:
-            count += 1
-            ticks.append(firstTick + count * tickUnit)
+        ticks = GetTickRange(lim, tickUnit)
 
     # Calculate tick positions and text
     ticksPos, ticksText = [], []
@@ -1897,12 +1982,7 @@ class PolarAxis2D(BaseAxis):
                 (textRadius * np.cos(theta))[0], (textRadius * np.sin(theta))[0], 0
             )
             # Put a textlabel at tick
-            textDict = self._textDicts[0]
-            if tick in textDict and textDict[tick] in self._children:
-                t = textDict.pop(tick)
-                t.x, t.y, t.z = p2.x, p2.y, p2.z
-            else:
-                t = AxisText(self, text, p2.x, p2.y, p2.z)
+            t = self._GetTickText(self._textDicts[0], tick, text, p2)
             # Add to dict
             newTextDicts[0][tick] = t
             # Set other properties right
@@ -1988,13 +2068,7 @@ class PolarAxis2D(BaseAxis):
             ppc = ppc + pos
             ppc = ppc + ptic
 
-            textDict = self._textDicts[qIndx]
-
-            if tickXformed in textDict and textDict[tickXformed] in self._children:
-                t = textDict.pop(tickXformed)
-                t.x, t.y, t.z = ptxt.x, ptxt.y, ptxt.z
-            else:
-                t = AxisText(self, text, ptxt.x, ptxt.y, ptxt.z)
+            t = self._GetTickText(self._textDicts[qIndx], tickXformed, text, ptxt)
             # Add to dict
             # print(tick, '=>',text, 'but', t.text)
             newTextDicts[qIndx][tickXformed] = t
@@ -2015,21 +2089,16 @@ class PolarAxis2D(BaseAxis):
             if drawMinorGrid[1]:
                 ticks = self._GetTicks(tickUnit / 5, self._angularRange)
             # Get positions
-            for tick in ticks:
-                xc = tick * np.cos(theta)
-                yc = tick * np.sin(theta)
-                xlast = xc[:-1][0]
-                ylast = yc[:-1][0]
-                for x, y in np.column_stack((xc, yc)):
-                    ppg.append(Point(xlast, ylast, 0.0))
-                    ppg.append(Point(x, y, 0.0))
-                    xlast = x
-                    ylast = y
+            if len(ticks):
+                radii = np.reshape(ticks, (-1, 1, 1))
+                circles = np.zeros((len(ticks), len(theta), 3))
+                circles[:, :, 0], circles[:, :, 1] = np.cos(theta), np.sin(theta)
+                circles *= radii
+                pieces = np.stack([circles[:, :-1], circles[:, 1:]], 2)
+                ppg.extend(pieces.reshape(-1, 3))
 
         # Clean up the text objects that are left
-        for tmp in self._textDicts:
-            for t in list(tmp.values()):
-                t.Destroy()
+        self._ReleaseTexts(self._textDicts)
 
         # Store text object dictionaries for next time ...
         self._textDicts = newTextDicts
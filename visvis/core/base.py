@@ -24,7 +24,7 @@ from visvis.core.misc import (
     Transform_Rotate,
 )
 from visvis.core import events
-from visvis.utils.pypoints import Pointset, Quaternion, is_Point
+from visvis.utils.pypoints import Quaternion, is_Point
 
 
 # Define draw modes
@@ -643,6 +643,9 @@ class Wobject(BaseObject):
         # the transformations applied to the object
         self._transformations = []
 
+        # the cached limits, see _GetCachedLimits()
+        self._limitsCache = None
+
     @property
     def transformations(self):
         """Get the list of transformations of this wobject. These
@@ -675,6 +678,7 @@ class Wobject(BaseObject):
         Calls Draw on the axes that contains this object.
 
         """
+        self._InvalidateLimits()
         if self._isbeingdrawn:
             return False
         else:
@@ -707,8 +711,8 @@ class Wobject(BaseObject):
             raise ValueError("_Getlimits expects 0 or 6 arguments.")
 
         # Get limits of children
-        for ob in self.children:
-            tmp = ob._GetLimits()
+        for ob in self._children:
+            tmp = ob._GetCachedLimits()
             if tmp is not None:
                 limx, limy, limz = tmp
                 minx.append(limx.min)
@@ -726,16 +730,12 @@ class Wobject(BaseObject):
         x1, y1, z1 = tuple([min(val) for val in [minx, miny, minz]])
         x2, y2, z2 = tuple([max(val) for val in [maxx, maxy, maxz]])
 
-        # Make pointset of eight cornerpoints
-        pp = Pointset(3)
-        for x in [x1, x2]:
-            for y in [y1, y2]:
-                for z in [z1, z2]:
-                    pp.append(x, y, z)
-
-        # Transform these points
-        for i in range(len(pp)):
-            pp[i] = self.TransformPoint(pp[i], self)
+        # Make array of eight cornerpoints and transform these all at once
+        pp = np.array(
+            [(x, y, z) for x in (x1, x2) for y in (y1, y2) for z in (z1, z2)],
+            dtype=np.float64,
+        )
+        pp = self._TransformPoints(pp)
 
         # Return limits
         xlim = misc.Range(pp[:, 0].min(), pp[:, 0].max())
@@ -743,6 +743,71 @@ class Wobject(BaseObject):
         zlim = misc.Range(pp[:, 2].min(), pp[:, 2].max())
         return xlim, ylim, zlim
 
+    def _GetCachedLimits(self):
+        """_GetCachedLimits()
+
+        Get the limits as returned by _GetLimits(), but cached. The cache
+        is invalidated when Draw() is called on this object or one of its
+        children (which happens when data or properties are changed), and
+        when the transformations of this object or its children change.
+
+        """
+        key = self._GetLimitsKey()
+        cache = self._limitsCache
+        if cache is None or cache[0] != key:
+            cache = self._limitsCache = key, self._GetLimits()
+        return cache[1]
+
+    def _InvalidateLimits(self):
+        """_InvalidateLimits()
+
+        Clear the cached limits of this wobject and of its parent wobjects.
+
+        """
+        ob = self
+        while isinstance(ob, Wobject):
+            ob._limitsCache = None
+            ob = ob._parent
+
+    def _GetLimitsKey(self):
+        """Get a hashable representation of the current state of the
+        transformations of this wobject and of its children, used to
+        validate the cached limits.
+        """
+        return self._GetTransformationsKey(), tuple(
+            ob._GetLimitsKey() for ob in self._children
+        )
+
+    def _GetTransformationsKey(self):
+        """Get a hashable representation of the current state of the
+        transformations of this wobject (only).
+        """
+        return tuple(
+            (t.__class__,) + tuple(t.__dict__.values()) for t in self._transformations
+        )
+
+    def _TransformPoints(self, pp):
+        """_TransformPoints(pp)
+
+        Apply the transformations of this wobject (only) to the points
+        in the given Nx3 array. Returns a new array.
+
+        """
+        pp = np.array(pp, dtype=np.float64)
+        for t in reversed(self._transformations):
+            if isinstance(t, Transform_Translate):
+                pp += (t.dx, t.dy, t.dz)
+            elif isinstance(t, Transform_Scale):
+                pp *= (t.sx, t.sy, t.sz)
+            elif isinstance(t, Transform_Rotate):
+                angle = float(t.angle * np.pi / 180.0)
+                q = Quaternion.create_from_axis_angle(angle, t.ax, t.ay, t.az)
+                # Rotate using the vector form of q * p * q^-1
+                w, u = q.w, np.array([q.x, q.y, q.z])
+                uv = np.cross(u, pp)
+                pp += 2.0 * w * uv + 2.0 * np.cross(u, uv)
+        return pp
+
     def TransformPoint(self, p, baseWobject=None):
         """TransformPoint(p, baseWobject=None)
 
@@ -66,6 +66,47 @@ SH_MV_BASE = ShaderCodePart(
 )
 
 
+## Mesh instancing
+
+# Inserted in the base vertex shader to draw the same mesh many times using
+# per-instance attributes (set with glVertexAttribDivisor). The rotation
+# is a quaternion stored as (x, y, z, w).
+SH_MV_INSTANCING = ShaderCodePart(
+    "instancing",
+    "mesh-vertex-instancing",
+    """
+    >>--uniforms--
+    attribute vec3 instanceTranslation;
+    attribute vec3 instanceScale;
+    attribute vec4 instanceRotation;
+    attribute vec4 instanceColor;
+    // --uniforms--
+
+    >>void main()
+    vec3 rotateByQuaternion(vec3 v, vec4 q)
+    {
+        vec3 t = 2.0 * cross(q.xyz, v);
+        return v + q.w * t + cross(q.xyz, t);
+    }
+
+    void main()
+
+    >>vec4 vertex = vec4(gl_Vertex);
+    vec4 vertex = vec4(gl_Vertex);
+    vertex.xyz = rotateByQuaternion(vertex.xyz * instanceScale, instanceRotation);
+    vertex.xyz += instanceTranslation;
+
+    >>normal = gl_NormalMatrix * gl_Normal;
+    normal = gl_Normal * instanceScale.yzx * instanceScale.zxy; // adjugate
+    normal = rotateByQuaternion(normal, instanceRotation);
+    normal = gl_NormalMatrix * normal;
+
+    >>vColor = gl_Color;
+    vColor = gl_Color * instanceColor;
+""",
+)
+
+
 ## Mesh base fragment
 
 SH_MF_BASE = ShaderCodePart(
@@ -4,78 +4,30 @@
 # Visvis is distributed under the terms of the (new) BSD License.
 # The full license can be found in 'license.txt'.
 
+import numpy as np
+
 import visvis as vv
+from visvis.functions.solidBox import getBox
 
 
-class Bars3D(vv.Wobject):
-    """Bars3D(parent)
+class Bars3D(vv.InstancedMesh):
+    """Bars3D(parent, translations, scalings)
 
     The Bars3D class represents a bar chart. It has a few methods to
     change the appearance of the bars.
 
-    This class is a container for a series of Mesh objects created using
-    solidBox.
+    This class is an InstancedMesh that draws a box for each bar, so
+    that all bars are drawn in one go.
 
     This wobject is created by the function vv.bar3().
 
     """
 
-    @vv.misc.Property
-    def ambient():
-        """Get/Set the ambient reflectance of the bars.
-        The getter returns the ambient reflectance of the first bar,
-        or None if there are no bars.
-        """
-
-        def fget(self):
-            if self._children:
-                return self._children[0].ambient
-            else:
-                return None
-
-        def fset(self, value):
-            for child in self.children:
-                child.ambient = value
-
-        return locals()
-
-    @vv.misc.Property
-    def diffuse():
-        """Get/Set the diffuse reflectance of the bars.
-        The getter returns the diffuse reflectance of the first bar,
-        or None if there are no bars.
-        """
-
-        def fget(self):
-            if self._children:
-                return self._children[0].diffuse
-            else:
-                return None
-
-        def fset(self, value):
-            for child in self.children:
-                child.diffuse = value
-
-        return locals()
-
-    @vv.misc.Property
-    def specular():
-        """Get/Set the specular reflectance of the bars.
-        The getter returns the specular reflectance of the first bar,
-        or None if there are no bars.
-        """
-
-        def fget(self):
-            if self._children:
-                return self._children[0].specular
-            else:
-                return None
-
-        def fset(self, value):
-            for child in self.children:
-                child.specular = value
-
-        return locals()
+    def __init__(self, parent, translations, scalings):
+        vertices, normals = getBox()
+        baseMesh = vv.BaseMesh(vertices, None, normals, verticesPerFace=4)
+        vv.InstancedMesh.__init__(self, parent, baseMesh, translations)
+        self.SetInstances(scalings=scalings)
 
     @vv.misc.Property
     def color():
@@ -84,14 +36,16 @@ class Bars3D(vv.Wobject):
         """
 
         def fget(self):
-            if self._children:
-                return self._children[0].faceColor
-            else:
+            if not self.instanceCount:
                 return None
+            elif self._instanceColors is None:
+                return self.faceColor
+            else:
+                return tuple(float(c) for c in self._instanceColors[0])
 
         def fset(self, value):
-            for child in self.children:
-                child.faceColor = value
+            self.faceColor = value
+            self.SetInstances(colors=False)
 
         return locals()
 
@@ -101,18 +55,25 @@ class Bars3D(vv.Wobject):
         should match the number of bars."""
 
         def fget(self):
-            if self._children:
-                return [
-                    child.faceColor
-                    for child in self.children
-                    if hasattr(child, "faceColor")
-                ]
-            else:
+            if not self.instanceCount:
                 return None
+            elif self._instanceColors is None:
+                return [self.faceColor for i in range(self.instanceCount)]
+            else:
+                return [tuple(float(c) for c in cc) for cc in self._instanceColors]
 
         def fset(self, value):
-            for child, color in zip(self.children, value):
-                child.faceColor = color
+            # Bars for which no color is given get the faceColor
+            if self._instanceColors is None:
+                cc = np.tile(
+                    np.array(self.faceColor, np.float32), (self.instanceCount, 1)
+                )
+            else:
+                cc = self._instanceColors.copy()
+            for i, color in zip(range(self.instanceCount), value):
+                color = vv.misc.getColor(color, "setting colors")
+                cc[i, : len(color)] = color
+            self.SetInstances(colors=cc)
 
         return locals()
 
@@ -191,15 +152,12 @@ def bar3(data1, data2=None, data3=None, width=0.75, axesAdjust=True, axes=None):
     if axes is None:
         axes = vv.gca()
 
-    # Create Bars instance
-    bars = Bars3D(axes)
-
-    # Create boxes
-    for x, y, h in zip(xx, yy, hh):
-        pos = (x, y, h / 2.0)
-        scale = (width, width, h)
-        m = vv.solidBox(pos, scale, axesAdjust=False, axes=bars)
-        m.specular = 0
+    # Create Bars instance, with one box for each bar
+    hh = np.array(hh, np.float32)
+    translations = np.column_stack([xx, yy, hh / 2.0]).astype(np.float32)
+    scalings = np.column_stack([np.full(len(hh), width), np.full(len(hh), width), hh])
+    bars = Bars3D(axes, translations, scalings)
+    bars.specular = 0
 
     # Adjust axes
     if axesAdjust:
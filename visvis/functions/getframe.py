@@ -9,18 +9,40 @@ import OpenGL.GL as gl
 import numpy as np
 
 
-def getframe(ob):
-    """getframe(object)
+def getframe(ob, dtype=np.float32, alpha=False, out=None, crop=None, copy=True):
+    """getframe(object, dtype=np.float32, alpha=False, out=None, crop=None,
+                copy=True)
 
     Get a snapshot of the current figure or axes or axesContainer.
     It is retured as a numpy array (color image).
     Also see vv.screenshot().
 
+    Parameters
+    ----------
+    ob : Axes, AxesContainer, or Figure
+        The object to take the snapshot of.
+    dtype : np.float32 or np.uint8
+        The type of the image. Floats are in the range 0-1. Using uint8
+        reads four times less data.
+    alpha : bool
+        Whether to also read the alpha channel (i.e. return an RGBA image).
+    out : numpy array (optional)
+        A C-contiguous array of the right shape and dtype to read the
+        pixels into. If given, no new array is allocated.
+    crop : 4-element tuple (optional)
+        The rectangle (x, y, w, h) to read, in pixels of the (uncropped)
+        image, with the origin at the top-left.
+    copy : bool
+        OpenGL reads the rows from bottom to top. If copy is True, the
+        rows are flipped in place (swapping a few rows at a time) so that
+        the result is contiguous. If False, a flipped view is returned,
+        which avoids copying the data (the data in out is then stored
+        bottom to top).
+
     """
 
     # Get figure
     fig = ob.GetFigure()
-    pr = fig._devicePixelRatio
     if not fig:
         raise ValueError("Object is not present in any alive figures.")
 
@@ -29,6 +51,86 @@ def getframe(ob):
 
     # we read the pixels as shown on screen.
     gl.glReadBuffer(gl.GL_FRONT)
+    pr = fig._devicePixelRatio
+    return _readFrame(ob, fig, pr, dtype, alpha, out, crop, copy)
+
+
+def _readFrame(
+    ob, fig, pr, dtype=np.float32, alpha=False, out=None, crop=None, copy=True
+):
+    """_readFrame(ob, fig, pr, dtype=np.float32, alpha=False, out=None,
+                crop=None, copy=True)
+
+    Read the pixels of the given object from the current read buffer,
+    using the given pixel ratio to convert to physical pixels. See
+    getframe() for the other arguments.
+
+    """
+    x, y, w, h = _getFrameRect(ob, fig, pr)
+
+    # Crop (the origin of crop is at the top-left, OpenGL's at bottom-left)
+    if crop is not None:
+        cx, cy, cw, ch = [int(v) for v in crop]
+        if cx < 0 or cy < 0 or cw < 1 or ch < 1 or cx + cw > w or cy + ch > h:
+            raise ValueError("The crop rectangle is not inside the frame.")
+        x, y, w, h = x + cx, y + h - (cy + ch), cw, ch
+
+    # Get format
+    dtype = np.dtype(dtype)
+    if dtype == np.uint8:
+        type = gl.GL_UNSIGNED_BYTE
+    elif dtype == np.float32:
+        type = gl.GL_FLOAT
+    else:
+        raise ValueError("getframe() only supports uint8 and float32.")
+    format = gl.GL_RGBA if alpha else gl.GL_RGB
+
+    # Check or create output array
+    shape = h, w, 4 if alpha else 3
+    if out is None:
+        out = np.empty(shape, dtype)
+    elif out.shape != shape or out.dtype != dtype or not out.flags.c_contiguous:
+        raise ValueError("getframe() needs a contiguous %s %r array." % (dtype, shape))
+
+    # read
+    # Rows are tightly packed (the default alignment of 4 bytes caused
+    # strides for RGB uint8 data).
+    gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+    gl.glReadPixels(x, y, w, h, format, type, out)
+
+    # flip
+    if copy:
+        _flipRows(out)
+        return out
+    else:
+        return out[::-1]
+
+
+def _flipRows(im, blockSize=16):
+    """_flipRows(im, blockSize=16)
+
+    Flip the rows of the given array in place. Mirrored blocks of rows
+    are swapped via a small buffer, so no copy of the whole array is made.
+
+    """
+    h = im.shape[0]
+    n = max(1, min(blockSize, h // 2))
+    tmp = np.empty((n,) + im.shape[1:], im.dtype)
+    for i in range(0, h // 2, n):
+        k = min(n, h // 2 - i)
+        top, bottom = im[i : i + k], im[h - i - k : h - i][::-1]
+        tmp[:k] = top
+        top[:] = bottom
+        bottom[:] = tmp[:k]
+
+
+def _getFrameRect(ob, fig, pr):
+    """_getFrameRect(ob, fig, pr)
+
+    Get the rectangle (x, y, w, h) in physical pixels, in OpenGL
+    coordinates (origin at the bottom left), of the given object.
+
+    """
 
     # establish rectangle to sample
     if isinstance(ob, vv.BaseFigure):
@@ -49,18 +151,7 @@ def getframe(ob):
         raise ValueError("The given object is not a figure nor an axes.")
 
     # Convert to physical pixels
-    x, y, w, h = int(x * pr), int(y * pr), int(w * pr), int(h * pr)
-
-    # read
-    # use floats to prevent strides etc. uint8 caused crash on qt backend.
-    im = gl.glReadPixels(x, y, w, h, gl.GL_RGB, gl.GL_FLOAT)
-
-    # reshape, flip, and store
-    im.shape = h, w, 3
-    im = np.flipud(im)
-
-    # done
-    return im
+    return int(x * pr), int(y * pr), int(w * pr), int(h * pr)
 
 
 if __name__ == "__main__":
@@ -7,8 +7,11 @@
 import visvis as vv
 
 
-def isosurface(im, isovalue=None, step=1, useClassic=False, useValues=False):
-    """isosurface(vol, isovalue=None, step=1, useClassic=False, useValues=False)
+def isosurface(
+    im, isovalue=None, step=1, useClassic=False, useValues=False, blockSize=None
+):
+    """isosurface(vol, isovalue=None, step=1, useClassic=False, useValues=False,
+                blockSize=None)
 
     Uses scikit-image to calculate the isosurface for the given 3D image.
     Returns a vv.BaseMesh object.
@@ -32,12 +35,17 @@ def isosurface(im, isovalue=None, step=1, useClassic=False, useValues=False):
         If True, the returned BaseMesh object will also have a value for
         each vertex, which is related to the maximum value in a local region
         near the isosurface.
+    blockSize : int or None
+        If given, the volume is split in blocks of (about) this size, which
+        are processed in parallel. Use vv.utils.iso.BlockIsosurface to
+        show a surface that builds up while it is being calculated, or
+        to cache the results for interactive changes of the isovalue.
 
     """
 
     from visvis.utils.iso import isosurface as _isosurface
 
-    return _isosurface(im, isovalue, step, useClassic, useValues)
+    return _isosurface(im, isovalue, step, useClassic, useValues, blockSize)
 
 
 if __name__ == "__main__":
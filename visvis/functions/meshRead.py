@@ -30,8 +30,8 @@ def ssdfRead(fname, check=False):
     return vv.BaseMesh(s.vertices, s.faces, s.normals, s.values, s.verticesPerFace)
 
 
-def meshRead(fname, check=False):
-    """meshRead(fname, check=False)
+def meshRead(fname, check=False, cache=False):
+    """meshRead(fname, check=False, cache=False)
 
     Parameters
     ----------
@@ -41,6 +41,12 @@ def meshRead(fname, check=False):
         For the STL format: if check is True and the file is in ascii,
         some checks to the integrity of the file are done (which is a
         bit slower).
+    cache : bool
+        For the STL and Wavefront formats: if True, the mesh (including
+        its normals) is stored in a bsdm file next to the original file
+        (with ".cache.bsdm" appended to the name). The next time, the mesh
+        is read from this file (unless the original file was modified),
+        which skips the parsing and preprocessing.
 
     Notes on formats
     ----------------
@@ -51,6 +57,9 @@ def meshRead(fname, check=False):
         is ignored.
       * The SSDF format (.ssdf or .bsdf) is the most efficient in terms
         of memory and speed, but is not widely available.
+      * The BSDM format (.bsdm) is a binary ssdf file that also stores the
+        normals and is memory mapped when read, which makes it the fastest
+        format for large meshes. See visvis.vvio.bsdm.
 
     """
 
@@ -64,6 +73,7 @@ def meshRead(fname, check=False):
             raise IOError("Mesh file '%s' does not exist." % fname)
 
     # Use file extension to read file
+    useCache = cache
     if fname.lower().endswith(".stl"):
         import visvis.vvio
 
@@ -73,12 +83,25 @@ def meshRead(fname, check=False):
 
         readFunc = visvis.vvio.wavefront.WavefrontReader.read
     elif fname.lower().endswith(".ssdf") or fname.lower().endswith(".bsdf"):
-        readFunc = ssdfRead
+        readFunc, useCache = ssdfRead, False
+    elif fname.lower().endswith(".bsdm"):
+        import visvis.vvio
+
+        readFunc, useCache = visvis.vvio.bsdm.BsdmReader.read, False
     else:
         raise ValueError("meshRead cannot determine file type.")
 
+    # Try cache
+    if useCache:
+        mesh = visvis.vvio.bsdm.BsdmReader.readCache(fname)
+        if mesh is not None:
+            return mesh
+
     # Read
-    return readFunc(fname, check)
+    mesh = readFunc(fname, check)
+    if useCache:
+        visvis.vvio.bsdm.BsdmWriter.writeCache(fname, mesh)
+    return mesh
 
 
 if __name__ == "__main__":
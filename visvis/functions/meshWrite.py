@@ -32,7 +32,7 @@ def meshWrite(fname, mesh, name="", bin=True):
     ----------
     fname : string
         The filename to write to. The extension should be one of the
-        following: .obj .stl .ssdf .bsdf
+        following: .obj .stl .ssdf .bsdf .bsdm
     mesh : vv.BaseMesh
         The mesh instance to write.
     name : string (optional)
@@ -48,6 +48,9 @@ def meshWrite(fname, mesh, name="", bin=True):
       * The Wavefront format (.obj) is widely available.
       * The SSDF format (.ssdf or .bsdf) is the most efficient in terms
         of memory and speed, but is not widely available.
+      * The BSDM format (.bsdm) also stores the normals (which are
+        calculated if necessary), and is memory mapped when read. Use
+        visvis.vvio.bsdm.BsdmWriter to also store decimated versions.
 
     """
 
@@ -62,6 +65,10 @@ def meshWrite(fname, mesh, name="", bin=True):
         writeFunc = visvis.vvio.wavefront.WavefrontWriter.write
     elif fname.lower().endswith(".ssdf") or fname.lower().endswith(".bsdf"):
         writeFunc = ssdfWrite
+    elif fname.lower().endswith(".bsdm"):
+        import visvis.vvio
+
+        writeFunc = visvis.vvio.bsdm.BsdmWriter.write
     else:
         raise ValueError("meshWrite cannot determine file type.")
 
@@ -4,39 +4,164 @@
 # Visvis is distributed under the terms of the (new) BSD License.
 # The full license can be found in 'license.txt'.
 
+import time
+import ctypes
+import queue
+import threading
+
+import numpy as np
+import OpenGL.GL as gl
+
 import visvis as vv
 
 
 class Recorder:
-    """Recorder(object)
+    """Recorder(object, filename=None, duration=0.1, repeat=True, every=1,
+                queueSize=16, **kwargs)
 
     Recorder class that makes snapshots right after each draw event. Object
     should be an Axes, AxesContainer or Figure.
 
-    It is then possible to export the movie to SWF, GIF, AVI, or a series
-    of images.
+    The pixels are read asynchronously (as uint8 RGBA, using pixel buffer
+    objects if available): the pixels of a draw are retrieved at the next
+    draw, so that the GPU does not have to finish right away. Flipping and
+    converting the frames is done in a worker thread. If a filename is
+    given, the frames are written to disk as they arrive (using the
+    streaming writers of vv.vvmovie), so that the memory use is bounded.
+    Call Close() to finish the movie. Otherwise, the frames are kept in
+    memory, and it is possible to export the movie to SWF, GIF, AVI, or a
+    series of images.
+
+    If every is larger than 1, only one in every draws is recorded. At
+    most queueSize frames wait for the worker thread; if the worker
+    cannot keep up, frames are dropped (see the dropped property).
 
-    See also vv.movieWrite().
+    See also vv.movieWrite() and visvis.vvmovie.movieWriter().
 
     """
 
-    def __init__(self, ob):
+    def __init__(
+        self,
+        ob,
+        filename=None,
+        duration=0.1,
+        repeat=True,
+        every=1,
+        queueSize=16,
+        **kwargs,
+    ):
         # init
         self._ob = ob
         self._frames = []
+        self._writer = None
+        if filename is not None:
+            from visvis.vvmovie import movieWriter
+
+            self._writer = movieWriter(filename, duration, repeat, **kwargs)
+
+        # Init capturing
+        self._every = max(1, int(every))
+        self._draws = 0
+        self._grabber = _FrameGrabber()
+        self._queue = queue.Queue(max(1, int(queueSize)))
+        self._thread = None
+        self._error = None
+
+        # Init statistics
+        self._count = 0
+        self._dropped = 0
+        self._times = None
 
         # register events
         f = ob.GetFigure()
         f.eventAfterDraw.Bind(self._OnAfterDraw)
 
+    @property
+    def count(self):
+        """The number of frames captured so far (not counting the frames
+        that were dropped)."""
+        return self._count
+
+    @property
+    def dropped(self):
+        """The number of frames that were dropped because the worker
+        thread could not keep up."""
+        return self._dropped
+
+    @property
+    def fps(self):
+        """The achieved capture rate (in frames per second)."""
+        if self._times is None or self._count < 2:
+            return 0.0
+        t0, t1 = self._times
+        return (self._count - 1) / max(t1 - t0, 1e-9)
+
     def _OnAfterDraw(self, event):
-        im = vv.getframe(self._ob)
-        self._frames.append(im)
+        self._draws += 1
+        if (self._draws - 1) % self._every:
+            return
+
+        # Start reading the pixels, get those of the previous capture
+        from visvis.functions.getframe import _getFrameRect
+
+        fig = self._ob.GetFigure()
+        rect = _getFrameRect(self._ob, fig, fig._devicePixelRatio)
+        for frame in self._grabber.Grab(rect):
+            self._Put(frame, False)
+
+    def _Put(self, frame, block):
+        """Pass a frame to the worker thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._Work, name="Recorder")
+            self._thread.daemon = True
+            self._thread.start()
+        try:
+            self._queue.put(frame, block)
+        except queue.Full:
+            self._dropped += 1
+            return
+
+        # Update statistics
+        now = time.time()
+        self._times = (now, now) if self._times is None else (self._times[0], now)
+        self._count += 1
+
+    def _Work(self):
+        """Convert frames to flipped RGB images, and store or write them."""
+        while True:
+            frame = self._queue.get()
+            try:
+                if frame is None:
+                    break
+                data, w, h = frame
+                im = np.frombuffer(data, np.uint8).reshape(h, w, 4)
+                im = np.ascontiguousarray(im[::-1, :, :3])
+                if self._error is None and self._writer is not None:
+                    self._writer.AddFrame(im)
+                elif self._error is None:
+                    self._frames.append(im)
+            except Exception as err:
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _Flush(self):
+        """Retrieve the pending frame and wait for the worker thread."""
+        fig = self._ob.GetFigure()
+        if fig:
+            fig._SetCurrent()
+            for frame in self._grabber.Finish():
+                self._Put(frame, True)
+        self._queue.join()
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
 
     def Clear(self):
         """Clear()
         Clear all recorded images up to now.
         """
+        self._Flush()
         self._frames[:] = []
 
     def Stop(self):
@@ -44,6 +169,7 @@ class Recorder:
         Stop recording."""
         f = self._ob.GetFigure()
         f.eventAfterDraw.Unbind(self._OnAfterDraw)
+        self._Flush()
 
     def Continue(self):
         """Continue()
@@ -52,10 +178,29 @@ class Recorder:
         f.eventAfterDraw.Unbind(self._OnAfterDraw)
         f.eventAfterDraw.Bind(self._OnAfterDraw)
 
+    def Close(self):
+        """Close()
+        Stop recording, and finish the movie that is being written to
+        disk (if a filename was given)."""
+        try:
+            self.Stop()
+        finally:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+            fig = self._ob.GetFigure()
+            if fig:
+                fig._SetCurrent()
+                self._grabber.Release()
+            if self._writer is not None:
+                self._writer.Close()
+
     def GetFrames(self):
         """GetFrames()
         Get a copy of the list (the frames itself are not copied)
         recorded up to now."""
+        self._Flush()
         return [frame for frame in self._frames]
 
     def Export(self, filename, duration=0.1, repeat=True, **kwargs):
@@ -70,19 +215,128 @@ class Recorder:
         See vv.movieWrite for more information.
 
         """
+        if self._writer is not None:
+            raise RuntimeError("The frames are written to disk; use Close().")
         frames = self.GetFrames()
-        if filename.lower().endswith(".gif"):
-            loop = 0 if repeat else 1
-            vv.movieWrite(filename, frames, fps=1 / duration, loop=loop, **kwargs)
-        else:
-            vv.movieWrite(filename, frames, fps=1 / duration, **kwargs)
+        vv.movieWrite(filename, frames, duration, repeat, **kwargs)
+
+
+class _FrameGrabber:
+    """_FrameGrabber()
+
+    Reads pixels (uint8 RGBA) from the front buffer asynchronously, using
+    a ring of two pixel buffer objects: Grab() starts reading into one
+    buffer and returns the pixels of the previous Grab() from the other.
+    Falls back to synchronous reading if pixel buffer objects are not
+    supported. The frames are returned as (data, w, h) tuples, with the
+    rows from bottom to top.
+
+    """
 
+    def __init__(self):
+        self._pbos = None
+        self._nbytes = 0
+        self._index = 0
+        self._pending = None
+        self._usePbo = None
 
-def record(ob):
-    """record(object)
-    Take a snapshot of the given figure or axes after each draw.
+    def _Init(self, nbytes):
+        """Create the buffers (or check that we cannot)."""
+        if self._usePbo is None:
+            try:
+                self._pbos = gl.glGenBuffers(2)
+                self._usePbo = True
+            except Exception:
+                self._usePbo = False
+        if self._usePbo and nbytes != self._nbytes:
+            for pbo in self._pbos:
+                gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, pbo)
+                gl.glBufferData(
+                    gl.GL_PIXEL_PACK_BUFFER, nbytes, None, gl.GL_STREAM_READ
+                )
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+            self._nbytes = nbytes
+
+    def Grab(self, rect):
+        """Grab(rect)
+
+        Start reading the given rectangle (x, y, w, h). Returns a list
+        with the frames that are ready.
+
+        """
+        x, y, w, h = rect
+        gl.glReadBuffer(gl.GL_FRONT)
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 4)
+
+        # Retrieve the previous frame before reallocating
+        frames = []
+        if self._pending and self._pending[1:] != (w, h):
+            frames = self.Finish()
+        self._Init(w * h * 4)
+
+        if not self._usePbo:
+            data = gl.glReadPixels(x, y, w, h, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+            return frames + [(data, w, h)]
+
+        # Start reading
+        from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels
+
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, self._pbos[self._index])
+        glReadPixels(x, y, w, h, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+        # Get previous and swap
+        frames += self.Finish()
+        self._pending = self._index, w, h
+        self._index = 1 - self._index
+        return frames
+
+    def Finish(self):
+        """Finish()
+
+        Get the pending frame (as a list of zero or one frames).
+
+        """
+        if self._pending is None:
+            return []
+        index, w, h = self._pending
+        self._pending = None
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, self._pbos[index])
+        try:
+            ptr = gl.glMapBuffer(gl.GL_PIXEL_PACK_BUFFER, gl.GL_READ_ONLY)
+            data = ctypes.string_at(ptr, w * h * 4)
+            gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+        finally:
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        return [(data, w, h)]
+
+    def Release(self):
+        """Release()
+
+        Delete the buffers.
+
+        """
+        self._pending = None
+        if self._usePbo:
+            gl.glDeleteBuffers(2, self._pbos)
+        self._pbos, self._usePbo, self._nbytes = None, None, 0
+
+
+def record(
+    ob, filename=None, duration=0.1, repeat=True, every=1, queueSize=16, **kwargs
+):
+    """record(object, filename=None, duration=0.1, repeat=True, every=1,
+              queueSize=16, **kwargs)
+
+    Take a snapshot of the given figure or axes after each draw (or
+    after every n-th draw).
     A Recorder instance is returned, with which the recording can
-    be stopped, continued, and exported to GIF, SWF or AVI.
+    be stopped, continued, and exported to GIF, SWF or AVI. If a
+    filename is given, the frames are written to that file as they
+    arrive; call Close() on the recorder to finish the movie.
+    The frames are captured asynchronously; the recorder's fps and
+    dropped properties give the achieved capture rate and the number
+    of frames that were dropped.
     """
 
     # establish wheter we can record that
@@ -90,18 +344,18 @@ def record(ob):
         raise ValueError("The given object is not a figure nor an axes.")
 
     # create recorder
-    return Recorder(ob)
+    return Recorder(ob, filename, duration, repeat, every, queueSize, **kwargs)
 
 
 if __name__ == "__main__":
-    import time
-
     l = vv.plot([1, 2, 3, 1, 4])
     rec = vv.record(vv.gcf())
     for i in range(20):
         l.SetYdata([1 + i / 10.0, 2, 3, 1, 4])
         vv.processEvents()  # Process gui events
         time.sleep(0.1)
+    rec.Stop()
+    print("Recorded at %1.1f fps, %i frames dropped" % (rec.fps, rec.dropped))
     # Export to swf, gif or avi
     fname = "recordExample"  # note: set location to an existing directory
     for ext in [".swf", ".gif", ".avi"]:
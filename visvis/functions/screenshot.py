@@ -2,6 +2,7 @@
 # Copyright (C) 2012 Almar Klein
 
 import visvis as vv
+import OpenGL.GL as gl
 import numpy as np
 
 
@@ -21,8 +22,11 @@ def getCardinalSplineCoefs(t, tension=0.0):
     return c
 
 
-def screenshot(filename, ob=None, sf=2, bg=None, format=None, tension=-0.25):
-    """screenshot(filename, ob=None sf=2, bg=None, format=None)
+def screenshot(
+    filename, ob=None, sf=2, bg=None, format=None, tension=-0.25, supersample=False
+):
+    """screenshot(filename, ob=None sf=2, bg=None, format=None,
+                tension=-0.25, supersample=False)
 
     Make a screenshot and store it to a file, using cubic interpolation
     to increase the resolution (and quality) of the image.
@@ -48,10 +52,17 @@ def screenshot(filename, ob=None, sf=2, bg=None, format=None, tension=-0.25):
     format : string
         The format for the screenshot to be saved in. If not given, the
         format is deduced from the filename.
+    tension : float
+        The tension of the cardinal spline used for interpolation.
+    supersample : bool
+        If True, the figure is rendered offscreen at sf times the
+        resolution (as on a high-DPI display), instead of interpolating
+        the image on screen. Requires framebuffer object support. Note
+        that line widths and marker sizes are not scaled.
 
     Notes
     -----
-    Uses vv.getframe(ob) to obtain the image in the figure or axes.
+    Uses vv.getframe(ob, np.uint8) to obtain the image in the figure or axes.
     That image is interpolated with the given scale factor (sf) using
     bicubic interpolation. Then  vv.imwrite(filename, ..) is used to
     store the resulting image to a file.
@@ -91,79 +102,166 @@ def screenshot(filename, ob=None, sf=2, bg=None, format=None, tension=-0.25):
     if bg and fig:
         bgOld = bgob.bgcolor
         bgob.bgcolor = bg
-        fig.DrawNow()
+        if not supersample:
+            fig.DrawNow()
 
     # Obtain image
-    im1 = vv.getframe(ob)
-    shape1 = im1.shape
-
-    # Return background
-    if bg and fig:
-        bgob.bgcolor = bgOld
-        fig.Draw()
-
-    # Pad original image, so we have no trouble at the edges
-    shape2 = shape1[0] + 2, shape1[1] + 2, 3
-    im2 = np.zeros(shape2, dtype=np.float32)  # Also make float
-    im2[1:-1, 1:-1, :] = im1
-    im2[0, :, :] = im2[1, :, :]
-    im2[-1, :, :] = im2[-2, :, :]
-    im2[:, 0, :] = im2[:, 1, :]
-    im2[:, -1, :] = im2[:, -2, :]
-
-    # Create empty new image. It is sized by the scaleFactor,
-    # but the last row is not.
-    shape3 = (shape1[0] - 1) * s + 1, (shape1[1] - 1) * s + 1, 3
-    im3 = np.zeros(shape3, dtype=np.float32)
-
-    # Fill in values!
-    for dy in range(s + 1):
-        for dx in range(s + 1):
-            # Get interpolation fraction and coefs
-            ty = float(dy) / s
-            tx = float(dx) / s
-            cy = getCardinalSplineCoefs(ty, tension)
-            cx = getCardinalSplineCoefs(tx, tension)
-
-            # Create tmp image to which we add the contributions
-            # Note that this image is 1 pixel smaller in each dimension.
-            # The last pixel is filled because dy and dx iterate INCLUDING s.
-            shapeTmp = shape1[0] - 1, shape1[1] - 1, 3
-            imTmp = np.zeros(shapeTmp, dtype=np.float32)
-
-            # Collect all 16 neighbours and weight them apropriately
-            for iy in range(4):
-                for ix in range(4):
-                    # Get weight
-                    w = cy[iy] * cx[ix]
-                    if w == 0:
-                        continue
-
-                    # Get slice. Note that we start at 0,1,2,3 rather than
-                    # -1,0,1,2, because we padded the image.
-                    D = {0: -3, 1: -2, 2: -1, 3: None}
-                    slicey = slice(iy, D[iy])
-                    slicex = slice(ix, D[ix])
-
-                    # Get contribution and add to temp image
-                    imTmp += w * im2[slicey, slicex, :]
-
-            # Store contributions
-            D = [-1 for tmp in range(s)]
-            D.append(None)
-            slicey = slice(dy, D[dy], s)
-            slicex = slice(dx, D[dx], s)
-            im3[slicey, slicex, :] = imTmp
-
-    # Correct for overshoot
-    im3[im3 > 1] = 1
-    im3[im3 < 0] = 0
+    try:
+        if supersample:
+            im = _renderFrame(ob, fig, s)
+        else:
+            im = vv.getframe(ob, np.uint8)
+    finally:
+        # Return background
+        if bg and fig:
+            bgob.bgcolor = bgOld
+            fig.Draw()
+
+    # Interpolate, writing to file does not need floats
+    dtype = np.float32 if filename is None else np.uint8
+    if not supersample:
+        im = upscale(im, s, tension, dtype)
+    elif dtype == np.float32:
+        im = im.astype(np.float32) / 255
 
     # Store image to file
     if filename is not None:
-        vv.imwrite(filename, im3, format)
+        vv.imwrite(filename, im, format)
     else:
-        return im3
+        return im
+
+
+def upscale(im, s, tension=-0.25, dtype=np.float32, tileSize=2**24):
+    """upscale(im, s, tension=-0.25, dtype=np.float32, tileSize=2**24)
+
+    Increase the resolution of the given image (HxW or HxWxN, uint8 or
+    float in 0-1) with an integer factor s, using a cardinal spline. The
+    result has shape ((H-1)*s+1, (W-1)*s+1, ...) and is of the given
+    dtype (float32 in 0-1, or uint8), clipped to avoid overshoot.
+
+    The interpolation is separable: the rows are interpolated first,
+    then the columns, each with s strided 4-tap passes. The image is
+    processed in tiles of rows, such that the temporary float32 arrays
+    have at most tileSize elements.
+
+    """
+    im = np.asarray(im)
+    scale = 1.0 / 255 if im.dtype == np.uint8 else 1.0
+    s = max(1, int(s))
+    ny, nx = im.shape[:2]
+    shape = ((ny - 1) * s + 1, (nx - 1) * s + 1) + im.shape[2:]
+    result = np.empty(shape, dtype)
+
+    # Coefficients for each phase (for phase 0 this is [0, 1, 0, 0])
+    coefs = np.array([getCardinalSplineCoefs(float(d) / s, tension) for d in range(s)])
+    coefs = coefs.astype(np.float32)
+
+    # Indices of columns, padded with 1 before and 2 after
+    xx = np.clip(np.arange(-1, nx + 2), 0, nx - 1)
+
+    # Process tiles of rows
+    rowSize = shape[1] * s * int(np.prod(im.shape[2:]))
+    nrows = max(1, tileSize // max(rowSize, 1))
+    for y0 in range(0, ny, nrows):
+        y1 = min(y0 + nrows, ny)
+        yy = np.clip(np.arange(y0 - 1, y1 + 2), 0, ny - 1)
+        tile = im[yy].astype(np.float32)
+        if scale != 1.0:
+            tile *= scale
+
+        # Interpolate rows, then columns
+        tile = _interpolate(tile, coefs)
+        tile = _interpolate(tile[:, xx].swapaxes(0, 1), coefs).swapaxes(0, 1)
+
+        # Clip for overshoot and store
+        tile = tile[:, : shape[1]]
+        np.clip(tile, 0, 1, out=tile)
+        if dtype == np.uint8:
+            tile *= 255
+            tile += 0.5
+        z0, z1 = y0 * s, min(y1 * s, shape[0])
+        result[z0:z1] = tile[: z1 - z0]
+
+    return result
+
+
+def _interpolate(a, coefs):
+    """_interpolate(a, coefs)
+
+    Given an array that is padded along the first axis with 1 element
+    before and 2 after, get the array with s interpolated elements for
+    each element (s being the number of phases in coefs).
+
+    """
+    s = coefs.shape[0]
+    n = a.shape[0] - 3
+    out = np.empty((n * s,) + a.shape[1:], np.float32)
+    tmp = np.empty((n,) + a.shape[1:], np.float32)
+    for d in range(s):
+        res = out[d::s]
+        taps = [(k, c) for k, c in enumerate(coefs[d]) if c != 0]
+        if taps == [(1, 1)]:
+            res[:] = a[1 : n + 1]  # phase 0 is the original
+            continue
+        k, c = taps[0]
+        np.multiply(a[k : k + n], c, out=res)
+        for k, c in taps[1:]:
+            res += np.multiply(a[k : k + n], c, out=tmp)
+    return out
+
+
+def _renderFrame(ob, fig, sf):
+    """_renderFrame(ob, fig, sf)
+
+    Render the figure offscreen, with sf times the resolution, and get
+    the image of the given object.
+
+    """
+    from visvis.core.base import DRAW_NORMAL
+    from visvis.functions.getframe import _readFrame
+
+    fig._SetCurrent()
+    pr0 = fig._devicePixelRatio
+    pr = pr0 * sf
+    w, h = int(fig.position.w * pr), int(fig.position.h * pr)
+    if max(w, h) > gl.glGetIntegerv(gl.GL_MAX_RENDERBUFFER_SIZE):
+        raise RuntimeError("Scale factor too large to render offscreen.")
+
+    # Create framebuffer with color and depth buffers
+    fbo = gl.glGenFramebuffers(1)
+    rbos = gl.glGenRenderbuffers(2)
+    interaction = fig._enableUserInteraction
+    try:
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, fbo)
+        for rbo, fmt, attachment in [
+            (rbos[0], gl.GL_RGBA8, gl.GL_COLOR_ATTACHMENT0),
+            (rbos[1], gl.GL_DEPTH_COMPONENT24, gl.GL_DEPTH_ATTACHMENT),
+        ]:
+            gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, rbo)
+            gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, fmt, w, h)
+            gl.glFramebufferRenderbuffer(
+                gl.GL_FRAMEBUFFER, attachment, gl.GL_RENDERBUFFER, rbo
+            )
+        status = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER)
+        if status != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("Could not create framebuffer to render offscreen.")
+
+        # Draw as on a high-DPI display. Disabling user interaction
+        # prevents the axes from using (or storing) their buffer.
+        fig._devicePixelRatio = pr
+        fig._enableUserInteraction = False
+        fig._Draw(DRAW_NORMAL)
+        gl.glFinish()
+        gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+        im = _readFrame(ob, fig, pr, np.uint8)
+    finally:
+        fig._devicePixelRatio = pr0
+        fig._enableUserInteraction = interaction
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        gl.glDeleteRenderbuffers(2, rbos)
+        gl.glDeleteFramebuffers(1, [fbo])
+
+    return im
 
 
 if __name__ == "__main__":
@@ -8,39 +8,11 @@ import visvis as vv
 from visvis.utils.pypoints import Pointset
 
 
-def solidBox(
-    translation=None,
-    scaling=None,
-    direction=None,
-    rotation=None,
-    axesAdjust=True,
-    axes=None,
-):
-    """solidBox(translation=None, scaling=None, direction=None, rotation=None,
-                    axesAdjust=True, axes=None)
+def getBox():
+    """getBox()
 
-    Creates a solid cube (or box if you scale it) centered at the
-    origin. Returns an OrientableMesh.
-
-    Parameters
-    ----------
-    Note that translation, scaling, and direction can also be given
-    using a Point instance.
-    translation : (dx, dy, dz), optional
-        The translation in world units of the created world object.
-    scaling: (sx, sy, sz), optional
-        The scaling in world units of the created world object.
-    direction: (nx, ny, nz), optional
-        Normal vector that indicates the direction of the created world object.
-    rotation: scalar, optional
-        The anle (in degrees) to rotate the created world object around its
-        direction vector.
-    axesAdjust : bool
-        If True, this function will call axes.SetLimits(), and set
-        the camera type to 3D. If daspectAuto has not been set yet,
-        it is set to False.
-    axes : Axes instance
-        Display the bars in the given axes, or the current axes if not given.
+    Get the vertices and normals (as Pointsets) of a unit cube centered
+    at the origin, with quad faces.
 
     """
 
@@ -81,6 +53,48 @@ def solidBox(
         vertices.append(pp[i])
         normals.append(+1, 0, 0)
 
+    return vertices, normals
+
+
+def solidBox(
+    translation=None,
+    scaling=None,
+    direction=None,
+    rotation=None,
+    axesAdjust=True,
+    axes=None,
+):
+    """solidBox(translation=None, scaling=None, direction=None, rotation=None,
+                    axesAdjust=True, axes=None)
+
+    Creates a solid cube (or box if you scale it) centered at the
+    origin. Returns an OrientableMesh.
+
+    Parameters
+    ----------
+    Note that translation, scaling, and direction can also be given
+    using a Point instance.
+    translation : (dx, dy, dz), optional
+        The translation in world units of the created world object.
+    scaling: (sx, sy, sz), optional
+        The scaling in world units of the created world object.
+    direction: (nx, ny, nz), optional
+        Normal vector that indicates the direction of the created world object.
+    rotation: scalar, optional
+        The anle (in degrees) to rotate the created world object around its
+        direction vector.
+    axesAdjust : bool
+        If True, this function will call axes.SetLimits(), and set
+        the camera type to 3D. If daspectAuto has not been set yet,
+        it is set to False.
+    axes : Axes instance
+        Display the bars in the given axes, or the current axes if not given.
+
+    """
+
+    # Get vertices and normals of a unit cube
+    vertices, normals = getBox()
+
     ## Visualize
 
     # Create axes
@@ -18,11 +18,13 @@ def solidLine(pp, radius=1.0, N=16, axesAdjust=True, axes=None):
     ----------
     Note that translation, scaling, and direction can also be given
     using a Point instance.
-    pp : Pointset
-        The sequence of points of which the line consists.
+    pp : Pointset or list of Pointsets
+        The sequence of points of which the line consists. If a list
+        is given, a single mesh is created for all lines.
     radius : scalar or sequence
         The radius of the line to create. If a sequence if given, it
-        specifies the radius for each point in pp.
+        specifies the radius for each point in pp. If pp is a list, radius
+        can also be a list with a radius (or sequence) for each line.
     N : int
         The number of subdivisions around its centerline. If smaller
         than 8, flat shading is used instead of smooth shading.
@@ -38,6 +40,8 @@ def solidLine(pp, radius=1.0, N=16, axesAdjust=True, axes=None):
     # Check first argument
     if is_Pointset(pp):
         pass
+    elif isinstance(pp, (list, tuple)) and all(is_Pointset(p) for p in pp):
+        pass
     else:
         raise ValueError("solidLine() needs a Pointset or list of pointsets.")
 
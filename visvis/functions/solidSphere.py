@@ -201,49 +201,12 @@ def getSphereWithFaces(ndiv=3, radius=1.0):
     return vertices, faces, normals
 
 
-def solidSphere(
-    translation=None,
-    scaling=None,
-    direction=None,
-    rotation=None,
-    N=16,
-    M=16,
-    axesAdjust=True,
-    axes=None,
-):
-    """solidSphere(translation=None, scaling=None, direction=None, rotation=None,
-                    N=16, M=16, axesAdjust=True, axes=None)
+def getSphereWithQuads(N=16, M=16):
+    """getSphereWithQuads(N=16, M=16)
 
-    Creates a solid sphere with quad faces and centered at the origin.
-    Returns an OrientableMesh instance.
-
-    Parameters
-    ----------
-    Note that translation, scaling, and direction can also be given
-    using a Point instance.
-    translation : (dx, dy, dz), optional
-        The translation in world units of the created world object.
-    scaling: (sx, sy, sz), optional
-        The scaling in world units of the created world object.
-    direction: (nx, ny, nz), optional
-        Normal vector that indicates the direction of the created world object.
-    rotation: scalar, optional
-        The anle (in degrees) to rotate the created world object around its
-        direction vector.
-    N : int
-        The number of subdivisions around the Z axis (similar to lines
-        of longitude). If smaller than 8, flat shading is used instead
-        of smooth shading.
-    M : int
-        The number of subdivisions along the Z axis (similar to lines
-        of latitude). If smaller than 8, flat shading is used instead
-        of smooth shading.
-    axesAdjust : bool
-        If True, this function will call axes.SetLimits(), and set
-        the camera type to 3D. If daspectAuto has not been set yet,
-        it is set to False.
-    axes : Axes instance
-        Display the bars in the given axes, or the current axes if not given.
+    Get the vertices, quad face indices, normals and texture coordinates
+    of a unit sphere centered at the origin, with N subdivisions around
+    the Z axis and M subdivisions along the Z axis.
 
     """
 
@@ -290,6 +253,58 @@ def solidSphere(
     # Make indices a numpy array
     indices = np.array(indices, dtype=np.uint32)
 
+    return vertices, indices, normals, texcords
+
+
+def solidSphere(
+    translation=None,
+    scaling=None,
+    direction=None,
+    rotation=None,
+    N=16,
+    M=16,
+    axesAdjust=True,
+    axes=None,
+):
+    """solidSphere(translation=None, scaling=None, direction=None, rotation=None,
+                    N=16, M=16, axesAdjust=True, axes=None)
+
+    Creates a solid sphere with quad faces and centered at the origin.
+    Returns an OrientableMesh instance.
+
+    Parameters
+    ----------
+    Note that translation, scaling, and direction can also be given
+    using a Point instance.
+    translation : (dx, dy, dz), optional
+        The translation in world units of the created world object.
+    scaling: (sx, sy, sz), optional
+        The scaling in world units of the created world object.
+    direction: (nx, ny, nz), optional
+        Normal vector that indicates the direction of the created world object.
+    rotation: scalar, optional
+        The anle (in degrees) to rotate the created world object around its
+        direction vector.
+    N : int
+        The number of subdivisions around the Z axis (similar to lines
+        of longitude). If smaller than 8, flat shading is used instead
+        of smooth shading.
+    M : int
+        The number of subdivisions along the Z axis (similar to lines
+        of latitude). If smaller than 8, flat shading is used instead
+        of smooth shading.
+    axesAdjust : bool
+        If True, this function will call axes.SetLimits(), and set
+        the camera type to 3D. If daspectAuto has not been set yet,
+        it is set to False.
+    axes : Axes instance
+        Display the bars in the given axes, or the current axes if not given.
+
+    """
+
+    # Calculate vertices, indices, normals and texcords
+    vertices, indices, normals, texcords = getSphereWithQuads(N, M)
+
     ## Visualize
 
     # Create axes
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012, Almar Klein
+#
+# Visvis is distributed under the terms of the (new) BSD License.
+# The full license can be found in 'license.txt'.
+
+import numpy as np
+
+import visvis as vv
+from visvis.utils.pypoints import is_Pointset
+from visvis.functions.solidSphere import getSphereWithQuads
+
+
+def spheres(pp, radius=1.0, colors=None, N=16, M=16, axesAdjust=True, axes=None):
+    """spheres(pp, radius=1.0, colors=None, N=16, M=16,
+                    axesAdjust=True, axes=None)
+
+    Creates a solid sphere at each point in pp. All spheres are drawn
+    with a single draw call, which makes this function suited for
+    visualizing many (e.g. 100k) points. Returns an InstancedMesh.
+
+    Parameters
+    ----------
+    pp : 3D Pointset or Nx3 numpy array
+        The positions of the spheres.
+    radius : scalar or N numpy array
+        The radius of the spheres.
+    colors : (optional) Nx3 or Nx4 numpy array
+        The color of each sphere. If not given, all spheres have the
+        faceColor of the returned InstancedMesh.
+    N : int
+        The number of subdivisions around the Z axis (similar to lines
+        of longitude).
+    M : int
+        The number of subdivisions along the Z axis (similar to lines
+        of latitude).
+    axesAdjust : bool
+        If True, this function will call axes.SetLimits(), and set
+        the camera type to 3D. If daspectAuto has not been set yet,
+        it is set to False.
+    axes : Axes instance
+        Display the spheres in the given axes, or the current axes if not given.
+
+    """
+
+    # Check points
+    if is_Pointset(pp):
+        pp = pp.data
+    pp = np.asarray(pp, dtype=np.float32)
+    if pp.ndim != 2 or pp.shape[1] != 3:
+        raise ValueError("spheres() needs a 3D Pointset or Nx3 array.")
+
+    # Check radius; one per sphere, also if there are 3 spheres
+    radius = np.asarray(radius, dtype=np.float32)
+    if radius.ndim:
+        radius = radius.reshape(-1, 1)
+
+    # Create base mesh
+    vertices, indices, normals, texcords = getSphereWithQuads(N, M)
+    baseMesh = vv.BaseMesh(vertices, indices, normals, verticesPerFace=4)
+
+    # Create axes
+    if axes is None:
+        axes = vv.gca()
+
+    # Create instanced mesh
+    m = vv.InstancedMesh(axes, baseMesh, pp, scalings=radius, colors=colors)
+
+    # Adjust axes
+    if axesAdjust:
+        if axes.daspectAuto is None:
+            axes.daspectAuto = False
+        axes.cameraType = "3d"
+        axes.SetLimits()
+
+    # Done
+    axes.Draw()
+    return m
+
+
+if __name__ == "__main__":
+    pp = np.random.normal(0, 10, (1000, 3))
+    m = vv.spheres(pp, np.random.uniform(0.2, 1.0, 1000), np.random.rand(1000, 3))
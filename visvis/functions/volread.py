@@ -22,15 +22,30 @@ except ImportError:
     pass
 
 
-def volread(filename):
-    """volread(filename)
+def volread(filename, lazy=False, **kwargs):
+    """volread(filename, lazy=False, **kwargs)
 
     Read volume from a file. If filename is 'stent', read a dedicated
-    test dataset. For reading any other kind of volume, the imageio
+    test dataset. Ssdf files (.ssdf or .bsdf) that have a 'vol' field
+    are read using vv.ssdf; for uncompressed binary files the volume is
+    memory mapped. For reading any other kind of volume, the imageio
     package is required.
 
+    If lazy is True, returns a VolumeSource, which reads the data on
+    demand (in slabs of z-slices), so that very large volumes can be
+    opened instantly and shown with volshow2(). The filename can then
+    also be a raw file, a directory of images, or a list of image
+    filenames. Keyword arguments (e.g. shape and dtype for raw files,
+    and sampling) are passed to VolumeSource.
+
     """
 
+    # Read lazily?
+    if lazy:
+        if filename == "stent":
+            return vv.VolumeSource(volread(filename), **kwargs)
+        return vv.VolumeSource(filename, **kwargs)
+
     # Try loading our base volume(s)
     if filename == "stent":
         path = vv.misc.getResourceDir()
@@ -40,6 +55,13 @@ def volread(filename):
             s = vv.ssdf.load(filename)
             return s.vol.astype("int16") * s.colorscale
 
+    # Read from ssdf file
+    if filename.lower().endswith((".ssdf", ".bsdf")) and os.path.isfile(filename):
+        s = vv.ssdf.load(filename)
+        if "vol" not in s:
+            raise RuntimeError("This ssdf file does not contain a volume.")
+        return s.vol
+
     # Use imageio (can also load from http, etc)
     if iio is None:
         raise RuntimeError(
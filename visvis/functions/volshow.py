@@ -15,7 +15,8 @@ def volshow(*args, **kwargs):
     This is a convenience function that calls either volshow3() or
     volshow2(). If the current system supports it (OpenGL version >= 2.0),
     displays a 3D  rendering (volshow3). Otherwise shows three slices
-    that can be moved interactively (volshow2).
+    that can be moved interactively (volshow2). A VolumeSource is
+    always shown using volshow2, so that only the slices are read.
 
     Parameters
     ----------
@@ -43,7 +44,9 @@ def volshow(*args, **kwargs):
     vv.gcf()
 
     # Test and run
-    if vv.settings.volshowPreference == 3 and vv.misc.getOpenGlCapable(2.0):
+    if args and isinstance(args[0], vv.VolumeSource):
+        return vv.volshow2(*args, **kwargs)
+    elif vv.settings.volshowPreference == 3 and vv.misc.getOpenGlCapable(2.0):
         return vv.volshow3(*args, **kwargs)
     else:
         return vv.volshow2(*args, **kwargs)
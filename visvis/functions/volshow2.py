@@ -18,10 +18,11 @@ def volshow2(vol, clim=None, renderStyle=None, cm=None, axesAdjust=True, axes=No
 
     Parameters
     ----------
-    vol : numpy array
+    vol : numpy array or VolumeSource
         The 3D image to visualize. Can be grayscale, RGB, or RGBA.
         If the volume is an anisotropic array (vv.Aaray), the appropriate
-        scale and translate transformations are applied.
+        scale and translate transformations are applied. For a
+        VolumeSource (see vv.volread), only the displayed slices are read.
     clim : 2-element tuple
         The color limits to scale the intensities of the image. If not given,
         the im.min() and im.max() are used (neglecting nan and inf).
@@ -44,7 +45,7 @@ def volshow2(vol, clim=None, renderStyle=None, cm=None, axesAdjust=True, axes=No
         axes = vv.gca()
 
     # Check data
-    if not isinstance(vol, np.ndarray):
+    if not isinstance(vol, (np.ndarray, vv.VolumeSource)):
         raise ValueError("volshow expects an image as a numpy array.")
     elif vol.size == 0:
         raise ValueError("volshow cannot draw arrays with zero elements.")
@@ -6,286 +6,350 @@
 
 import numpy as np
 import visvis as vv
-from visvis.utils.pypoints import Point, Pointset
 from visvis.wobjects.polygonalModeling import BaseMesh
 
 
+def _normalize(v):
+    """Normalize the vectors in the last dimension of the given array."""
+    return v / np.sqrt((v**2).sum(-1))[..., np.newaxis]
+
+
 def getSpanVectors(normal, c, d):
     """getSpanVectors(normal, prevA, prevB) -> (a,b)
 
     Given a normal, return two orthogonal vectors which are both orthogonal
     to the normal. The vectors are calculated so they match as much as possible
-    the previous vectors.
+    the previous vectors. All vectors are 3-element numpy arrays.
 
     """
 
     # Calculate a from previous b
-    a1 = d.cross(normal)
+    a1 = np.cross(d, normal)
 
-    if a1.norm() < 0.001:
+    if np.sqrt((a1**2).sum()) < 0.001:
         # The normal and  d point in same or reverse direction
         # -> Calculate b from previous a
-        b1 = c.cross(normal)
-        a1 = b1.cross(normal)
+        b1 = np.cross(c, normal)
+        a1 = np.cross(b1, normal)
 
-    # Consider the opposite direction
-    a2 = -1 * a1
-    if c.distance(a1) > c.distance(a2):
-        a1 = a2
+    # Consider the opposite direction (the one closest to c)
+    if np.dot(c, a1) < 0:
+        a1 = -a1
 
     # Ok, calculate b
-    b1 = a1.cross(normal)
-
-    #     # Consider the opposite (don't: this would make backfacing faces)
-    #     b2 = -1 * b1
-    #     if d.distance(b1) > d.distance(b2):
-    #         b1 = b2
+    b1 = np.cross(a1, normal)
 
     # Done
-    return a1.normalize(), b1.normalize()
+    return _normalize(a1), _normalize(b1)
 
 
-def getCircle(angles_cos, angles_sin, a, b):
-    """getCircle(angles_cos, angles_sin, a, b) -> circle_cords
+def getSpanVectorsAlongLine(normals):
+    """getSpanVectorsAlongLine(normals) -> (aa, bb)
 
-    Creates a circle of points around the origin,
-    the circle is spanned by the vectors a and b.
+    Calculate the span vectors for each normal in the given Nx3 array,
+    such that the vectors of each normal match as much as possible those
+    of the previous normal. The result is identical to calling
+    getSpanVectors() for each normal in turn.
+
+    The vectors are transported along the line as a whole: the step from
+    one normal to the next is a linear map, so the vectors for a range of
+    normals follow from the cumulative products of these maps, which are
+    calculated for all normals at once. Only where a step degenerates
+    (the line turns 90 degrees in the direction of b) the step is taken
+    separately.
 
     """
-    X = np.empty((len(angles_cos), 3), dtype=np.float32)
-    X[:, 0] = angles_cos * a.x + angles_sin * b.x
-    X[:, 1] = angles_cos * a.y + angles_sin * b.y
-    X[:, 2] = angles_cos * a.z + angles_sin * b.z
 
-    return Pointset(X)
+    normals = np.asarray(normals, dtype=np.float64)
+    n = len(normals)
+    aa = np.empty((n, 3), np.float64)
+
+    # Initial vectors
+    a, b = getSpanVectors(
+        normals[0], np.array([0.0, 0.0, 1.0]), np.array([0.0, 1.0, 0.0])
+    )
+    aa[0] = a
+
+    # The step from normal t-1 to normal t maps a to -M[t-1]*a, because
+    # (a x n1) x n2 = n1 (a . n2) - a (n1 . n2)
+    dots = (normals[:-1] * normals[1:]).sum(1)
+    M = dots[:, np.newaxis, np.newaxis] * np.eye(3)
+    M -= normals[:-1, :, np.newaxis] * normals[1:, np.newaxis, :]
+
+    # Process ranges of growing size, starting anew where a step degenerates
+    i, size = 1, 16
+    while i < n:
+        a = aa[i - 1]
+        MM = M[i - 1 : i - 1 + size]
+        # Cumulative products (in log(size) steps). Normalize to avoid
+        # underflow, the scale does not matter.
+        P = MM.copy()
+        step = 1
+        while step < len(P):
+            P[step:] = np.matmul(P[step:], P[:-step])
+            P /= np.maximum(np.abs(P).max(axis=(1, 2)), 1e-300)[
+                :, np.newaxis, np.newaxis
+            ]
+            step *= 2
+        rr = _normalize(np.matmul(P, a))
+        rrPrev = np.vstack([a[np.newaxis], rr[:-1]])
+        # Find degenerate step
+        norms = np.sqrt((np.matmul(MM, rrPrev[:, :, np.newaxis])[:, :, 0] ** 2).sum(1))
+        bad = np.flatnonzero(norms < 0.001)
+        k = bad[0] if len(bad) else len(P)
+        # Flip the vectors where needed so each is close to the previous one
+        signs = np.cumprod(np.where((rr * rrPrev).sum(1) > 0, 1.0, -1.0))
+        aa[i : i + k] = signs[:k, np.newaxis] * rr[:k]
+        i += k
+        # Take degenerate step separately
+        if k < len(P):
+            b = _normalize(np.cross(aa[i - 1], normals[i - 1]))
+            aa[i] = getSpanVectors(normals[i], aa[i - 1], b)[0]
+            i, size = i + 1, 16
+        else:
+            size *= 2
 
+    # Calculate b from a
+    bb = _normalize(np.cross(aa, normals))
+    return aa, bb
 
-def lineToMesh(pp, radius, vertex_num, values=None):
-    """lineToMesh(pp, radius, vertex_num, values=None)
 
-    From a line, create a mesh that represents the line as a tube with
-    given diameter. Returns a BaseMesh instance.
+def _lineToArrays(pp, radius, vertex_num, values):
+    """_lineToArrays(pp, radius, vertex_num, values)
 
-    Parameters
-    ----------
-    pp : 3D Pointset
-        The points along the line. If the first and last point are the same,
-        the mesh-line is closed.
-    radius : scalar
-        The radius of the tube that is created. Radius can also be a
-        sequence of values (containing a radius for each point).
-    vertex_num : int
-        The number of vertices to create along the circumference of the tube.
-    values : list or numpy array (optional)
-        A value per point. Can be Nx1, Nx2, Nx3 or Nx4. A list of scalars
-        can also be given. The values are propagated to the mesh vertices
-        and supplied as input to the Mesh constructor. This allows for example
-        to define the color for the tube.
+    Calculate the vertices, normals, values and faces for a tube around
+    a single line. See lineToMesh().
 
     """
 
-    # we need this quite a bit
-    pi = np.pi
+    # process points
+    if vv.utils.pypoints.is_Pointset(pp):
+        pp = pp.data
+    pp = np.asarray(pp, dtype=np.float64)
+    if pp.ndim != 2 or pp.shape[1] != 3:
+        raise ValueError("lineToMesh() needs 3D Pointsets.")
 
     # process radius
     if hasattr(radius, "__len__"):
         if len(radius) != len(pp):
             raise ValueError("Len of radii much match len of points.")
         else:
-            radius = np.array(radius, dtype=np.float32)
+            radius = np.array(radius, dtype=np.float64)
     else:
-        radius = radius * np.ones((len(pp),), dtype=np.float32)
+        radius = radius * np.ones((len(pp),), dtype=np.float64)
 
-    # calculate vertex points for 2D circle
-    angles = np.arange(0, pi * 2 - 0.0001, pi * 2 / vertex_num)
-    angle_cos = np.cos(angles)
-    angle_sin = np.sin(angles)
-    vertex_num2 = len(angles)  # just to be sure
-
-    # calculate distance between two line pieces (for smooth cylinders)
-    dists = pp[1:].distance(pp[:-1])
-    bufdist = min(radius.max(), dists.min() / 2.2)
-
-    # check if line is closed
-    lclosed = np.all(pp[0] == pp[-1])
-
-    # calculate normal vectors on each line point
-    normals = pp[:-1].subtract(pp[1:]).copy()
-    if lclosed:
-        normals.append(pp[0] - pp[1])
-    else:
-        normals.append(pp[-2] - pp[-1])
-    normals = -1 * normals.normalize()
-
-    # create list to store vertices
-    vertices = Pointset(3)
-    surfaceNormals = Pointset(3)
-
-    # And a list for the values
+    # process values
     if values is None:
-        vvalues = None
+        pass
     elif isinstance(values, list):
         if len(values) != len(pp):
             raise ValueError("There must be as many values as points.")
-        vvalues = Pointset(1)
+        values = np.array(values, dtype=np.float64).reshape(len(pp), -1)
     elif isinstance(values, np.ndarray):
         if values.ndim != 2:
             raise ValueError("Values must be Nx1, Nx2, Nx3 or Nx4.")
         if values.shape[0] != len(pp):
             raise ValueError("There must be as many values as points.")
-        vvalues = Pointset(values.shape[1])
     elif vv.utils.pypoints.is_Pointset(values):
         if values.ndim > 4:
             raise ValueError("Can specify one to four values per point.")
         if len(values) != len(pp):
             raise ValueError("There must be as many values as points.")
-        vvalues = Pointset(values.ndim)
+        values = values.data
     else:
         raise ValueError("Invalid value for values.")
 
-    # Number of triangelized cylinder elements added to plot the 3D line
-    n_cylinders = 0
+    # calculate vertex points for 2D circle
+    angles = np.arange(0, np.pi * 2 - 0.0001, np.pi * 2 / vertex_num)
+    angle_cos = np.cos(angles)
+    angle_sin = np.sin(angles)
+    vertex_num2 = len(angles)  # just to be sure
 
-    # Init a and b
-    a, b = Point(0, 0, 1), Point(0, 1, 0)
+    # calculate distance between two line pieces (for smooth cylinders)
+    dists = np.sqrt(((pp[1:] - pp[:-1]) ** 2).sum(1))
+    bufdist = min(radius.max(), dists.min() / 2.2)
 
-    # Calculate the 3D circle coordinates of the first circle/cylinder
-    a, b = getSpanVectors(normals[0], a, b)
-    circm = getCircle(angle_cos, angle_sin, a, b)
+    # check if line is closed
+    lclosed = np.all(pp[0] == pp[-1])
 
-    # If not a closed line, add half sphere made with 5 cylinders at line start
+    # calculate normal vectors on each line point
+    normals = np.empty_like(pp)
+    normals[:-1] = pp[1:] - pp[:-1]
+    normals[-1] = pp[1] - pp[0] if lclosed else pp[-1] - pp[-2]
+    normals = _normalize(normals)
+
+    # The normals for which to calculate circles: the first normal, then
+    # for each line piece its normal and the in-between normal. For a
+    # closed line the last normal is added; otherwise the last in-between
+    # normal is dropped.
+    n_pieces = len(pp) - 1
+    normals12 = _normalize(normals[:-1] + normals[1:])
+    circleNormals = np.empty((n_pieces, 2, 3), np.float64)
+    circleNormals[:, 0] = normals[:-1]
+    circleNormals[:, 1] = normals12
+    circleNormals = circleNormals.reshape(-1, 3)
+    if lclosed:
+        circleNormals = np.vstack([normals[:1], circleNormals, normals[-1:]])
+    else:
+        circleNormals = np.vstack([normals[:1], circleNormals[:-1]])
+
+    # Calculate the 3D circle coordinates for each of these normals
+    aa, bb = getSpanVectorsAlongLine(circleNormals)
+    circles = (
+        angle_cos[np.newaxis, :, np.newaxis] * aa[:, np.newaxis, :]
+        + angle_sin[np.newaxis, :, np.newaxis] * bb[:, np.newaxis, :]
+    )
+    circles = circles.astype(np.float32).astype(np.float64)
+
+    # Per circle along the line we need: the circle index, radius, center
+    # and value. Two circles per line piece and one in between.
+    index = np.arange(n_pieces)
+    point2 = pp[1:]
+    tmp = (point2 + bufdist * normals[1:]) + (point2 - bufdist * normals[:-1])
+    point12 = 0.5858 * point2 + 0.4142 * (0.5 * tmp)
+    ringCircles = np.column_stack([1 + 2 * index, 1 + 2 * index, 2 + 2 * index])
+    ringRadii = np.column_stack([radius[:-1], radius[1:], radius[1:]])
+    ringCenters = np.stack(
+        [
+            pp[:-1] + bufdist * normals[:-1],
+            pp[1:] - bufdist * normals[:-1],
+            point12,
+        ],
+        1,
+    )
+    ringCircles = ringCircles.ravel()
+    ringRadii = ringRadii.ravel()
+    ringCenters = ringCenters.reshape(-1, 3)
+    if values is not None:
+        ringValues = np.stack(
+            [values[:-1], values[1:], 0.5 * (values[:-1] + values[1:])], 1
+        )
+        ringValues = ringValues.reshape(-1, values.shape[1])
     if not lclosed:
-        for j in range(5, 0, -1):
-            # Translate the circle on it's position on the line
-            r = (1 - (j / 5.0) ** 2) ** 0.5
-            circmp = float(r * radius[0]) * circm + (
-                pp[0] - (j / 5.0) * bufdist * normals[0]
-            )
-            # Calc normals
-            circmn = (pp[0].subtract(circmp)).normalize()
-            # Store the vertex list
-            vertices.extend(circmp)
-            surfaceNormals.extend(-1 * circmn)
-            if vvalues is not None:
-                for iv in range(vertex_num2):
-                    vvalues.append(values[0])
-            n_cylinders += 1
-
-    # Loop through all line pieces
-    for i in range(len(pp) - 1):
-        ## Create main cylinder between two line points
-        # which consists of two connected circles.
-
-        # get normal and point
-        normal1 = normals[i]
-        point1 = pp[i]
-
-        # calculate the 3D circle coordinates
-        a, b = getSpanVectors(normal1, a, b)
-        circm = getCircle(angle_cos, angle_sin, a, b)
-
-        # Translate the circle, and store
-        circmp = float(radius[i]) * circm + (point1 + bufdist * normal1)
-        vertices.extend(circmp)
-        surfaceNormals.extend(circm)
-        if vvalues is not None:
-            for iv in range(vertex_num2):
-                vvalues.append(values[i])
-        n_cylinders += 1
-
-        # calc second normal and line
-        normal2 = normals[i + 1]
-        point2 = pp[i + 1]
-
-        # Translate the circle, and store
-        circmp = float(radius[i + 1]) * circm + (point2 - bufdist * normal1)
-        vertices.extend(circmp)
-        surfaceNormals.extend(circm)
-        if vvalues is not None:
-            for iv in range(vertex_num2):
-                vvalues.append(values[i + 1])
-        n_cylinders += 1
-
-        ## Create in between circle to smoothly connect line pieces
-
-        if not lclosed and i == len(pp) - 2:
-            break
-
-        # get normal and point
-        normal12 = (normal1 + normal2).normalize()
-        tmp = (point2 + bufdist * normal2) + (point2 - bufdist * normal1)
-        point12 = 0.5858 * point2 + 0.4142 * (0.5 * tmp)
-
-        # Calculate the 3D circle coordinates
-        a, b = getSpanVectors(normal12, a, b)
-        circm = getCircle(angle_cos, angle_sin, a, b)
-
-        # Translate the circle, and store
-        circmp = float(radius[i + 1]) * circm + point12
-        vertices.extend(circmp)
-        surfaceNormals.extend(circm)
-        if vvalues is not None:
-            for iv in range(vertex_num2):
-                vvalues.append(0.5 * (values[i] + values[i + 1]))
-        n_cylinders += 1
-
-    # If not a closed line, add half sphere made with 5 cylinders at line start
-    # Otherwise add the starting circle to the line end.
+        ringCircles, ringRadii = ringCircles[:-1], ringRadii[:-1]
+        ringCenters = ringCenters[:-1]
+        if values is not None:
+            ringValues = ringValues[:-1]
+
+    # Vertices and normals of the tube
+    vertices = ringRadii[:, np.newaxis, np.newaxis] * circles[ringCircles]
+    vertices += ringCenters[:, np.newaxis, :]
+    surfaceNormals = circles[ringCircles]
+
     if not lclosed:
-        for j in range(0, 6):
-            # Translate the circle on it's position on the line
-            r = (1 - (j / 5.0) ** 2) ** 0.5
-            circmp = float(r * radius[-1]) * circm + (
-                pp[-1] + (j / 5.0) * bufdist * normals[-1]
+        # Add half sphere made with 5 cylinders at line start and 6 at the end
+        j = np.arange(5, 0, -1) / 5.0
+        r = ((1 - j**2) ** 0.5) * radius[0]
+        centers = pp[0] - (j * bufdist)[:, np.newaxis] * normals[0]
+        startVertices = (
+            r[:, np.newaxis, np.newaxis] * circles[0] + centers[:, np.newaxis]
+        )
+        startNormals = _normalize(startVertices - pp[0])
+        #
+        j = np.arange(0, 6) / 5.0
+        r = ((1 - j**2) ** 0.5) * radius[-1]
+        centers = pp[-1] + (j * bufdist)[:, np.newaxis] * normals[-1]
+        endVertices = (
+            r[:, np.newaxis, np.newaxis] * circles[-1] + centers[:, np.newaxis]
+        )
+        endNormals = _normalize(endVertices - pp[-1])
+        #
+        vertices = np.concatenate([startVertices, vertices, endVertices])
+        surfaceNormals = np.concatenate([startNormals, surfaceNormals, endNormals])
+        if values is not None:
+            ringValues = np.concatenate(
+                [np.repeat(values[:1], 5, 0), ringValues, np.repeat(values[-1:], 6, 0)]
             )
-            # Calc normals
-            circmn = (pp[-1].subtract(circmp)).normalize()
-            # Store the vertex list
-            vertices.extend(circmp)
-            surfaceNormals.extend(-1 * circmn)
-            if vvalues is not None:
-                for iv in range(vertex_num2):
-                    vvalues.append(values[-1])
-            n_cylinders += 1
     else:
-        # get normal and point
-        normal1 = normals[-1]
-        point1 = pp[-1]
-
-        # calculate the 3D circle coordinates
-        a, b = getSpanVectors(normal1, a, b)
-        circm = getCircle(angle_cos, angle_sin, a, b)
-
-        # Translate the circle, and store
-        circmp = float(radius[0]) * circm + (point1 + bufdist * normal1)
-        vertices.extend(circmp)
-        surfaceNormals.extend(circm)
-        if vvalues is not None:
-            for iv in range(vertex_num2):
-                vvalues.append(values[-1])
-        n_cylinders += 1
-
-    # almost done, determine quad faces ...
-
-    # define single faces
-    # firstFace = [0, 1, vertex_num+1, vertex_num]
-    # lastFace = [vertex_num-1, 0, vertex_num, 2*vertex_num-1]
-    firstFace = [vertex_num, vertex_num + 1, 1, 0]
-    lastFace = [2 * vertex_num - 1, vertex_num, 0, vertex_num - 1]
-
-    # define single round
-    oneRound = []
-    for i in range(vertex_num - 1):
-        oneRound.extend([val + i for val in firstFace])
-    oneRound.extend(lastFace)
-    oneRound = np.array(oneRound, dtype=np.uint32)
-
-    # calculate face data
-    parts = []
-    for i in range(n_cylinders - 1):
-        parts.append(oneRound + i * vertex_num)
-    faces = np.concatenate(parts)
-    faces.shape = faces.shape[0] // 4, 4
+        # Add the starting circle to the line end.
+        endVertices = radius[0] * circles[-1] + (pp[-1] + bufdist * normals[-1])
+        vertices = np.concatenate([vertices, endVertices[np.newaxis]])
+        surfaceNormals = np.concatenate([surfaceNormals, circles[-1:]])
+        if values is not None:
+            ringValues = np.concatenate([ringValues, values[-1:]])
+
+    # Number of triangelized cylinder elements added to plot the 3D line
+    n_cylinders = len(vertices)
+
+    # determine quad faces: connect each circle to the next
+    i1 = np.arange(vertex_num2, dtype=np.uint32)
+    i2 = np.roll(i1, -1)
+    oneRound = np.column_stack([vertex_num2 + i1, vertex_num2 + i2, i2, i1])
+    offsets = np.arange(n_cylinders - 1, dtype=np.uint32) * vertex_num2
+    faces = (offsets[:, np.newaxis, np.newaxis] + oneRound).reshape(-1, 4)
+
+    # Values per vertex
+    if values is not None:
+        values = np.repeat(ringValues, vertex_num2, 0)
+
+    # Done
+    return vertices.reshape(-1, 3), surfaceNormals.reshape(-1, 3), values, faces
+
+
+def lineToMesh(pp, radius, vertex_num, values=None):
+    """lineToMesh(pp, radius, vertex_num, values=None)
+
+    From a line, create a mesh that represents the line as a tube with
+    given diameter. Returns a BaseMesh instance.
+
+    Parameters
+    ----------
+    pp : 3D Pointset
+        The points along the line. If the first and last point are the same,
+        the mesh-line is closed. Can also be a list of Pointsets (or Nx3
+        numpy arrays), in which case a single mesh is created for all lines.
+    radius : scalar
+        The radius of the tube that is created. Radius can also be a
+        sequence of values (containing a radius for each point). If pp
+        is a list, radius can be a list with a radius (or a sequence
+        of radii) for each line.
+    vertex_num : int
+        The number of vertices to create along the circumference of the tube.
+    values : list or numpy array (optional)
+        A value per point. Can be Nx1, Nx2, Nx3 or Nx4. A list of scalars
+        can also be given. The values are propagated to the mesh vertices
+        and supplied as input to the Mesh constructor. This allows for example
+        to define the color for the tube. If pp is a list, values must
+        be a list with values for each line.
+
+    """
+
+    # Single line
+    if not isinstance(pp, (list, tuple)):
+        vertices, normals, values, faces = _lineToArrays(pp, radius, vertex_num, values)
+        return BaseMesh(vertices, faces, normals, values)
+
+    # Multiple lines, check radius and values
+    if not hasattr(radius, "__len__"):
+        radius = [radius for line in pp]
+    elif len(radius) != len(pp):
+        raise ValueError("There must be as many radii as lines.")
+    if values is None:
+        values = [None for line in pp]
+    elif len(values) != len(pp):
+        raise ValueError("There must be as many values as lines.")
+
+    # Calculate arrays for each line and combine them
+    allVertices, allNormals, allValues, allFaces = [], [], [], []
+    offset = 0
+    for line, r, v in zip(pp, radius, values):
+        vertices, normals, v, faces = _lineToArrays(line, r, vertex_num, v)
+        allVertices.append(vertices)
+        allNormals.append(normals)
+        allValues.append(v)
+        allFaces.append(faces + offset)
+        offset += len(vertices)
+    if any(v is None for v in allValues):
+        if not all(v is None for v in allValues):
+            raise ValueError("Values must be given for all lines or none.")
+        values = None
+    else:
+        values = np.concatenate(allValues)
 
     # Done!
-    return BaseMesh(vertices, faces, surfaceNormals, vvalues)
+    return BaseMesh(
+        np.concatenate(allVertices),
+        np.concatenate(allFaces),
+        np.concatenate(allNormals),
+        values,
+    )
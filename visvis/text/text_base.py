@@ -195,6 +195,14 @@ class FontManager(object):
     #
     # The _SetXxxData and _GetXxxData may contain any values.
     # The only restriction is that the first argument is the array of vertices.
+    #
+    # Between BeginBatch() and EndBatch(), Draw() should pass the final data
+    # to _AddToBatch() instead of drawing it, so that all text is drawn at
+    # once. The text objects are still positioned in Draw(), because other
+    # objects (e.g. the AxisLabel) may depend on it.
+
+    # The text collected since BeginBatch(), per texture
+    _batch = None
 
     def ConvertEscapedText(self, tt):
         tt = tt.replace(r"\\", unichr(0))
@@ -239,6 +247,51 @@ class FontManager(object):
         if textObject._finalData is None:
             self.Position(textObject)
 
+    def BeginBatch(self):
+        """BeginBatch()
+
+        Start collecting the text that is drawn, instead of drawing each
+        text object separately. Call EndBatch() to draw it.
+
+        """
+        self._batch = {}
+
+    def EndBatch(self):
+        """EndBatch()
+
+        Draw the text that was collected since BeginBatch(), using one
+        draw call per texture, and stop collecting.
+
+        """
+        batch, self._batch = self._batch, None
+        for texture, items in (batch or {}).items():
+            vertices, texcords, colors, offsets = zip(*items)
+            counts = [len(v) for v in vertices]
+            vertices = np.concatenate(vertices)
+            vertices += np.repeat(np.array(offsets, np.float32), counts, 0)
+            colors = np.repeat(np.array(colors, np.float32), counts, 0)
+            self._DrawBatch(texture, vertices, np.concatenate(texcords), colors)
+
+    def _AddToBatch(self, texture, vertices, texcords, color, x, y, z):
+        """Add the final data of a text object to the current batch.
+        Returns False if there is no batch, in which case the text object
+        should be drawn directly.
+        """
+        if self._batch is None:
+            return False
+        if isinstance(vertices, vv.Pointset):
+            vertices = vertices.data
+        if isinstance(texcords, vv.Pointset):
+            texcords = texcords.data
+        if color and len(vertices):
+            item = vertices, texcords, color[:3], (x, y, z)
+            self._batch.setdefault(texture, []).append(item)
+        return True
+
+    def _DrawBatch(self, texture, vertices, texcords, colors):
+        """Draw the text of a batch that uses the given texture."""
+        simpleTextureDraw(vertices, texcords, texture, colors)
+
 
 def correctVertices(textObject, vertices, charHeigh):
     """Provides a default algorithm that can be used
@@ -321,7 +374,8 @@ def correctVertices(textObject, vertices, charHeigh):
 
 def simpleTextureDraw(vertices, texcords, texture, color):
     """Simply draw characters, given vertices, texcords, a texture
-    and a color.
+    and a color. The color can also be an Nx3 array with a color
+    for each vertex.
     """
     # Make arrays
     if isinstance(vertices, vv.Pointset):
@@ -342,7 +396,13 @@ def simpleTextureDraw(vertices, texcords, texture, color):
     gl.glTexCoordPointerf(texcords)
 
     # draw
-    if color and len(vertices):
+    if isinstance(color, np.ndarray):
+        gl.glEnableClientState(gl.GL_COLOR_ARRAY)
+        gl.glColorPointerf(color)
+        gl.glDrawArrays(gl.GL_QUADS, 0, len(vertices))
+        gl.glFlush()
+        gl.glDisableClientState(gl.GL_COLOR_ARRAY)
+    elif color and len(vertices):
         gl.glColor(color[0], color[1], color[2])
         gl.glDrawArrays(gl.GL_QUADS, 0, len(vertices))
         gl.glFlush()
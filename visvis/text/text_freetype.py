@@ -550,6 +550,11 @@ class FreeTypeFontManager(FontManager):
         # Get data
         vertices, texCords = textObject._GetFinalData()
 
+        # Collect if batching
+        color = textObject.textColor
+        if self._AddToBatch(self.atlas, vertices, texCords, color, x, y, z):
+            return
+
         # Translate
         if x or y or z:
             gl.glPushMatrix()
@@ -557,13 +562,18 @@ class FreeTypeFontManager(FontManager):
 
         # Draw
         self.shader.Enable()
-        simpleTextureDraw(vertices, texCords, self.atlas, textObject.textColor)
+        simpleTextureDraw(vertices, texCords, self.atlas, color)
         self.shader.Disable()
 
         # Un-translate
         if x or y or z:
             gl.glPopMatrix()
 
+    def _DrawBatch(self, texture, vertices, texcords, colors):
+        self.shader.Enable()
+        simpleTextureDraw(vertices, texcords, texture, colors)
+        self.shader.Disable()
+
 
 class TextureFont:
     """
@@ -169,6 +169,12 @@ class PrerenderedFontManager(FontManager):
 
         # Get data
         vertices, texCords = textObject._GetFinalData()
+        atlas = self.GetFont(textObject.fontName).atlas
+
+        # Collect if batching
+        color = textObject.textColor
+        if self._AddToBatch(atlas, vertices, texCords, color, x, y, z):
+            return
 
         # Translate
         if x or y or z:
@@ -176,8 +182,7 @@ class PrerenderedFontManager(FontManager):
             gl.glTranslatef(x, y, z)
 
         # Draw
-        atlas = self.GetFont(textObject.fontName).atlas
-        simpleTextureDraw(vertices, texCords, atlas, textObject.textColor)
+        simpleTextureDraw(vertices, texCords, atlas, color)
 
         # Un-translate
         if x or y or z:
@@ -3,9 +3,10 @@
 # This code is distributed under the terms of the (new) BSD License.
 
 """
-This package provides two functions:
+This package provides two functions and a class:
     * isocontour - for 2D images
     * isosurface - for 3D images
+    * BlockIsosurface - for (large) 3D images, computed in parallel blocks
 
 Visvis uses to implement this functionality itself using Cython. Visvis
 was often used as a pure Python package though, so this functionality
@@ -16,6 +17,10 @@ to scikit-image, and we now use that here.
 
 """
 
+import os
+import collections
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
 import visvis as vv
 import numpy as np
 from skimage.measure import find_contours
@@ -65,8 +70,11 @@ def isocontour(im, isovalue=None):
     return vv.Pointset(np.row_stack(data2))
 
 
-def isosurface(im, isovalue=None, step=1, useClassic=False, useValues=False):
-    """isosurface(vol, isovalue=None, step=1, useClassic=False, useValues=False)
+def isosurface(
+    im, isovalue=None, step=1, useClassic=False, useValues=False, blockSize=None
+):
+    """isosurface(vol, isovalue=None, step=1, useClassic=False, useValues=False,
+                blockSize=None)
 
     Uses scikit-image to calculate the isosurface for the given 3D image.
     Returns a vv.BaseMesh object.
@@ -90,9 +98,20 @@ def isosurface(im, isovalue=None, step=1, useClassic=False, useValues=False):
         If True, the returned BaseMesh object will also have a value for
         each vertex, which is related to the maximum value in a local region
         near the isosurface.
+    blockSize : int or None
+        If given, the volume is split in blocks of (about) this size, which
+        are processed in parallel. See BlockIsosurface.
 
     """
 
+    # Use blocks?
+    if blockSize:
+        iso = BlockIsosurface(im, blockSize, step, useClassic, useValues)
+        try:
+            return iso.GetMesh(isovalue)
+        finally:
+            iso.Close()
+
     # Check image
     if not isinstance(im, np.ndarray) or (im.ndim != 3):
         raise ValueError("vol should be a 3D numpy array.")
@@ -134,3 +153,385 @@ def isosurface(im, isovalue=None, step=1, useClassic=False, useValues=False):
         return vv.BaseMesh(vertices, faces, normals, values)
     else:
         return vv.BaseMesh(vertices, faces, normals)
+
+
+def _marchBlock(block, offset, core, isovalue, step, sampling, useClassic):
+    """_marchBlock(block, offset, core, isovalue, step, sampling, useClassic)
+
+    Calculate the isosurface for a single block. The block includes a
+    margin, so that the normals at the edges are calculated in the same way
+    as when processing the whole volume. Only the faces in the core of the
+    block (given as local lower and upper bounds) are kept. Returns the
+    vertices (in z-y-x order, with the offset applied), faces, normals and
+    values. This is a module level function so it can be run in a subprocess.
+
+    """
+    if useClassic:
+        xx = marching_cubes(
+            block, isovalue, spacing=sampling, step_size=step, method="lorensen"
+        )
+    else:
+        xx = marching_cubes(block, isovalue, spacing=sampling, step_size=step)
+    vertices, faces, normals, values = xx
+
+    # Select faces in the core, and the vertices that they use
+    centers = vertices[faces].mean(1) / sampling
+    lower, upper = np.array(core[0]), np.array(core[1])
+    faces = faces[np.all((centers >= lower) & (centers < upper), 1)]
+    used = np.zeros((len(vertices),), bool)
+    used[faces] = True
+    faces = (np.cumsum(used) - 1)[faces]
+    vertices, normals, values = vertices[used], normals[used], values[used]
+
+    vertices += np.array(offset, np.float64) * sampling
+    return (
+        vertices.astype(np.float32),
+        faces.astype(np.uint32),
+        normals.astype(np.float32),
+        values.astype(np.float32),
+    )
+
+
+def weldBlocks(results, sampling=(1, 1, 1), blockSize=None):
+    """weldBlocks(results, sampling=(1, 1, 1), blockSize=None)
+
+    Combine the isosurfaces of a list of blocks into one surface. Vertices
+    that lie on the seam of two blocks are calculated by both; these are
+    merged. If blockSize is given, only vertices on the planes between
+    blocks are considered for merging. Returns vertices (in x-y-z order),
+    faces, normals and values.
+
+    """
+
+    # Concatenate
+    offsets = np.cumsum([0] + [len(r[0]) for r in results[:-1]])
+    vertices = np.concatenate([r[0] for r in results])
+    faces = np.concatenate([r[1] + offset for r, offset in zip(results, offsets)])
+    normals = np.concatenate([r[2] for r in results])
+    values = np.concatenate([r[3] for r in results])
+
+    # Select candidates
+    coords = vertices / np.array(sampling, np.float32)
+    if blockSize:
+        dist = np.abs(coords - blockSize * np.round(coords / blockSize))
+        candidates = np.flatnonzero((dist < 1e-3).any(1))
+    else:
+        candidates = np.arange(len(vertices))
+
+    # Find vertices at the same position (up to rounding errors)
+    keys = np.round(coords[candidates] * 1000).astype(np.int64)
+    order = np.lexsort(keys.T)
+    keys = keys[order]
+    isFirst = np.ones((len(keys),), bool)
+    isFirst[1:] = (keys[1:] != keys[:-1]).any(1)
+    first = np.maximum.accumulate(np.where(isFirst, np.arange(len(keys)), 0))
+
+    # Merge
+    if not isFirst.all():
+        remap = np.arange(len(vertices))
+        remap[candidates[order]] = candidates[order[first]]
+        keep = remap == np.arange(len(vertices))
+        faces = (np.cumsum(keep) - 1)[remap[faces]].astype(np.uint32)
+        vertices, normals, values = vertices[keep], normals[keep], values[keep]
+
+    # Transform the data to how Visvis likes it
+    return np.fliplr(vertices), faces, normals, values
+
+
+class BlockIsosurface(object):
+    """BlockIsosurface(vol, blockSize=64, step=1, useClassic=False,
+                    useValues=False, workers=None, useProcesses=False,
+                    cacheSize=1024)
+
+    Calculate the isosurface of a (large) 3D volume in blocks. The volume
+    is split in blocks that overlap by one sample, which are processed in
+    parallel by a pool of threads (or processes). The results are welded
+    together along the seams.
+
+    The results are cached per block, isovalue and step, and blocks that
+    do not contain the isovalue are skipped. Thus changing the isovalue
+    back and forth (e.g. via a slider) only recomputes blocks that
+    have not been seen with that isovalue.
+
+    Use GetMesh() to obtain a BaseMesh, or ShowMesh() to create a Mesh
+    that is updated while the blocks are being processed, so the user
+    sees the surface build up. Setting the isovalue property updates
+    the shown mesh in the same way.
+
+    Parameters
+    ----------
+    vol : 3D numpy array
+        The volume for which to calculate the isosurface.
+    blockSize : int
+        The size of the blocks (it is rounded up to a multiple of step).
+    step : int
+        The stepsize for stepping through the volume. See isosurface().
+    useClassic : bool
+        Whether to use the classic marching cubes. See isosurface().
+    useValues : bool
+        Whether the meshes should have a value for each vertex.
+        See isosurface().
+    workers : int or None
+        The number of workers to use. By default equals the number of CPUs.
+    useProcesses : bool
+        If True, use a pool of processes instead of threads. This requires
+        the blocks to be copied to the processes.
+    cacheSize : int
+        The maximum number of block results to keep in the cache.
+
+    """
+
+    def __init__(
+        self,
+        vol,
+        blockSize=64,
+        step=1,
+        useClassic=False,
+        useValues=False,
+        workers=None,
+        useProcesses=False,
+        cacheSize=1024,
+    ):
+        # Check image
+        if not isinstance(vol, np.ndarray) or (vol.ndim != 3):
+            raise ValueError("vol should be a 3D numpy array.")
+
+        # Check steps and block size
+        step = int(step)
+        if step < 1:
+            raise ValueError("step must be at least one.")
+        blockSize = max(1, int(np.ceil(float(blockSize) / step))) * step
+
+        # Deal with Aarray
+        if hasattr(vol, "sampling"):
+            sampling = vol.sampling[0], vol.sampling[1], vol.sampling[2]
+        else:
+            sampling = (1, 1, 1)
+
+        # Store
+        self._vol = vol
+        self._sampling = tuple(float(s) for s in sampling)
+        self._step = step
+        self._blockSize = blockSize
+        self._useClassic = bool(useClassic)
+        self._useValues = bool(useValues)
+        self._workers = workers or os.cpu_count() or 1
+        self._useProcesses = bool(useProcesses)
+        self._executor = None
+        self._cache = collections.OrderedDict()
+        self._cacheSize = int(cacheSize)
+
+        # Define blocks. The core of a block ends at the first sample of the
+        # next, and needs at least two samples in each dimension. A margin
+        # of one sample is added on each side.
+        starts = [range(0, max(n - 1, 1), blockSize) for n in vol.shape]
+        self._blocks = []
+        self._ranges = []
+        sub = slice(None, None, step)
+        for z in starts[0]:
+            for y in starts[1]:
+                for x in starts[2]:
+                    start = z, y, x
+                    cores = [
+                        slice(i, min(i + blockSize + 1, n))
+                        for i, n in zip(start, vol.shape)
+                    ]
+                    if not all((s.stop - s.start - 1) >= step for s in cores):
+                        continue
+                    slices = tuple(
+                        slice(max(s.start - step, 0), min(s.stop + step, n))
+                        for s, n in zip(cores, vol.shape)
+                    )
+                    offset = tuple(s.start for s in slices)
+                    lower = tuple(c.start - s.start for c, s in zip(cores, slices))
+                    upper = tuple(i + blockSize for i in lower)
+                    self._blocks.append((offset, slices, (lower, upper)))
+                    # Get value range of the core (as seen by marching cubes)
+                    block = vol[tuple(cores)][sub, sub, sub]
+                    self._ranges.append((float(block.min()), float(block.max())))
+
+        # For the shown mesh
+        self._isovalue = None
+        self._mesh = None
+        self._pending = {}
+        self._timer = None
+
+    @property
+    def blockCount(self):
+        """Get the number of blocks."""
+        return len(self._blocks)
+
+    def _GetIsovalue(self, isovalue):
+        if isovalue is None:
+            isovalue = 0.5 * (self._vol.min() + self._vol.max())
+        return float(isovalue)  # Will raise error if not float-like value given
+
+    def _GetExecutor(self):
+        if self._executor is None:
+            if self._useProcesses:
+                self._executor = ProcessPoolExecutor(self._workers)
+            else:
+                self._executor = ThreadPoolExecutor(self._workers)
+        return self._executor
+
+    def _CacheKey(self, i, isovalue):
+        return i, isovalue, self._step, self._useClassic
+
+    def _AddToCache(self, key, result):
+        self._cache[key] = result
+        while len(self._cache) > self._cacheSize:
+            self._cache.popitem(last=False)
+
+    def _Submit(self, isovalue):
+        """_Submit(isovalue)
+
+        Submit the blocks that contain the isovalue and are not cached.
+        Returns a dict mapping block index to future.
+
+        """
+        futures = {}
+        for i, (offset, slices, core) in enumerate(self._blocks):
+            # Skip blocks without surface (marching cubes would raise an
+            # error for these), vertices above the isovalue are inside
+            mi, ma = self._ranges[i]
+            if not (mi <= isovalue < ma):
+                continue
+            if self._CacheKey(i, isovalue) in self._cache:
+                continue
+            args = offset, core, isovalue, self._step, self._sampling, self._useClassic
+            block = self._vol[slices]
+            if self._useProcesses:
+                block = np.ascontiguousarray(block)
+            futures[i] = self._GetExecutor().submit(_marchBlock, block, *args)
+        return futures
+
+    def _Store(self, i, isovalue, future):
+        self._AddToCache(self._CacheKey(i, isovalue), future.result())
+
+    def _Combine(self, isovalue):
+        """_Combine(isovalue)
+
+        Combine the cached results for the given isovalue. Returns a BaseMesh
+        or None if there is no surface (yet).
+
+        """
+        results = []
+        for i in range(len(self._blocks)):
+            key = self._CacheKey(i, isovalue)
+            result = self._cache.get(key, None)
+            if result is not None and len(result[1]):
+                self._cache.move_to_end(key)
+                results.append(result)
+        if not results:
+            return None
+        vertices, faces, normals, values = weldBlocks(
+            results, self._sampling, self._blockSize
+        )
+        if self._useValues:
+            return vv.BaseMesh(vertices, faces, normals, values)
+        else:
+            return vv.BaseMesh(vertices, faces, normals)
+
+    def GetMesh(self, isovalue=None):
+        """GetMesh(isovalue=None)
+
+        Calculate the isosurface and return it as a BaseMesh. Blocks
+        are processed in parallel. If isovalue is not given or None, the
+        average of the min and max of the volume is used.
+
+        """
+        isovalue = self._GetIsovalue(isovalue)
+        for i, future in self._Submit(isovalue).items():
+            self._Store(i, isovalue, future)
+        mesh = self._Combine(isovalue)
+        if mesh is None:
+            raise RuntimeError("No surface found at the given iso value.")
+        return mesh
+
+    def ShowMesh(self, isovalue=None, axes=None):
+        """ShowMesh(isovalue=None, axes=None)
+
+        Create a Mesh object in the given axes (or the current axes) and
+        start calculating the isosurface. The mesh is updated as the blocks
+        finish, so the surface builds up progressively. Returns the Mesh.
+
+        """
+
+        # Create mesh with an invisible triangle that spans the volume
+        corner = np.array(self._vol.shape[::-1], np.float32) - 1
+        corner *= self._sampling[::-1]
+        vertices = np.array([(0, 0, 0), corner, corner], np.float32)
+        if axes is None:
+            axes = vv.gca()
+        self._mesh = vv.Mesh(axes, vertices)
+
+        # Create timer to poll the results
+        if self._timer is None:
+            self._timer = vv.Timer(self, 50, False)
+            self._timer.Bind(self._OnTimer)
+
+        # Start
+        self.isovalue = isovalue
+        return self._mesh
+
+    @property
+    def isovalue(self):
+        """Get/set the isovalue of the shown mesh (see ShowMesh()). Setting
+        the isovalue progressively updates the mesh.
+        """
+        return self._isovalue
+
+    @isovalue.setter
+    def isovalue(self, value):
+        self._isovalue = self._GetIsovalue(value)
+        if self._mesh is None:
+            return
+        # Cancel blocks that are not yet being processed
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = self._Submit(self._isovalue)
+        self._UpdateMesh()
+        if self._pending:
+            self._timer.Start()
+
+    def _OnTimer(self, event):
+        # Collect finished blocks
+        done = [i for i, future in self._pending.items() if future.done()]
+        for i in done:
+            self._Store(i, self._isovalue, self._pending.pop(i))
+        # Update mesh
+        if done:
+            self._UpdateMesh()
+        if not self._pending:
+            self._timer.Stop()
+
+    def _UpdateMesh(self):
+        mesh = self._mesh
+        if mesh is None or mesh._destroyed:
+            return
+        baseMesh = self._Combine(self._isovalue)
+        if baseMesh is None:
+            mesh.visible = False
+        else:
+            mesh.SetFaces(None)
+            mesh.SetVertices(baseMesh._vertices)
+            mesh.SetNormals(baseMesh._normals)
+            mesh.SetFaces(baseMesh._faces)
+            mesh.SetValues(baseMesh._values)
+            mesh.visible = True
+
+    def Close(self):
+        """Close()
+
+        Stop the workers. Results that are in the cache remain available.
+
+        """
+        if self._timer is not None:
+            self._timer.Destroy()
+            self._timer = None
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -21,6 +21,11 @@ the whole file (the text format only compresses arrays). It is more suited
 for storing really large databases or structures containing large arrays.
 Both formats are fully compatible.
 
+The binary format can also be stored uncompressed. In that case the
+array data is aligned and stored as-is, so that load() can memory map
+the arrays instead of reading them, and sub-structs are only loaded
+when they are accessed. This is suited for very large files.
+
 Functions of interest
 ---------------------
   * save    - save a struct to a file
@@ -30,6 +35,8 @@ Functions of interest
   * loads   - load a struct from a string
   * loadb   - load a struct from bytes
   * update  - update a struct on file with a given struct
+  * iterload - iterate over the items in a binary file
+  * StreamWriter - write a binary file incrementally
   * copy    - create a deep copy of a struct
   * new     - create a new empty struct
   * clear   - clear a struct, removing all elements
@@ -48,6 +55,7 @@ includes the ssdf package in this manner.
 
 __version__ = "2.1"
 
+import os
 import time
 
 # Create/import claassManager and insert two of its functions in this namespace
@@ -60,6 +68,7 @@ is_compatible_class = ClassManager.is_compatible_class
 from . import ssdf_base
 from .ssdf_base import Struct, isstruct, VirtualArray, binary_type, string_types
 from . import ssdf_text, ssdf_bin
+from .ssdf_bin import StreamWriter
 
 
 def _get_mode(filename, mode):
@@ -98,13 +107,16 @@ def _get_mode(filename, mode):
     return mode
 
 
-def save(filename, struct, mode=None):
-    """save(filename, struct, mode=None)
+def save(filename, struct, mode=None, compress=True, index=False):
+    """save(filename, struct, mode=None, compress=True, index=False)
 
     Save the given struct or dict to the filesystem using the given filename.
 
     Two modes are supported: text mode stores in a human readable format,
     and binary mode stores in a more efficient (compressed) binary format.
+    The file is first written under a temporary name and then replaces
+    the existing file, so a struct that was loaded (memory mapped) from
+    that file can be modified and saved to it again.
 
     Parameters
     ----------
@@ -119,6 +131,22 @@ def save(filename, struct, mode=None):
         This parameter can be used to explicitly specify the mode. Note
         that it is an error to use binary mode on a '.ssdf' file or text
         mode on a '.bsdf' file.
+    compress : {bool, 'zlib', 'zstd', 'lz4'}
+        For binary mode only. If False, the data is not compressed, and
+        the arrays are stored such that they can be memory mapped when
+        the file is loaded. Can also be the name of the codec to use.
+        Zstd and lz4 are faster than zlib (the default), but require
+        the zstandard and lz4 packages; zlib is used if these are not
+        available. The codec is stored in the file. Compression is done
+        in parallel on multiple cores.
+    index : bool
+        For compressed binary mode only. If True, an index of the
+        compressed partitions is stored, which allows ssdf.iterload()
+        to skip items without decompressing them.
+
+    Files compressed with zlib and without index can be read by all
+    versions of ssdf. Files with another codec or an index (header
+    'BSDI'), and uncompressed files (header 'BSDR') require ssdf 2.1.
 
     """
 
@@ -126,12 +154,14 @@ def save(filename, struct, mode=None):
     if not (isstruct(struct) or isinstance(struct, dict)):
         raise ValueError("ssdf.save() expects the second argument to be a struct.")
 
-    # Open file
-    f = open(filename, "wb")
-    try:
-        # Get mode
-        mode = _get_mode(filename, mode)
+    # Get mode
+    mode = _get_mode(filename, mode)
 
+    # Write to a temporary file, which is then moved into place, so that
+    # arrays that are memory mapped from the existing file remain valid.
+    tmpName = "%s.%i.tmp" % (filename, os.getpid())
+    f = open(tmpName, "wb")
+    try:
         # Write
         if mode == 1:
             writer = ssdf_text.TextSSDFWriter()
@@ -144,10 +174,16 @@ def save(filename, struct, mode=None):
             writer.write(struct, f)
         elif mode == 2:
             writer = ssdf_bin.BinarySSDFWriter()
-            writer.write(struct, f)
+            writer.write(struct, f, compress, index)
+
+        # Move into place
+        f.close()
+        os.replace(tmpName, filename)
 
     finally:
         f.close()
+        if os.path.isfile(tmpName):
+            os.remove(tmpName)
 
 
 def saves(struct):
@@ -170,8 +206,8 @@ def saves(struct):
     return writer.write(struct)
 
 
-def saveb(struct):
-    """saveb(struct)
+def saveb(struct, compress=True, index=False):
+    """saveb(struct, compress=True, index=False)
 
     Serialize the given struct or dict to (compressed) bytes.
 
@@ -179,6 +215,11 @@ def saveb(struct):
     ----------
     struct : {Struct, dict}
         The object to save.
+    compress : {bool, 'zlib', 'zstd', 'lz4'}
+        Whether to compress the data, and optionally the codec to use.
+        See save() for details.
+    index : bool
+        Whether to store an index of the compressed partitions.
 
     """
 
@@ -188,11 +229,11 @@ def saveb(struct):
 
     # Write
     writer = ssdf_bin.BinarySSDFWriter()
-    return writer.write(struct)
+    return writer.write(struct, None, compress, index)
 
 
-def load(filename):
-    """load(filename)
+def load(filename, mmap=True):
+    """load(filename, mmap=True)
 
     Load a struct from the filesystem using the given filename.
 
@@ -203,6 +244,11 @@ def load(filename):
     ----------
     filename : str
         The location in the filesystem of the file to load.
+    mmap : bool
+        For uncompressed binary files only. If True (default), the arrays
+        are memory mapped (copy-on-write), so their data is only read
+        when used. Note that the file should then not be overwritten
+        while the arrays are in use.
 
     """
 
@@ -214,7 +260,7 @@ def load(filename):
             firstfour = f.read(4).decode("utf-8")
         except Exception:
             raise ValueError("Not a valid ssdf file.")
-        if firstfour == "BSDF":
+        if firstfour in ("BSDF", "BSDI", "BSDR"):
             mode = 2
         else:
             mode = 1  # This is an assumption.
@@ -226,8 +272,42 @@ def load(filename):
             return reader.read(f)
         elif mode == 2:
             reader = ssdf_bin.BinarySSDFReader()
-            return reader.read(f)
+            return reader.read(f, mmap)
+
+    finally:
+        f.close()
+
+
+def iterload(filename, name=None):
+    """iterload(filename, name=None)
 
+    Iterate over the items in the root struct of a binary ssdf file,
+    yielding (name, value) tuples. Items are read and converted one at
+    a time, so this can be used for files that do not fit in memory.
+    Note that a list that was appended to in parts (by a StreamWriter)
+    is yielded once for each part.
+
+    Parameters
+    ----------
+    filename : str
+        The location in the filesystem of the file to load.
+    name : str, optional
+        If given, iterate over the elements of the list with this name
+        in the root struct instead (yielding only the values). Elements
+        appended with a StreamWriter can thus be read one by one. The
+        other items are skipped; in files saved with index=True, without
+        decompressing them.
+
+    """
+
+    f = open(filename, "rb")
+    try:
+        reader = ssdf_bin.BinarySSDFReader()
+        for block in reader.iter_items(f, name):
+            if name is None:
+                yield block._name, block.to_object()
+            else:
+                yield block.to_object()
     finally:
         f.close()
 
@@ -279,11 +359,18 @@ def update(filename, struct):
 
     For every dict in the data tree, the elements are updated.
     Note that any lists occuring in both data trees are simply replaced.
+    Binary files are written with the same codec and index settings.
 
     """
 
-    # Load existing struct
-    s = load(filename)
+    # Load existing struct (not mapped, since we overwrite the file),
+    # and get the compression settings to write it with
+    s = load(filename, False)
+    f = open(filename, "rb")
+    try:
+        compress, index = ssdf_bin._get_settings(f)
+    finally:
+        f.close()
 
     # Insert stuff
     def insert(ob1, ob2):
@@ -296,7 +383,7 @@ def update(filename, struct):
     insert(s, struct)
 
     # Save
-    save(filename, s)
+    save(filename, s, compress=compress, index=index)
 
 
 def new():
@@ -42,6 +42,10 @@ else:
 # To store other classes
 _CLASS_NAME = "_CLASS_NAME_"
 
+# Characters allowed in names (the first cannot be a digit)
+_NAMECHARS = str("abcdefghijklmnopqrstuvwxyz_0123456789")
+_NAMECHARS_SET = frozenset(_NAMECHARS)
+
 # Same as in ssdf_bin (we only need the dict type id.
 _TYPE_DICT = ord("D")
 
@@ -152,14 +156,12 @@ def _isvalidname(name):
         return None
 
     # Check name
-    namechars = str("abcdefghijklmnopqrstuvwxyz_0123456789")
     name2 = name.lower()
-    if name2[0] not in namechars[0:-10]:
+    if name2[0] not in _NAMECHARS[0:-10]:
         return None
-    tmp = list(map(lambda x: x not in namechars, name2[2:]))
 
     # Return
-    if sum(tmp) == 0:
+    if _NAMECHARS_SET.issuperset(name2[2:]):
         return name
 
 
@@ -337,6 +339,13 @@ class VirtualArray(object):
     def tostring(self):
         return self.data
 
+    def tobytes(self):
+        return self.data
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
     @property
     def size(self):
         if self.shape:
@@ -9,11 +9,16 @@
 Implements functionality to read/write binary ssdf (.bsdf) files.
 """
 
+import os
 import struct
 import zlib
+import bisect
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from . import ClassManager
 from .ssdf_base import Struct, VirtualArray, SSDFReader, SSDFWriter, Block, _CLASS_NAME
+from .ssdf_base import _isvalidname
 from .ssdf_base import np, binary_type, ascii_type
 
 
@@ -23,6 +28,83 @@ _LARGE_NUMBER_FMT = "<Q"
 _TYPE_FMT = "<B"
 _PARTITION_LEN_FMT = "<I"
 _PARTITION_SIZE = 2**20  # 1 MB
+_ALIGNMENT = 64  # Alignment of array data in uncompressed files
+_MAX_WORKERS = os.cpu_count() or 1  # For (de)compressing partitions
+
+# Headers for compressed files (without and with codec name and index),
+# and uncompressed (raw) files
+_HEADER = "BSDF".encode("utf-8")
+_HEADER_INDEXED = "BSDI".encode("utf-8")
+_HEADER_RAW = "BSDR".encode("utf-8")
+
+
+def _get_codecs():
+    """_get_codecs()
+
+    Get a dict that maps the names of the available codecs to
+    (compress, decompress) function pairs. Zlib is always available,
+    zstd and lz4 only when the corresponding package is installed.
+
+    """
+    codecs = {"zlib": (zlib.compress, zlib.decompress)}
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        codecs["zstd"] = (
+            lambda data: zstandard.ZstdCompressor().compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data),
+        )
+    try:
+        import lz4.frame
+    except ImportError:
+        pass
+    else:
+        codecs["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+    return codecs
+
+
+_CODECS = _get_codecs()
+
+
+def _open_compressed(f, compress=True, index=False):
+    """_open_compressed(f, compress=True, index=False)
+
+    Write the header of a compressed file and return a _CompressedFile
+    to write the data to. For zlib without index, the original 'BSDF'
+    format is used, so that the file can also be read by older versions
+    of ssdf. Otherwise, the file has the 'BSDI' header with the codec
+    name, and an index (see _CompressedFile).
+
+    """
+    codec = compress if compress in _CODECS else "zlib"
+    if codec == "zlib" and not index:
+        f.write(_HEADER)
+        return _CompressedFile(f)
+    codec_name = codec.encode("utf-8")
+    f.write(_HEADER_INDEXED)
+    f.write(struct.pack(_SMALL_NUMBER_FMT, len(codec_name)))
+    f.write(codec_name)
+    return _CompressedFile(f, codec)
+
+
+def _get_settings(f):
+    """_get_settings(f)
+
+    Read the header of the given binary file and return the compress
+    and index arguments with which it was written.
+
+    """
+    bb = f.read(len(_HEADER))
+    if bb == _HEADER_RAW:
+        return False, False
+    elif bb == _HEADER_INDEXED:
+        (n,) = struct.unpack(_SMALL_NUMBER_FMT, f.read(1))
+        return f.read(n).decode("utf-8"), True
+    else:
+        return True, False
+
 
 # Types for binary
 _TYPE_NONE = ord("N")
@@ -35,11 +117,13 @@ _TYPE_DICT = ord("D")
 
 
 class BinarySSDFReader(SSDFReader):
-    def read_binary_blocks(self, f):
-        """read_binary_blocks(f)
+    def read_binary_blocks(self, f, skip=None):
+        """read_binary_blocks(f, skip=None)
 
-        Given a file, creates the block instances.
-        This is a generator function.
+        Given a file, creates the block instances. If skip is given, it
+        is called with the indentation, name and type of each block; if
+        it returns True, the data of the block is skipped (and the data
+        of the block is None). This is a generator function.
 
         """
         count = 0
@@ -64,17 +148,64 @@ class BinarySSDFReader(SSDFReader):
 
             # Get data
             data_len = f.read_number()
-            data = f.read(data_len)
+            if skip is not None and skip(indent, name, type_id):
+                f.skip(data_len)
+                data = None
+            else:
+                data = f.read(data_len)
 
             # Create block instance
             yield BinaryBlock(indent, count, name, type_id, data=data)
 
-    def read(self, file_or_bytes):
-        """read(file_or_bytes)
+    def read_raw_blocks(self, f, end):
+        """read_raw_blocks(f, end)
 
-        Given a file or bytes, convert it to a struct by reading the
-        blocks, building the tree and converting each block to its
-        Python object.
+        Given a mapped file, creates the block instances for the blocks
+        up to the given end position. Array blocks get a view of the
+        mapped data, and dict blocks are not parsed until they are
+        converted to an object. This is a generator function.
+
+        """
+        count = 0
+        while f._fp < end:
+            count += 1
+
+            # Get type, indentation and name
+            (type_id,) = struct.unpack(_TYPE_FMT, f.read(1))
+            indent = f.read_number()
+            name_len = f.read_number()
+            if name_len:
+                name = f.read(name_len).decode("utf-8")
+            else:
+                name = None
+
+            # Get data
+            data_len = f.read_number()
+            data_end = f._fp + data_len
+            if type_id == _TYPE_ARRAY:
+                shape, dtypestr = _read_array_header(f)
+                pad = f.read_number()
+                f._fp += pad  # Skip padding
+                data = f.view(f._fp, data_end - f._fp, shape, dtypestr)
+            else:
+                data = f.read(data_len)
+            f._fp = data_end
+
+            # Create block instance
+            block = BinaryBlock(indent, count, name, type_id, data=data)
+            if type_id == _TYPE_DICT:
+                # Skip the blocks of the children
+                (subtree_len,) = struct.unpack("<Q", data)
+                block._lazy = self, f, f._fp, f._fp + subtree_len
+                f._fp += subtree_len
+            yield block
+
+    def read_blocks(self, file_or_bytes, mmap=True, skip=None):
+        """read_blocks(file_or_bytes, mmap=True, skip=None)
+
+        Given a file or bytes, check the header and create the block
+        instances. For compressed files, blocks can be skipped (see
+        read_binary_blocks). This is a generator function.
 
         """
 
@@ -85,25 +216,97 @@ class BinarySSDFReader(SSDFReader):
             f = file_or_bytes
 
         # Check header
-        bb1 = "BSDF".encode("utf-8")
         try:
-            bb2 = f.read(len(bb1))
+            bb = f.read(len(_HEADER))
         except Exception:
             raise ValueError("Could not read header of binary SSDF file.")
-        if bb1 != bb2:
+        if bb not in (_HEADER, _HEADER_INDEXED, _HEADER_RAW):
             raise ValueError("Given SSDF bytes/file does not have the right header.")
 
-        # Create compressed file to read from
-        fc = _CompressedFile(f)
+        if bb == _HEADER_RAW:
+            # Map the file (or bytes) and read from that
+            if isinstance(f, _VirtualFile):
+                fm = _MappedFile(f._bb)
+            elif mmap and np:
+                fm = _MappedFile(np.memmap(f, dtype=np.uint8, mode="c"))
+            else:
+                fm = _MappedFile(bb + f.read())
+            fm._fp = len(_HEADER_RAW)
+            for block in self.read_raw_blocks(fm, len(fm)):
+                yield block
+        else:
+            # Create compressed file to read from
+            codec = None
+            if bb == _HEADER_INDEXED:
+                (n,) = struct.unpack(_SMALL_NUMBER_FMT, f.read(1))
+                codec = f.read(n).decode("utf-8")
+            fc = _CompressedFile(f, codec)
+            try:
+                for block in self.read_binary_blocks(fc, skip):
+                    yield block
+            finally:
+                fc.close()
+
+    def read(self, file_or_bytes, mmap=True):
+        """read(file_or_bytes, mmap=True)
+
+        Given a file or bytes, convert it to a struct by reading the
+        blocks, building the tree and converting each block to its
+        Python object.
+
+        For uncompressed files, arrays are memory mapped if mmap is True
+        (and a file is given), and sub-structs are loaded on first
+        access.
+
+        """
 
         # Create blocks and build tree
         root = BinaryBlock(-1, -1, type=_TYPE_DICT)
-        block_gen = self.read_binary_blocks(fc)
-        self.build_tree(root, block_gen)
+        self.build_tree(root, self.read_blocks(file_or_bytes, mmap))
 
         # Convert to real objects and return
         return root.to_object()
 
+    def iter_items(self, file_or_bytes, name=None, mmap=True):
+        """iter_items(file_or_bytes, name=None, mmap=True)
+
+        Given a file or bytes, yield the blocks of the items at the
+        root level. If name is given, yield the blocks of the elements
+        of the list(s) with that name at the root level instead. The
+        data of the other items is skipped (for indexed files without
+        decompressing it). The blocks are yielded as soon as they are
+        complete. This is a generator function.
+
+        """
+        level = 0 if name is None else 1
+        selected = name is None
+        item, tree = None, []
+
+        # The data of the items that are not selected is not needed
+        def skip(indent, blockName, type_id):
+            if indent == 0:
+                return blockName != name or type_id != _TYPE_LIST
+            return not selected
+
+        blocks = self.read_blocks(file_or_bytes, mmap, None if name is None else skip)
+        for block in blocks:
+            # Is the current item complete?
+            if item is not None and block._indent <= level:
+                yield item
+                item = None
+            # Select, start a new item, or add to the current item
+            if name is not None and block._indent == 0:
+                selected = block._name == name and block._type == _TYPE_LIST
+            elif selected and block._indent == level:
+                item, tree = block, [block]
+            elif item is not None:
+                while block._indent <= tree[-1]._indent:
+                    tree.pop()
+                tree[-1]._children.append(block)
+                tree.append(block)
+        if item is not None:
+            yield item
+
 
 class BinarySSDFWriter(SSDFWriter):
     def write_binary_blocks(self, blocks, f):
@@ -140,12 +343,65 @@ class BinarySSDFWriter(SSDFWriter):
                 f.write_number(data_len)
                 f.write(block._data)
 
-    def write(self, object, f=None):
-        """write(object, f=None)
+    def write_raw_blocks(self, block, f):
+        """write_raw_blocks(block, f)
+
+        Writes the children of the given block to an uncompressed
+        binary file. Array data is aligned and written as-is. Dict
+        blocks store the byte size of their children, so that these
+        can be skipped on reading. Returns the number of bytes written.
+
+        """
+        pos0 = f._fp
+        for child in block._children:
+            # Write type, indentation and name
+            f.write(struct.pack(_TYPE_FMT, child._type))
+            f.write_number(child._indent)
+            if child._name:
+                name = child._name.encode("utf-8")
+                f.write_number(len(name))
+                f.write(name)
+            else:
+                f.write_number(0)
+
+            # Write data
+            if child._type == _TYPE_ARRAY:
+                # Header, padding and data. The data length is always
+                # written as a large number, so we know where the data starts
+                header, data = child._data
+                pad = -(f._fp + 9 + len(header) + 1) % _ALIGNMENT
+                f.write_large_number(len(header) + 1 + pad + len(data))
+                f.write(header)
+                f.write_number(pad)
+                f.write(binary_type(pad))
+                f.write(data)
+            elif child._type == _TYPE_DICT:
+                # The size of the children is only known after writing
+                # them, which is why we do a dry run first (see write())
+                f.write_number(8)
+                f.write(struct.pack("<Q", getattr(child, "_subtree_len", 0)))
+                child._subtree_len = self.write_raw_blocks(child, f)
+            else:
+                f.write_number(len(child._data))
+                f.write(child._data)
+                self.write_raw_blocks(child, f)
+
+        return f._fp - pos0
+
+    def write(self, object, f=None, compress=True, index=False):
+        """write(object, f=None, compress=True, index=False)
 
         Serializes the given struct. If a file is given, writes bytes
         to that file, otherwise returns a bytes instance.
 
+        If compress is False, the data is not compressed, and arrays
+        are aligned such that they can be memory mapped on reading.
+        Compress can also be the name of the codec to use: 'zlib'
+        (default), 'zstd' or 'lz4'. Zlib is used if the codec is not
+        available. If index is True, an index of the partitions is
+        written. Files with another codec than zlib or with an index
+        cannot be read by versions of ssdf older than 2.1.
+
         """
 
         # Check input
@@ -155,26 +411,129 @@ class BinarySSDFWriter(SSDFWriter):
         else:
             return_bytes = False
 
-        # Write header
-        f.write("BSDF".encode("utf-8"))
-
-        # Make compressed file
-        fc = _CompressedFile(f)
-
         # Create block object
         root = BinaryBlock.from_object(-1, binary_type(), object)
 
-        # Collect blocks and write
-        blocks = self.flatten_tree(root)
-        self.write_binary_blocks(blocks, fc)
-        fc.flush()
+        if compress:
+            # Write header and make compressed file
+            fc = _open_compressed(f, compress, index)
+
+            # Collect blocks and write
+            blocks = self.flatten_tree(root)
+            self.write_binary_blocks(blocks, fc)
+            fc.flush()
+
+        else:
+            # Dry run to determine the sizes of the dicts, then write
+            f.write(_HEADER_RAW)
+            self.write_raw_blocks(root, _RawFile(None, len(_HEADER_RAW)))
+            self.write_raw_blocks(root, _RawFile(f, len(_HEADER_RAW)))
 
         # Return?
         if return_bytes:
             return f.get_bytes()
 
 
+class StreamWriter(object):
+    """StreamWriter(filename, compress=True, index=False)
+
+    Write a binary ssdf file incrementally, e.g. to log data that comes
+    in over a long period of time. Items are written to the file right
+    away, so the memory use does not grow with the size of the file.
+    The resulting file can be read with ssdf.load() and ssdf.iterload().
+
+    Use write(name, value) to add an item to the root struct, and
+    append(name, value) to append an element to a list in the root
+    struct. Call close() when done (or use the writer as a context
+    manager). The compress and index arguments are as in ssdf.save().
+
+    """
+
+    def __init__(self, filename, compress=True, index=False):
+        self._file = open(filename, "wb")
+        self._writer = BinarySSDFWriter()
+        self._list = None  # The name of the list we are appending to
+
+        if compress:
+            self._fc = _open_compressed(self._file, compress, index)
+        else:
+            self._file.write(_HEADER_RAW)
+            self._fc = _RawFile(self._file, len(_HEADER_RAW))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def _write_block(self, block):
+        # Put the block in a tree and write it
+        root = BinaryBlock(block._indent - 1, -1)
+        root._children.append(block)
+        if isinstance(self._fc, _RawFile):
+            self._writer.write_raw_blocks(root, _RawFile(None, self._fc._fp))
+            self._writer.write_raw_blocks(root, self._fc)
+        else:
+            self._writer.write_binary_blocks(self._writer.flatten_tree(root), self._fc)
+
+    def write(self, name, value):
+        """write(name, value)
+
+        Write an item with the given name and value to the root struct.
+        If an item with the same name is written multiple times, the
+        last one wins on loading (except for lists, which are joined).
+
+        """
+        if not _isvalidname(name):
+            raise ValueError("Invalid name for ssdf item: '%s'." % name)
+        self._list = None
+        self._write_block(BinaryBlock.from_object(0, name, value))
+
+    def append(self, name, value):
+        """append(name, value)
+
+        Append an element to the list with the given name in the root
+        struct. Lists can be appended to in any order.
+
+        """
+        if not _isvalidname(name):
+            raise ValueError("Invalid name for ssdf item: '%s'." % name)
+        if self._list != name:
+            # Start a new list block; these are joined on loading
+            self._write_block(BinaryBlock.from_object(0, name, []))
+            self._list = name
+        self._write_block(BinaryBlock.from_object(1, None, value))
+
+    def flush(self):
+        """flush()
+
+        Write any buffered data to the file.
+
+        """
+        if isinstance(self._fc, _CompressedFile):
+            if self._fc._pp:
+                self._fc._write_new_partition()
+            while self._fc._pending:
+                self._fc._write_pending_partition()
+        self._file.flush()
+
+    def close(self):
+        """close()
+
+        Write any buffered data and close the file.
+
+        """
+        if self._file.closed:
+            return
+        if isinstance(self._fc, _CompressedFile):
+            self._fc.flush()
+        self._file.close()
+
+
 class BinaryBlock(Block):
+    # For dict blocks in uncompressed files: (reader, file, begin, end)
+    _lazy = None
+
     def to_object(self):
         # Determine what type of object we are dealing with using the
         # type id.
@@ -190,6 +549,13 @@ class BinaryBlock(Block):
         elif type == _TYPE_LIST:
             return self._to_list()
         elif type == _TYPE_DICT:
+            if self._lazy:
+                # Read the blocks of the children now
+                reader, f, i1, i2 = self._lazy
+                self._lazy = None
+                fp, f._fp = f._fp, i1
+                reader.build_tree(self, reader.read_raw_blocks(f, i2))
+                f._fp = fp
             return self._to_dict()
         elif type == _TYPE_NONE:
             return self._to_none()
@@ -233,16 +599,19 @@ class BinaryBlock(Block):
         for s in value.shape:
             f.write_number(s)
         f.write_string(str(value.dtype))
-        # Write data
-        # tostring() returns bytes, not a string on py3k
-        self._data = [f.get_bytes(), value.tostring()]
+        # Write data, without making a copy if we can
+        if isinstance(value, VirtualArray):
+            data = value.data
+        else:
+            data = memoryview(np.ascontiguousarray(value).reshape(-1)).cast("B")
+        self._data = [f.get_bytes(), data]
 
     def _to_array(self):
+        if not isinstance(self._data, binary_type):
+            return self._data  # A view of a mapped file, see _MappedFile
         f = _VirtualFile(self._data)
         # Get shape and dtype
-        ndim = f.read_number()
-        shape = [f.read_number() for i in range(ndim)]
-        dtypestr = ascii_type(f.read_string())
+        shape, dtypestr = _read_array_header(f)
         # Create numpy array or Virtual array
         i = f._fp
         if not np:
@@ -280,13 +649,25 @@ class BinaryBlock(Block):
             self._children.append(subBlock)
 
     def _to_dict(self):
-        value = Struct()
+        if any([child._lazy for child in self._children]):
+            value = LazyStruct()
+        else:
+            value = Struct()
         for child in self._children:
-            val = child.to_object()
-            if child._name:
-                value[child._name] = val
+            if child._lazy:
+                val = _LazyItem(child)
             else:
+                val = child.to_object()
+            if not child._name:
                 print("SSDF: unnamed element in dict in block %i." % child._blocknr)
+            elif child._type == _TYPE_LIST and isinstance(
+                value.__dict__.get(child._name), list
+            ):
+                # Lists that occur multiple times are concatenated, which
+                # happens when a StreamWriter appends to multiple lists
+                value.__dict__[child._name].extend(val)
+            else:
+                value[child._name] = val
         # Make class instance?
         if _CLASS_NAME in value:
             className = value[_CLASS_NAME]
@@ -319,6 +700,53 @@ class BinaryBlock(Block):
         return value
 
 
+class LazyStruct(Struct):
+    """LazyStruct
+
+    A Struct loaded from an uncompressed binary ssdf file, of which the
+    sub-structs are loaded when they are first accessed.
+
+    """
+
+    def __getattribute__(self, name):
+        value = Struct.__getattribute__(self, name)
+        if isinstance(value, _LazyItem):
+            value = Struct.__getattribute__(self, "__dict__")[name] = value.load()
+        return value
+
+    def __getitem__(self, key):
+        value = Struct.__getitem__(self, key)
+        if isinstance(value, _LazyItem):
+            value = self.__dict__[key] = value.load()
+        return value
+
+
+class _LazyItem(object):
+    """_LazyItem(block)
+
+    Placeholder for a dict block in a LazyStruct.
+
+    """
+
+    def __init__(self, block):
+        self._block = block
+
+    def load(self):
+        return self._block.to_object()
+
+
+def _read_array_header(f):
+    """_read_array_header(f)
+
+    Read the shape and dtype of an array block from the given file.
+
+    """
+    ndim = f.read_number()
+    shape = [f.read_number() for i in range(ndim)]
+    dtypestr = ascii_type(f.read_string())
+    return shape, dtypestr
+
+
 class _FileWithExtraMethods:
     def write_number(self, n):
         if n < 255:
@@ -327,6 +755,10 @@ class _FileWithExtraMethods:
             self.write(struct.pack(_SMALL_NUMBER_FMT, 255))
             self.write(struct.pack(_LARGE_NUMBER_FMT, n))
 
+    def write_large_number(self, n):
+        self.write(struct.pack(_SMALL_NUMBER_FMT, 255))
+        self.write(struct.pack(_LARGE_NUMBER_FMT, n))
+
     def write_bytes(self, bb):
         self.write_number(len(bb))
         self.write(bb)
@@ -372,6 +804,14 @@ class _VirtualFile(_FileWithExtraMethods):
     def write(self, data):
         self._parts.append(data)
 
+    def seek(self, pos, whence=0):
+        if whence == 2:
+            pos += len(self._bb)
+        self._fp = pos
+
+    def tell(self):
+        return self._fp
+
     def close(self):
         pass
 
@@ -379,8 +819,56 @@ class _VirtualFile(_FileWithExtraMethods):
         return binary_type().join(self._parts)
 
 
+class _MappedFile(_VirtualFile):
+    """_MappedFile(bb)
+
+    Wraps a memory mapped file (an np.memmap of bytes) or a bytes
+    instance to read an uncompressed binary file from. Arrays are
+    obtained as views, so their data is not read until it is used.
+
+    """
+
+    def __init__(self, bb):
+        self._view = memoryview(bb).cast("B")
+        if np and isinstance(bb, binary_type):
+            bb = np.frombuffer(bb, dtype=np.uint8)
+        _VirtualFile.__init__(self, bb)
+
+    def __len__(self):
+        return len(self._view)
+
+    def read(self, n):
+        i1 = self._fp
+        self._fp = i2 = self._fp + n
+        return self._view[i1:i2].tobytes()
+
+    def view(self, i, n, shape, dtypestr):
+        if not np:
+            return VirtualArray(shape, dtypestr, self._view[i : i + n].tobytes())
+        return self._bb[i : i + n].view(dtypestr).reshape(shape)
+
+
+class _RawFile(_FileWithExtraMethods):
+    """_RawFile(file, fp)
+
+    Wraps a file object to keep track of the position (which also
+    works for streams and _VirtualFile objects). If file is None,
+    data is not written, but the position is still tracked.
+
+    """
+
+    def __init__(self, f, fp=0):
+        self._file = f
+        self._fp = fp
+
+    def write(self, data):
+        self._fp += len(data)
+        if self._file is not None:
+            self._file.write(data)
+
+
 class _CompressedFile(_FileWithExtraMethods):
-    """_CompressedFile(file)
+    """_CompressedFile(file, codec=None)
 
     Wraps a file object to transparantly support reading and writing
     data from/to a compressed file.
@@ -388,21 +876,65 @@ class _CompressedFile(_FileWithExtraMethods):
     Data is compressed in partitions of say 1MB. A partition in the file
     consists of a small header and a body. The header consists of 4 bytes
     representing the body's length (little endian unsigned 32 bit int).
-    The body consists of bytes compressed using DEFLATE (i.e. zip).
+    The body consists of bytes compressed using the given codec. The
+    partitions are (de)compressed in parallel using a pool of threads.
+
+    If codec is None, the file is in the original format: the
+    partitions are compressed with DEFLATE (i.e. zip) and follow each
+    other up to the end of the file. Otherwise, the last partition is
+    followed by a header of zero, and an index: the number of partitions,
+    and for each partition its offset in the file and its (uncompressed)
+    size. The last 8 bytes of the file contain the offset of the index.
+    These offsets are relative to the first partition. The index is used
+    by seek(), so that skip() does not need to decompress the partitions
+    that it skips (e.g. in ssdf.iterload()).
 
     """
 
-    def __init__(self, f):
-        # Store file
+    def __init__(self, f, codec=None):
+        # Store file and codec
         self._file = f
+        self._indexed = codec is not None
+        if codec is None:
+            codec = "zlib"
+        elif codec not in _CODECS:
+            raise RuntimeError("SSDF: codec %s is not available." % codec)
+        self._compress, self._decompress = _CODECS[codec]
+
+        # For (de)compressing in parallel
+        self._pool = None
+        self._pending = deque()
 
         # For reading
         self._buffer = binary_type()
         self._bp = 0  # buffer pointer
+        self._eof = False
+        self._index = None  # list of (offset, uncompressed position)
+        self._pos = 0  # position in the uncompressed data
+        try:
+            self._begin = f.tell()  # file position of first partition
+        except Exception:
+            self._begin = None
 
         # For writing
         self._parts = []
         self._pp = 0  # parts pointer (is more like a counter)
+        self._offsets = []
+        self._sizes = []
+        self._fp = 0  # file pointer (relative to first partition)
+
+    def _submit(self, func, data):
+        """_submit(func, data)
+
+        Apply the given function to the data, in a thread if there
+        are multiple cores. Returns a function that returns the result.
+
+        """
+        if _MAX_WORKERS == 1:
+            return lambda: func(data)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(_MAX_WORKERS)
+        return self._pool.submit(func, data).result
 
     def _read_new_partition(self):
         """_read_new_partition()
@@ -412,22 +944,28 @@ class _CompressedFile(_FileWithExtraMethods):
 
         """
 
-        # Get bytes and read partition length
-        # If eof, return True
-        bb = self._file.read(4)
-        if not bb:
+        # Read partitions ahead and decompress them in parallel
+        while len(self._pending) < 2 * _MAX_WORKERS and not self._eof:
+            # Get bytes and read partition length
+            bb = self._file.read(4)
+            if len(bb) < 4:
+                self._eof = True
+                break
+            (n,) = struct.unpack(_PARTITION_LEN_FMT, bb)
+            if n == 0 and self._indexed:
+                self._eof = True  # The index follows
+                break
+            # Read partition and decompress
+            self._pending.append(self._submit(self._decompress, self._file.read(n)))
+
+        # If eof, return False
+        if not self._pending:
             self._buffer = binary_type()
             self._bp = 0
             return False
-        (n,) = struct.unpack(_PARTITION_LEN_FMT, bb)
-
-        # Read partition and decompress
-        bb = self._file.read(n)
-        data = zlib.decompress(bb)
-        del bb
 
         # Done
-        return data
+        return self._pending.popleft()()
 
     def _write_new_partition(self):
         """_write_new_partition()
@@ -438,17 +976,29 @@ class _CompressedFile(_FileWithExtraMethods):
 
         # Get data
         data = binary_type().join(self._parts)
+        self._sizes.append(len(data))
 
         # Reset buffer
         self._parts = []
         self._pp = 0
 
-        # Compress and write
-        bb = zlib.compress(data)
+        # Compress, and write partitions that are done
+        self._pending.append(self._submit(self._compress, data))
         del data
-        header = struct.pack(_PARTITION_LEN_FMT, len(bb))
-        self._file.write(header)
+        while len(self._pending) > 2 * _MAX_WORKERS:
+            self._write_pending_partition()
+
+    def _write_pending_partition(self):
+        """_write_pending_partition()
+
+        Wait for the oldest partition to be compressed and write it.
+
+        """
+        bb = self._pending.popleft()()
+        self._offsets.append(self._fp)
+        self._file.write(struct.pack(_PARTITION_LEN_FMT, len(bb)))
         self._file.write(bb)
+        self._fp += 4 + len(bb)
 
     def read(self, n):
         """read(n)
@@ -460,6 +1010,7 @@ class _CompressedFile(_FileWithExtraMethods):
 
         # Get bytes in buffer
         bytes_in_buffer = len(self._buffer) - self._bp
+        self._pos += n
 
         if bytes_in_buffer < n:
             # Read partitions untill we have enough
@@ -494,6 +1045,70 @@ class _CompressedFile(_FileWithExtraMethods):
 
         return data
 
+    def seek(self, pos):
+        """seek(pos)
+
+        Move to the given position in the uncompressed data. Only the
+        partition containing that position is decompressed. Requires
+        an indexed file and an underlying file that supports seeking.
+
+        """
+
+        # Read index
+        if self._index is None:
+            if not self._indexed:
+                raise RuntimeError("SSDF: can only seek in indexed files.")
+            if self._begin is None:
+                raise RuntimeError("SSDF: cannot seek in the underlying file.")
+            self._file.seek(-8, 2)
+            (index_offset,) = struct.unpack("<Q", self._file.read(8))
+            self._file.seek(self._begin + index_offset)
+            (count,) = struct.unpack("<Q", self._file.read(8))
+            index = struct.unpack("<%iQ" % (2 * count), self._file.read(16 * count))
+            offsets, positions = index[0::2], [0]
+            for size in index[1::2]:
+                positions.append(positions[-1] + size)
+            self._index = list(zip(offsets, positions))
+
+        # Find partition
+        positions = [p for o, p in self._index]
+        i = max(0, bisect.bisect_right(positions, pos) - 1)
+        offset, partition_pos = self._index[i]
+
+        # Read it
+        self._pending.clear()
+        self._eof = False
+        self._file.seek(self._begin + offset)
+        partition = self._read_new_partition() or binary_type()
+        self._buffer = partition
+        self._bp = pos - partition_pos
+        self._pos = pos
+
+    def tell(self):
+        """tell()
+
+        Get the position in the uncompressed data.
+
+        """
+        return self._pos
+
+    def skip(self, n):
+        """skip(n)
+
+        Skip n bytes. For indexed files, the partitions that are skipped
+        entirely are not decompressed (if the underlying file supports
+        seeking).
+
+        """
+        if (
+            self._indexed
+            and self._begin is not None
+            and n > len(self._buffer) - self._bp + _PARTITION_SIZE
+        ):
+            self.seek(self._pos + n)
+        else:
+            self.read(n)
+
     def write(self, data):
         """write(data)
 
@@ -503,25 +1118,45 @@ class _CompressedFile(_FileWithExtraMethods):
 
         """
 
-        # Get how many bytes we have beyond _PARTITION_SIZE
-        i = (self._pp + len(data)) - _PARTITION_SIZE
-
-        if i > 0:
-            # Add portion to buffer, store remainder
+        # Write away full partitions
+        while self._pp + len(data) >= _PARTITION_SIZE:
+            i = _PARTITION_SIZE - self._pp
             self._parts.append(data[:i])
             data = data[i:]
-            # Write the buffer away and reset buffer
             self._write_new_partition()
 
         # Add data to buffer
-        self._parts.append(data)
-        self._pp += len(data)
+        if len(data):
+            self._parts.append(data)
+            self._pp += len(data)
 
     def flush(self):
         """flush()
 
         After the last write, use this to compress and write
-        the last partition.
+        the last partition, and the index.
 
         """
         self._write_new_partition()
+        while self._pending:
+            self._write_pending_partition()
+        if self._indexed:
+            index = []
+            for offset, size in zip(self._offsets, self._sizes):
+                index.extend([offset, size])
+            self._file.write(struct.pack(_PARTITION_LEN_FMT, 0))
+            self._file.write(struct.pack("<Q", len(self._offsets)))
+            self._file.write(struct.pack("<%iQ" % len(index), *index))
+            self._file.write(struct.pack("<Q", self._fp + 4))
+        self.close()
+
+    def close(self):
+        """close()
+
+        Stop the threads that (de)compress the partitions.
+
+        """
+        self._pending.clear()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -9,9 +9,9 @@
 Implements functionality to read/write text ssdf files.
 """
 
-import sys
 import struct
 import base64
+import binascii
 import zlib
 import re
 
@@ -21,15 +21,8 @@ from .ssdf_base import _shapeString, _FLOAT_TYPES, _INT_TYPES, _TYPE_DICT
 from .ssdf_base import np, string_types, binary_type, ascii_type, reduce
 
 
-# Get base64 encode/decode functions
-PY3 = sys.version_info[0] == 3
-if PY3:
-    base64encode = base64.encodebytes
-    base64decode = base64.decodebytes
-else:
-    base64encode = base64.encodestring
-    base64decode = base64.decodestring
-
+# To split name and value of a line
+_NAME_RE = re.compile(r"^\w+? *?=")
 
 # The data types for arrays and how the struct (un)pack formatters.
 _DTYPES = {
@@ -67,7 +60,7 @@ class TextSSDFReader(SSDFReader):
             indent = len(line) - len(line2)
 
             # Split name and value using a regular expression
-            m = re.search(r"^\w+? *?=", line2)
+            m = _NAME_RE.match(line2)
             if m:
                 i = m.end(0)
                 name = line2[: i - 1].strip()
@@ -93,8 +86,7 @@ class TextSSDFReader(SSDFReader):
         if isinstance(file_or_string, string_types):
             lines = file_or_string.splitlines()
         else:
-            lines = file_or_string.readlines()
-            lines = [line.decode("utf-8") for line in lines]
+            lines = file_or_string.read().decode("utf-8").splitlines()
 
         # Create blocks and build tree
         root = TextBlock(-1, -1, data="dict:")
@@ -323,6 +315,19 @@ class TextBlock(Block):
             return self._to_list2()
 
     def _to_list2(self):
+        # Fast path for lists of numbers
+        line = self._data
+        i = line.find("]")
+        if i > 0 and "'" not in line[:i]:
+            try:
+                return [
+                    float(piece) if "." in piece else int(piece)
+                    for piece in line[1:i].split(",")
+                    if piece.strip()
+                ]
+            except ValueError:
+                pass  # Not all numbers, e.g. Null
+
         i0 = 1
         pieces = []
         inString = False
@@ -380,18 +385,17 @@ class TextBlock(Block):
 
         else:
             # Store binary
-            # Get raw data
-            data = value.tostring()
+            # Get raw data (without making a copy if we can)
+            if isinstance(value, VirtualArray):
+                data = value.data
+            else:
+                data = memoryview(np.ascontiguousarray(value).reshape(-1)).cast("B")
             # In blocks of 1MB, compress and encode
             BS = 1024 * 1024
             texts = []
-            i = 0
-            while i < len(data):
-                block = data[i : i + BS]
-                blockc = zlib.compress(block)
-                text = base64encode(blockc).decode("utf-8")
-                texts.append(text.replace("\n", ""))
-                i += BS
+            for i in range(0, len(data), BS):
+                blockc = zlib.compress(data[i : i + BS])
+                texts.append(base64.b64encode(blockc).decode("utf-8"))
             text = ";".join(texts)
             self._data = "array %s %s %s" % (shapestr, dtypestr, text)
 
@@ -433,34 +437,25 @@ class TextBlock(Block):
             data = binary_type()
 
         elif asAscii:
-            # Stored in ascii
-            dataparts = []
-            fmt = _DTYPES[dtypestr]
-            for val in word4.split(","):
-                if not val.strip():
-                    continue
+            # Stored in ascii, parse in one go if we can
+            data = None
+            if np:
+                pieces = word4.rstrip().rstrip(",").split(",")
                 try:
-                    if "int" in dtypestr:
-                        val = int(val)
-                    else:
-                        val = float(val)
-                    dataparts.append(struct.pack(fmt, val))
-                except Exception:
-                    if "int" in dtypestr:
-                        dataparts.append(struct.pack(fmt, 0))
-                    else:
-                        dataparts.append(struct.pack(fmt, float("nan")))
-
-            data = binary_type().join(dataparts)
+                    with np.errstate(over="raise", invalid="raise"):
+                        data = np.array(pieces).astype(dtypestr).tobytes()
+                except (ValueError, OverflowError, FloatingPointError):
+                    pass
+            if data is None or len(pieces) != size:
+                data = self._parse_ascii_array(word4, dtypestr)
 
         else:
             # Stored binary
             # Get data: decode and decompress in blocks
             dataparts = []
             for blockt in word4.split(";"):
-                blockc = base64decode(blockt.encode("utf-8"))
-                block = zlib.decompress(blockc)
-                dataparts.append(block)
+                blockc = binascii.a2b_base64(blockt)
+                dataparts.append(zlib.decompress(blockc))
             data = binary_type().join(dataparts)
 
         # Almost done ...
@@ -479,3 +474,28 @@ class TextBlock(Block):
         else:
             # Empty numpy array
             return np.zeros(shape, dtype=dtypestr)
+
+    def _parse_ascii_array(self, text, dtypestr):
+        """_parse_ascii_array(text, dtypestr)
+
+        Parse the comma separated numbers one by one. Numbers that
+        cannot be parsed become 0 or nan.
+
+        """
+        dataparts = []
+        fmt = _DTYPES[dtypestr]
+        for val in text.split(","):
+            if not val.strip():
+                continue
+            try:
+                if "int" in dtypestr:
+                    val = int(val)
+                else:
+                    val = float(val)
+                dataparts.append(struct.pack(fmt, val))
+            except Exception:
+                if "int" in dtypestr:
+                    dataparts.append(struct.pack(fmt, 0))
+                else:
+                    dataparts.append(struct.pack(fmt, float("nan")))
+        return binary_type().join(dataparts)
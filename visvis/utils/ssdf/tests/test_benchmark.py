@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2012, Almar Klein
+#
+# SSDF is distributed under the terms of the (new) BSD License.
+# See http://www.opensource.org/licenses/bsd-license.php
+
+"""Script test_benchmark
+
+Measure the save and load throughput of the text and binary formats,
+for random structs (as created in test_random.py), and for structs
+with large arrays (like volumes and meshes).
+
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "..", "..", "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "..")))
+
+import ssdf  # noqa: E402
+from test_random import Generator, compare  # noqa: E402
+
+
+def create_array_struct():
+    s = ssdf.new()
+    s.vol = (np.random.normal(0, 100, (128, 128, 128))).astype(np.int16)
+    s.vertices = np.random.normal(0, 1, (200000, 3)).astype(np.float32)
+    s.faces = np.random.randint(0, 200000, (400000, 3)).astype(np.int32)
+    s.small = [np.random.rand(3, 3) for i in range(1000)]
+    s.numbers = list(range(1000))
+    return s
+
+
+def timeit(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def benchmark(name, structs):
+    """Save and load the given structs in each format, and print
+    the time and throughput (based on the size of the binary file).
+    """
+    tempdir = tempfile.mkdtemp()
+    fname_text = os.path.join(tempdir, "benchmark.ssdf")
+    fname_bin = os.path.join(tempdir, "benchmark.bsdf")
+
+    # Size of the data
+    nbytes = sum([len(ssdf.saveb(s, False)) for s in structs])
+    print("%s (%i structs, %1.1f MB):" % (name, len(structs), nbytes / 2**20))
+
+    for mode, fname, kwargs in [
+        ("text", fname_text, {}),
+        ("binary", fname_bin, {}),
+        ("uncompressed", fname_bin, {"compress": False}),
+    ]:
+        t_save = t_load = 0.0
+        for s in structs:
+            t, _ = timeit(ssdf.save, fname, s, **kwargs)
+            t_save += t
+            t, s2 = timeit(ssdf.load, fname)
+            t_load += t
+            if not compare(s, s2):
+                print("  %s: loaded struct does not match" % mode)
+        print(
+            "  %-12s save %7.3f s (%7.1f MB/s)  load %7.3f s (%7.1f MB/s)"
+            % (
+                mode,
+                t_save,
+                nbytes / 2**20 / t_save,
+                t_load,
+                nbytes / 2**20 / t_load,
+            )
+        )
+
+    os.remove(fname_text)
+    os.remove(fname_bin)
+    os.rmdir(tempdir)
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    np.random.seed(0)
+    benchmark("Random structs", [Generator.create_struct() for i in range(50)])
+    benchmark("Large arrays", [create_array_struct()])
@@ -91,7 +91,7 @@ class Generator:
         dtype = random.choice([key for key in ssdf.ssdf_text._DTYPES.keys()])
         # Create array
         if "int" in dtype:
-            return np.random.random_integers(0, 100, shape).astype(dtype)
+            return np.random.randint(0, 101, shape).astype(dtype)
         else:
             return np.random.random_sample(shape).astype(dtype)
 
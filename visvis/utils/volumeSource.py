@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012, Almar Klein
+#
+# Visvis is distributed under the terms of the (new) BSD License.
+# The full license can be found in 'license.txt'.
+
+"""Module volumeSource
+
+Defines the VolumeSource class, which represents a (possibly very large)
+volume of which the data is read on demand, in slabs of z-slices.
+
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class VolumeSource(object):
+    """VolumeSource(source, shape=None, dtype=None, sampling=None,
+                origin=None, offset=0, name='vol', slabSize=8,
+                cacheSize=256, prefetch=2)
+
+    A volume of which the data is read on demand. The shape, dtype,
+    sampling and origin (like an Aarray) are available right away, but
+    data is only read when it is indexed. Data is read in slabs of
+    z-slices, which are cached. A background thread prefetches the slabs
+    that are likely to be requested next (based on the direction in
+    which the z-index changes, e.g. when moving a slice in volshow2()).
+
+    Parameters
+    ----------
+    source : str or array-like
+        The source of the data. Can be the filename of a raw file (shape
+        and dtype must be given), an .ssdf or .bsdf file (uncompressed
+        binary files are memory mapped), a directory of 2D images, a list
+        of image filenames (one per z-slice), or an array-like object
+        (e.g. a memory mapped array) that supports slicing.
+    shape : tuple
+        The shape of the data (required for raw files).
+    dtype : numpy dtype
+        The dtype of the data (required for raw files).
+    sampling : tuple of 3 floats
+        The distance between samples. Default (1, 1, 1) or that of the
+        source, if available.
+    origin : tuple of 3 floats
+        The origin of the data. Default (0, 0, 0) or that of the source,
+        if available.
+    offset : int
+        For raw files, the number of bytes before the data starts.
+    name : str
+        For ssdf files, the name of the field that holds the volume.
+    slabSize : int
+        The number of z-slices to read at once.
+    cacheSize : scalar
+        The maximum amount of memory (in MB) to use for cached slabs.
+    prefetch : int
+        The number of slabs to prefetch. Set to 0 to disable prefetching.
+
+    Indexing
+    --------
+    Indexing a VolumeSource returns a numpy array. Indexing along z
+    (e.g. vs[10] or vs[10:20]) only reads the slabs that are involved.
+    Indexing along another dimension (e.g. vs[:, 10]) needs all z-slices.
+    If the volume does not fit in the cache, only the indexed part of each
+    slab is read (for array-like sources), without caching it. Use
+    np.asarray(vs) to read the whole volume.
+
+    """
+
+    def __init__(
+        self,
+        source,
+        shape=None,
+        dtype=None,
+        sampling=None,
+        origin=None,
+        offset=0,
+        name="vol",
+        slabSize=8,
+        cacheSize=256,
+        prefetch=2,
+    ):
+        # Get function to read slabs of z-slices with
+        self._read = None
+        if isinstance(source, str) and os.path.isdir(source):
+            filenames = [os.path.join(source, fname) for fname in os.listdir(source)]
+            source = sorted(fname for fname in filenames if os.path.isfile(fname))
+        if isinstance(source, (list, tuple)):
+            self._InitImageStack(source)
+        elif isinstance(source, str):
+            if source.lower().endswith((".ssdf", ".bsdf")):
+                self._InitSsdf(source, name)
+            elif shape is None or dtype is None:
+                raise ValueError("VolumeSource needs shape and dtype for raw files.")
+            else:
+                shape, dtype = tuple(shape), np.dtype(dtype)
+                self._InitArray(np.memmap(source, dtype, "r", offset, shape))
+        elif hasattr(source, "shape") and hasattr(source, "__getitem__"):
+            self._InitArray(source)
+        else:
+            raise ValueError("Invalid source for VolumeSource.")
+
+        # Check
+        if len(self._shape) not in (3, 4):
+            raise ValueError("VolumeSource expects 3D (grayscale or color) data.")
+
+        # Set sampling and origin
+        if sampling is not None:
+            self._sampling = tuple(float(s) for s in sampling)
+        if origin is not None:
+            self._origin = tuple(float(o) for o in origin)
+
+        # Init cache
+        self._slabSize = max(1, int(slabSize))
+        slabBytes = self._dtype.itemsize * self._slabSize
+        slabBytes *= int(np.prod(self._shape[1:]))
+        self._maxSlabs = max(2, int(cacheSize * 2**20 / max(slabBytes, 1)))
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+
+        # Init prefetching
+        self._prefetch = int(prefetch)
+        self._pending = {}
+        self._pool = None
+        self._lastSlab = None
+        self._direction = 1
+
+    ## Initialization for different sources
+
+    def _InitArray(self, data):
+        """_InitArray(data)
+
+        Use an array-like object as the source.
+
+        """
+        self._shape = tuple(data.shape)
+        self._dtype = np.dtype(data.dtype)
+        self._sampling = tuple(getattr(data, "sampling", (1.0,) * 3))[:3]
+        self._origin = tuple(getattr(data, "origin", (0.0,) * 3))[:3]
+
+        def read(z1, z2, rest=()):
+            return np.asarray(data[(slice(z1, z2),) + rest])
+
+        self._read = read
+
+    def _InitImageStack(self, filenames):
+        """_InitImageStack(filenames)
+
+        Use a list of images as the source. Only the first image is read
+        to determine the shape and dtype.
+
+        """
+        if not filenames:
+            raise ValueError("VolumeSource needs at least one image.")
+        imread = _getImread()
+        im = np.asarray(imread(filenames[0]))
+        self._shape = (len(filenames),) + im.shape
+        self._dtype = im.dtype
+        self._sampling = (1.0, 1.0, 1.0)
+        self._origin = (0.0, 0.0, 0.0)
+
+        def read(z1, z2, rest=()):
+            slab = np.empty((z2 - z1,) + self._shape[1:], self._dtype)
+            for z in range(z1, z2):
+                slab[z - z1] = imread(filenames[z])
+            return slab[(slice(None),) + rest]
+
+        self._read = read
+
+    def _InitSsdf(self, filename, name):
+        """_InitSsdf(filename, name)
+
+        Use the volume in an ssdf file as the source. For uncompressed
+        binary files, this is a memory mapped array. The sampling and
+        origin can be stored as fields in the file.
+
+        """
+        from visvis.utils import ssdf
+
+        s = ssdf.load(filename)
+        if name not in s:
+            raise RuntimeError("The ssdf file does not have a field '%s'." % name)
+        self._InitArray(s[name])
+        if "sampling" in s:
+            self._sampling = tuple(float(v) for v in s.sampling)
+        if "origin" in s:
+            self._origin = tuple(float(v) for v in s.origin)
+
+    ## Properties to match Aarray
+
+    @property
+    def shape(self):
+        """The shape of the volume."""
+        return self._shape
+
+    @property
+    def dtype(self):
+        """The data type of the volume."""
+        return self._dtype
+
+    @property
+    def ndim(self):
+        """The number of dimensions of the volume."""
+        return len(self._shape)
+
+    @property
+    def size(self):
+        """The number of elements in the volume."""
+        return int(np.prod(self._shape))
+
+    @property
+    def nbytes(self):
+        """The number of bytes of the data of the volume."""
+        return self.size * self._dtype.itemsize
+
+    @property
+    def sampling(self):
+        """The distance between samples, as a tuple."""
+        return self._sampling
+
+    @property
+    def origin(self):
+        """The origin of the data, as a tuple."""
+        return self._origin
+
+    def __len__(self):
+        return self._shape[0]
+
+    def __repr__(self):
+        return "<VolumeSource %s %s>" % (
+            "x".join(str(s) for s in self._shape),
+            self._dtype.name,
+        )
+
+    ## Reading
+
+    def _GetSlab(self, i, cache=True):
+        """_GetSlab(i, cache=True)
+
+        Get slab i, from the cache, from a pending prefetch, or by
+        reading it.
+
+        """
+        with self._lock:
+            if i in self._cache:
+                self._cache.move_to_end(i)
+                return self._cache[i]
+            future = self._pending.get(i, None)
+
+        # Read, or wait for the prefetch
+        if future is not None:
+            slab = future.result()
+        else:
+            z1 = i * self._slabSize
+            z2 = min(z1 + self._slabSize, self._shape[0])
+            slab = self._read(z1, z2)
+            if cache:
+                self._CacheSlab(i, slab)
+        return slab
+
+    def _GetPart(self, i, z1, z2, rest, cache=True):
+        """_GetPart(i, z1, z2, rest, cache=True)
+
+        Get the z-slices z1:z2 (which are in slab i), indexed with rest
+        along the other dimensions. If cache is False and the slab is not
+        cached, only the indexed part is read.
+
+        """
+        with self._lock:
+            available = i in self._cache or i in self._pending
+        if not (cache or available):
+            return self._read(z1, z2, rest)
+        slab = self._GetSlab(i, cache)
+        offset = i * self._slabSize
+        return slab[(slice(z1 - offset, z2 - offset),) + rest]
+
+    def _CacheSlab(self, i, slab):
+        with self._lock:
+            self._pending.pop(i, None)
+            self._cache[i] = slab
+            self._cache.move_to_end(i)
+            while len(self._cache) > self._maxSlabs:
+                self._cache.popitem(last=False)
+
+    def _Prefetch(self, i):
+        """_Prefetch(i)
+
+        Schedule reading the slabs near slab i, mostly in the direction
+        in which the index changes.
+
+        """
+        if self._lastSlab is not None and i != self._lastSlab:
+            self._direction = 1 if i > self._lastSlab else -1
+        self._lastSlab = i
+        if self._prefetch <= 0:
+            return
+
+        # Collect slabs to prefetch
+        nslabs = (self._shape[0] + self._slabSize - 1) // self._slabSize
+        indices = [i + self._direction * j for j in range(1, self._prefetch + 1)]
+        indices.append(i - self._direction)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(1)
+
+        # Schedule the ones we do not have
+        for j in indices:
+            if 0 <= j < nslabs:
+                with self._lock:
+                    if j in self._cache or j in self._pending:
+                        continue
+                    self._pending[j] = self._pool.submit(self._ReadForCache, j)
+
+    def _ReadForCache(self, i):
+        z1 = i * self._slabSize
+        z2 = min(z1 + self._slabSize, self._shape[0])
+        slab = self._read(z1, z2)
+        self._CacheSlab(i, slab)
+        return slab
+
+    def __getitem__(self, index):
+        # Normalize index
+        if not isinstance(index, tuple):
+            index = (index,)
+        zindex, rest = index[0], index[1:]
+
+        if isinstance(zindex, (int, np.integer)):
+            # A single slice
+            z = int(zindex)
+            if z < 0:
+                z += self._shape[0]
+            if not 0 <= z < self._shape[0]:
+                raise IndexError("Index %i out of range." % zindex)
+            i = z // self._slabSize
+            slab = self._GetSlab(i)
+            self._Prefetch(i)
+            return slab[(z - i * self._slabSize,) + rest]
+
+        elif isinstance(zindex, slice):
+            # A range of slices
+            z1, z2, step = zindex.indices(self._shape[0])
+            if step != 1:
+                zz = range(z1, z2, step)
+                return np.stack([self[(z,) + rest] for z in zz])
+            if z2 <= z1:
+                return np.empty((0,) + self._shape[1:], self._dtype)[
+                    (slice(None),) + rest
+                ]
+            i1, i2 = z1 // self._slabSize, (z2 - 1) // self._slabSize + 1
+            cache = (i2 - i1) <= self._maxSlabs // 2
+            parts = []
+            for i in range(i1, i2):
+                s1 = max(z1, i * self._slabSize)
+                s2 = min(z2, (i + 1) * self._slabSize)
+                parts.append(self._GetPart(i, s1, s2, rest, cache))
+            if cache:
+                self._Prefetch(i2 - 1 if self._direction > 0 else i1)
+            return np.concatenate(parts)
+
+        else:
+            raise IndexError("VolumeSource only supports int and slice indices.")
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        if dtype is not None:
+            data = data.astype(dtype)
+        return data
+
+    def GetRange(self, nslices=8):
+        """GetRange(nslices=8)
+
+        Get an estimate of the minimum and maximum value of the volume,
+        based on a number of evenly distributed z-slices (ignoring nan
+        and inf). This is used to set the initial color limits.
+
+        """
+        zz = np.linspace(0, self._shape[0] - 1, min(nslices, self._shape[0]))
+        mins, maxs = [], []
+        for z in sorted(set(int(round(z)) for z in zz)):
+            data = self[z]
+            data = data[np.isfinite(data)]
+            if data.size:
+                mins.append(data.min())
+                maxs.append(data.max())
+        if not mins:
+            return 0, 1
+        return min(mins), max(maxs)
+
+    def Close(self):
+        """Close()
+
+        Stop the prefetch thread and clear the cache.
+
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        with self._lock:
+            self._pending.clear()
+            self._cache.clear()
+
+
+def _getImread():
+    """_getImread()
+
+    Get the imread function of imageio.
+
+    """
+    try:
+        import imageio
+    except ImportError:
+        raise RuntimeError("VolumeSource needs imageio to read image stacks.")
+    if hasattr(imageio, "v2"):
+        return imageio.v2.imread
+    return imageio.imread
@@ -1,4 +1,5 @@
 # ruff: noqa: F401
 
+import visvis.vvio.bsdm
 import visvis.vvio.stl
 import visvis.vvio.wavefront
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012, Almar Klein
+#
+# Visvis is distributed under the terms of the (new) BSD License.
+# The full license can be found in 'license.txt'.
+
+"""Module bsdm
+
+This module produces functionality to read and write binary mesh (.bsdm)
+files, and to use such files as a cache for meshes that are expensive to
+read (e.g. large STL and OBJ files).
+
+A bsdm file is an uncompressed binary ssdf file (see vv.ssdf) with the
+following fields:
+  * format: 'visvis-mesh'
+  * version: the version of the format (currently 1)
+  * vertices: Nx3 float32 array
+  * faces: MxV array (V is 3 or 4) of the smallest unsigned integer type
+    that can index the vertices, or None
+  * normals: Nx3 float32 array (always present)
+  * values: the per-vertex values (Nx1, Nx2, Nx3 or Nx4), or None
+  * verticesPerFace: 3 or 4
+  * bbox: 2x3 float32 array with the minimum and maximum of the vertices
+  * lods: a list of structs with (vertices, faces, normals, values,
+    verticesPerFace) for decimated versions of the mesh
+  * mtime and size: when used as a cache, the modification time and size
+    of the original file
+
+Because the arrays are aligned and uncompressed, they are memory mapped
+when the file is read, so opening a mesh is near instantaneous and the
+normals do not have to be calculated anymore.
+
+"""
+
+import os
+
+import visvis as vv
+import numpy as np
+
+FORMAT = "visvis-mesh"
+VERSION = 1
+
+
+class BsdmReader(object):
+    @classmethod
+    def read(cls, fname, check="ignored", lod=0):
+        """read(fname, check="ignored", lod=0)
+
+        This classmethod is the entry point for reading bsdm files.
+        The arrays of the returned mesh are memory mapped (copy on write).
+
+        Parameters
+        ----------
+        fname : string
+            The name of the file to read.
+        lod : int
+            The level of detail to read. 0 means the full mesh, 1 the
+            first decimated version, etc. If the file has fewer levels,
+            the coarsest level is returned.
+
+        """
+        s = vv.ssdf.load(fname)
+        if "format" not in s or s.format != FORMAT:
+            raise RuntimeError("The file '%s' is not a bsdm file." % fname)
+        if s.version > VERSION:
+            raise RuntimeError("Unsupported bsdm version: %i." % s.version)
+
+        # Select level of detail
+        lods = s.lods if "lods" in s else None
+        if lod > 0 and lods:
+            s = lods[min(lod, len(lods)) - 1]
+
+        return vv.BaseMesh(s.vertices, s.faces, s.normals, s.values, s.verticesPerFace)
+
+    @classmethod
+    def readCache(cls, fname):
+        """readCache(fname)
+
+        Read the mesh from the cache file that belongs to the given file.
+        Returns None if there is no cache, or if it is out of date.
+
+        """
+        cacheName = getCacheName(fname)
+        if not os.path.isfile(cacheName):
+            return None
+        try:
+            stat = os.stat(fname)
+            s = vv.ssdf.load(cacheName)
+            if s.mtime != stat.st_mtime or s.size != stat.st_size:
+                return None
+            return cls.read(cacheName)
+        except Exception:
+            return None
+
+
+class BsdmWriter(object):
+    @classmethod
+    def write(cls, fname, mesh, name="", bin="unused", lods=0, extra=None):
+        """write(fname, mesh, name='', bin='unused', lods=0, extra=None)
+
+        This classmethod is the entry point for writing mesh data to bsdm.
+        The normals are calculated if the mesh does not have them. The file
+        is first written under a temporary name and then moved into place,
+        so that meshes that map the old file remain valid.
+
+        Parameters
+        ----------
+        fname : string
+            The filename to write to.
+        mesh : vv.BaseMesh
+            The mesh instance to write.
+        name : string (optional)
+            The name of the object (e.g. 'teapot')
+        bin : ignored
+            For compatibility with the other writers.
+        lods : int
+            The number of decimated versions of the mesh to store. Each
+            level has roughly four times fewer faces than the previous.
+        extra : dict (optional)
+            Additional fields to store in the file.
+
+        """
+        s = vv.ssdf.new()
+        s.format = FORMAT
+        s.version = VERSION
+        s.name = name
+        s += _meshToStruct(mesh)
+        vertices = np.asarray(s.vertices)
+        finite = vertices[np.isfinite(vertices).all(axis=1)]
+        if len(finite):
+            s.bbox = np.array([finite.min(0), finite.max(0)], np.float32)
+        else:
+            s.bbox = np.zeros((2, 3), np.float32)
+
+        # Decimate
+        s.lods = []
+        vertices, faces = s.vertices, mesh._GetFaces()
+        for level in range(1, int(lods) + 1):
+            resolution = max(2, int(np.sqrt(len(faces)) / 2 ** (level + 1)))
+            lodMesh = decimate(vertices, faces, resolution, mesh._values)
+            s.lods.append(_meshToStruct(lodMesh))
+        for key, value in (extra or {}).items():
+            s[key] = value
+
+        # Write to temporary file, then move
+        tmpName = "%s.%i.tmp" % (fname, os.getpid())
+        try:
+            vv.ssdf.save(tmpName, s, "bin", compress=False)
+            os.replace(tmpName, fname)
+        finally:
+            if os.path.isfile(tmpName):
+                os.remove(tmpName)
+
+    @classmethod
+    def writeCache(cls, fname, mesh):
+        """writeCache(fname, mesh)
+
+        Store the mesh in a cache file next to the given file, along with
+        the modification time and size of the file. The normals of the
+        given mesh are calculated if necessary. Fails silently if the
+        cache cannot be written.
+
+        """
+        if mesh._normals is None:
+            vv.processing.calculateNormals(mesh)
+        try:
+            stat = os.stat(fname)
+            extra = {"mtime": stat.st_mtime, "size": stat.st_size}
+            cls.write(getCacheName(fname), mesh, extra=extra)
+        except (IOError, OSError):
+            pass  # E.g. a read-only directory, or a mapped file on Windows
+
+
+def getCacheName(fname):
+    """getCacheName(fname)
+
+    Get the name of the cache file that belongs to the given file.
+
+    """
+    return fname + ".cache.bsdm"
+
+
+def decimate(vertices, faces, resolution, values=None):
+    """decimate(vertices, faces, resolution, values=None)
+
+    Simplify a mesh using vertex clustering: the bounding box is divided
+    in cells (resolution cells along the largest dimension), and all
+    vertices in a cell are merged. Faces that become degenerate are
+    removed. Returns a BaseMesh.
+
+    """
+    vertices = np.asarray(vertices, np.float32)
+    faces = np.asarray(faces).reshape(len(faces), -1)
+
+    # Assign a cell to each vertex
+    vmin = np.nanmin(vertices, 0)
+    extent = float(np.nanmax(vertices - vmin)) or 1.0
+    cells = np.floor((vertices - vmin) * (resolution / extent))
+    cells = np.nan_to_num(cells).astype(np.int64).clip(0, resolution - 1)
+    keys = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+    uniqueKeys, inverse, counts = np.unique(
+        keys, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.reshape(-1)
+
+    # Average vertices (and values) per cell
+    def average(data):
+        data = np.asarray(data, np.float64).reshape(len(data), -1)
+        result = np.empty((len(uniqueKeys), data.shape[1]), np.float32)
+        for i in range(data.shape[1]):
+            result[:, i] = np.bincount(inverse, data[:, i]) / counts
+        return result
+
+    newVertices = average(vertices)
+    newValues = None if values is None else average(values)
+
+    # Map faces and remove degenerate ones
+    newFaces = inverse[faces]
+    valid = np.ones(len(newFaces), bool)
+    for i in range(faces.shape[1]):
+        for j in range(i + 1, faces.shape[1]):
+            valid &= newFaces[:, i] != newFaces[:, j]
+    newFaces = newFaces[valid].astype(np.uint32)
+
+    return vv.BaseMesh(newVertices, newFaces, None, newValues, faces.shape[1])
+
+
+def _meshToStruct(mesh):
+    """_meshToStruct(mesh)
+
+    Get a struct with the arrays of the given mesh, calculating the normals
+    if necessary and using the smallest dtype for the faces.
+
+    """
+    if mesh._normals is None:
+        mesh = vv.BaseMesh(mesh)
+        vv.processing.calculateNormals(mesh)
+
+    s = vv.ssdf.new()
+    s.vertices = mesh._vertices
+    s.normals = mesh._normals
+    s.values = mesh._values
+    s.verticesPerFace = mesh._verticesPerFace
+    s.faces = None
+    if mesh._faces is not None:
+        for dtype in (np.uint8, np.uint16, np.uint32):
+            if len(mesh._vertices) <= np.iinfo(dtype).max + 1:
+                break
+        faces = mesh._faces.astype(dtype, copy=False)
+        s.faces = faces.reshape(-1, mesh._verticesPerFace)
+    return s
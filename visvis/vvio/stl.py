@@ -21,13 +21,66 @@ faces.
 
 The classes are written with compatibility of Python3 in mind.
 
+Reading and writing is done in bulk using numpy. For binary files the
+faces are read as a structured array (STL_DTYPE). The numbers in ascii
+files are parsed with a single call to np.fromstring. The per-face methods
+(readFace and writeFace) are used when checking the integrity of ascii
+files, and for ascii files with an unusual layout.
+
 """
 
+import os
+import re
+import warnings
+
 import visvis as vv
 import numpy as np
 import struct
 
 
+# A face in a binary STL file: the normal, three vertices and an
+# attribute (unused by most applications)
+STL_DTYPE = np.dtype(
+    [("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")]
+)
+
+# Keywords in ascii STL files. Order matters (e.g. endfacet before facet)
+_ASCII_KEYWORDS = [
+    b"endfacet",
+    b"endloop",
+    b"facet",
+    b"normal",
+    b"outer",
+    b"loop",
+    b"vertex",
+]
+
+# Words in ascii STL files (the exponents of numbers are single letters)
+_ASCII_WORD = re.compile(rb"[A-Za-z]{2,}")
+
+# The template for writing a face in ascii
+_ASCII_FACE = (
+    "facet normal 0.0E+00 0.0E+00 0.0E+00\nouter loop\n"
+    + "vertex %E %E %E\n" * 3
+    + "endloop\nendfacet\n"
+)
+
+
+def _parseNumbers(data):
+    """_parseNumbers(data)
+
+    Parse the whitespace separated numbers in the given bytes. Returns
+    None if the data contains anything else.
+
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            return np.fromstring(data, dtype=np.float32, sep=" ")
+    except (ValueError, DeprecationWarning):
+        return None
+
+
 class StlReader(object):
     def __init__(self, f):
         self._f = f
@@ -57,24 +110,29 @@ class StlReader(object):
             # Go one back
             f.seek(-1, 1)
 
-            # Determine ascii or binary
+            # Determine ascii or binary. Some binary files also start
+            # with "solid", so check the file size too.
             data = f.read(5).decode("ascii", "ignore")
-            if data == "solid":
+            if data == "solid" and not StlBinReader.hasBinarySize(fname):
                 # Pop rest of line (i.e. the name) and get reader object
                 f.readline()
                 reader = StlAsciiReader(f)
             else:
                 # Pop rest if header (header has 80 chars) and get reader object
-                f.read(75)
+                f.seek(80)
                 reader = StlBinReader(f)
 
             # Read all
-            vertices = vv.Pointset(3)
-            while True:
-                reader.readFace(vertices, check)
+            if check and isinstance(reader, StlAsciiReader):
+                vertices = vv.Pointset(3)
+                try:
+                    while True:
+                        reader.readFace(vertices, check)
+                except EOFError:
+                    pass
+            else:
+                vertices = reader.readAll()
 
-        except EOFError:
-            pass
         finally:
             f.close()
 
@@ -104,13 +162,9 @@ class StlWriter(object):
             vv3 = mesh._vertices[2::4]
             vv4 = mesh._vertices[3::4]
 
-        tri1 = vv.Pointset(vv1)
-        tri2 = vv.Pointset(vv2)
-        tri3 = vv.Pointset(vv3)
-        #
-        tri1.extend(vv.Pointset(vv3))
-        tri2.extend(vv.Pointset(vv4))
-        tri3.extend(vv.Pointset(vv1))
+        tri1 = np.concatenate([vv1, vv3])
+        tri2 = np.concatenate([vv2, vv4])
+        tri3 = np.concatenate([vv3, vv1])
 
         return tri1, tri2, tri3
 
@@ -150,9 +204,9 @@ class StlWriter(object):
         elif vv.utils.pypoints.is_Pointset(mesh):
             if mesh.ndim != 3:
                 raise ValueError("Mesh vertices must be 3D.")
-            vv1 = mesh[0::3]
-            vv2 = mesh[1::3]
-            vv3 = mesh[2::3]
+            vv1 = mesh.data[0::3]
+            vv2 = mesh.data[1::3]
+            vv3 = mesh.data[2::3]
         elif isinstance(mesh, np.ndarray):
             if mesh.shape[1] != 3:
                 raise ValueError("Mesh vertices must be 3D.")
@@ -162,6 +216,10 @@ class StlWriter(object):
         else:
             raise ValueError("Unknown type for mesh vertices.")
 
+        # Combine in one array (drop incomplete faces)
+        n = min(len(vv1), len(vv2), len(vv3))
+        vertices = np.stack([vv1[:n], vv2[:n], vv3[:n]], 1)
+
         # Open file
         f = open(fname, "wb")
         try:
@@ -169,30 +227,69 @@ class StlWriter(object):
             if bin:
                 writer = StlBinWriter(f)
                 f.write(struct.pack("<B", 0) * 80)
-                f.write(struct.pack("<I", len(vv1)))
+                f.write(struct.pack("<I", n))
             else:
                 writer = StlAsciiWriter(f)
                 writer.writeLine("solid %s" % name)
             # Write vertices
-            for i in range(len(vv1)):
-                writer.writeFace(vv1[i], vv2[i], vv3[i])
+            writer.writeAll(vertices)
             # Write end
             if not bin:
                 writer.writeLine("endsolid %s" % name)
-        except EOFError:
-            pass
         finally:
             f.close()
 
 
 class StlAsciiReader(StlReader):
+    def readAll(self):
+        """readAll()
+
+        Read all faces from the file and return the vertices as an Nx3
+        array. The normals are ignored.
+
+        """
+
+        # Read up to the end of the solid
+        start = self._f.tell()
+        data = self._f.read()
+        for keyword in (b"endsolid", b"ENDSOLID"):
+            i = data.find(keyword)
+            if i >= 0:
+                data = data[:i]
+
+        # Replace the usual (lowercase) keywords with whitespace and parse
+        # all numbers at once (12 per face). If that fails, replace all
+        # words (e.g. uppercase keywords) using a regular expression.
+        for keyword in _ASCII_KEYWORDS:
+            data = data.replace(keyword, b" ")
+        numbers = _parseNumbers(data)
+        if numbers is None:
+            numbers = _parseNumbers(_ASCII_WORD.sub(b" ", data))
+
+        # Fall back to reading face by face if the file has another layout
+        if numbers is None or numbers.size % 12:
+            self._f.seek(start)
+            vertices = vv.Pointset(3)
+            try:
+                while True:
+                    self.readFace(vertices)
+            except EOFError:
+                pass
+            return vertices.data
+
+        # Take vertices, ignore normals
+        return numbers.reshape(-1, 12)[:, 3:].reshape(-1, 3)
+
     def readline(self):
         """Simple readLine method that strips whitespace and skips
         empty lines.
         """
         line = ""
         while not line:
-            line = self._f.readline().decode("ascii", "ignore").strip()
+            line = self._f.readline()
+            if not line:
+                raise EOFError()
+            line = line.decode("ascii", "ignore").strip()
         return line
 
     def readFace(self, vertices, check=False):
@@ -217,7 +314,7 @@ class StlAsciiReader(StlReader):
 
         # Read normal and identifier
         line_normal = self.readline()
-        if line_normal.startswith("endsolid"):
+        if line_normal.lower().startswith("endsolid"):
             raise EOFError()  # Finished
         line_begin_loop = self.readline()
 
@@ -245,6 +342,18 @@ class StlAsciiReader(StlReader):
 
 
 class StlAsciiWriter(StlWriter):
+    def writeAll(self, vertices, chunkSize=10000):
+        """writeAll(vertices, chunkSize=10000)
+
+        Write all faces given as an Nx3x3 array. The faces are formatted
+        in chunks.
+
+        """
+        for i in range(0, len(vertices), chunkSize):
+            chunk = vertices[i : i + chunkSize]
+            text = (_ASCII_FACE * len(chunk)) % tuple(chunk.ravel().tolist())
+            self._f.write(text.encode("ascii"))
+
     def writeLine(self, text):
         """Simple writeLine function to write a line of code to the file.
         The encoding is done here, and a newline character is added.
@@ -280,6 +389,43 @@ class StlBinReader(StlReader):
         (self._n,) = struct.unpack("<I", f.read(4))
         self._count = 0
 
+    @classmethod
+    def hasBinarySize(cls, fname):
+        """hasBinarySize(fname)
+
+        Get whether the size of the given file matches the number of faces
+        in the header of a binary STL file.
+
+        """
+        size = os.path.getsize(fname)
+        if size < 84:
+            return False
+        with open(fname, "rb") as f:
+            f.seek(80)
+            (n,) = struct.unpack("<I", f.read(4))
+        return size == 84 + n * STL_DTYPE.itemsize
+
+    def readAll(self):
+        """readAll()
+
+        Read all (remaining) faces from the file at once and return the
+        vertices as an Nx3 array. The normals are ignored.
+
+        """
+
+        # Get number of faces, the file may be truncated
+        offset = self._f.tell()
+        self._f.seek(0, 2)
+        n = min(self._n - self._count, (self._f.tell() - offset) // STL_DTYPE.itemsize)
+        self._f.seek(offset)
+
+        # Read faces
+        faces = np.fromfile(self._f, STL_DTYPE, n)
+        self._count += n
+
+        # Take vertices
+        return faces["vertices"].reshape(-1, 3)
+
     def readFace(self, vertices, check=False):
         """readFace(vertices, check=False)
 
@@ -318,6 +464,17 @@ class StlBinReader(StlReader):
 
 
 class StlBinWriter(StlWriter):
+    def writeAll(self, vertices):
+        """writeAll(vertices)
+
+        Write all faces given as an Nx3x3 array, using a single structured
+        array. A dummy normal is written for each face.
+
+        """
+        faces = np.zeros((len(vertices),), STL_DTYPE)
+        faces["vertices"] = vertices
+        faces.tofile(self._f)
+
     def writeFace(self, v1, v2, v3):
         """writeFace(v1, v2, v3)
 
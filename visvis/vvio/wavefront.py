@@ -18,45 +18,18 @@ material properties are ignored, although this might be implemented later,
 
 The classes are written with compatibility of Python3 in mind.
 
+The records are parsed in bulk using numpy. Files with an irregular
+layout (e.g. relative indices or a different number of values per record)
+are read line by line.
+
 """
 
+import time
+
 import visvis as vv
 import numpy as np
-import time
 
-
-# todo: have a look at this more efficient approach to reading wavefront
-# Alternative method by Nicolas Rougier. Numpy does not seem to have
-# a simalar method to write though ...
-#
-# def load_obj(filename):
-#     '''
-#     Load vertices and faces from a wavefront .obj file and generate normals.
-#     '''
-#     data = np.genfromtxt(filename, dtype=[('type', np.character, 1),
-#                                           ('points', np.float32, 3)])
-#
-#     # Get vertices and faces
-#     vertices = data['points'][data['type'] == 'v']
-#     faces = (data['points'][data['type'] == 'f']-1).astype(np.uint32)
-#
-#     # Build normals
-#     T = vertices[faces]
-#     N = np.cross(T[::,1 ]-T[::,0], T[::,2]-T[::,0])
-#     L = np.sqrt(N[:,0]**2+N[:,1]**2+N[:,2]**2)
-#     N /= L[:, np.newaxis]
-#     normals = np.zeros(vertices.shape)
-#     normals[faces[:,0]] += N
-#     normals[faces[:,1]] += N
-#     normals[faces[:,2]] += N
-#     L = np.sqrt(normals[:,0]**2+normals[:,1]**2+normals[:,2]**2)
-#     normals /= L[:, np.newaxis]
-#
-#     # Scale vertices such that object is contained in [-1:+1,-1:+1,-1:+1]
-#     vmin, vmax =  vertices.min(), vertices.max()
-#     vertices = 2*(vertices-vmin)/(vmax-vmin) - 1
-#
-#     return vertices, normals, faces
+from visvis.vvio.bsdm import BsdmReader, BsdmWriter
 
 
 class WavefrontReader(object):
@@ -83,8 +56,8 @@ class WavefrontReader(object):
         self._facemap = {}
 
     @classmethod
-    def read(cls, fname, check="ignored"):
-        """read(fname)
+    def read(cls, fname, check="ignored", cache=False):
+        """read(fname, check="ignored", cache=False)
 
         This classmethod is the entry point for reading OBJ files.
 
@@ -92,27 +65,144 @@ class WavefrontReader(object):
         ----------
         fname : string
             The name of the file to read.
+        cache : bool
+            If True, the mesh is stored in a bsdm file next to the OBJ
+            file (with ".cache.bsdm" appended to the name), which is used
+            to read the mesh the next time, unless the OBJ file has
+            been modified.
 
         """
 
         t0 = time.time()  # noqa
 
+        # Try cache
+        if cache:
+            mesh = BsdmReader.readCache(fname)
+            if mesh is not None:
+                return mesh
+
         # Open file
         f = open(fname, "rb")
         try:
             reader = WavefrontReader(f)
-            while True:
-                reader.readLine()
-        except EOFError:
-            pass
+            mesh = reader.readAll()
+            if mesh is None:
+                # Irregular file, read line by line
+                f.seek(0)
+                reader = WavefrontReader(f)
+                try:
+                    while True:
+                        reader.readLine()
+                except EOFError:
+                    pass
+                mesh = reader.finish()
         finally:
             f.close()
 
         # Done
-        mesh = reader.finish()
+        if cache:
+            BsdmWriter.writeCache(fname, mesh)
         # print('reading mesh took ' + str(time.time()-t0) + ' seconds')
         return mesh
 
+    def readAll(self):
+        """readAll()
+
+        Read the whole file and parse the records of each kind at once.
+        Returns a BaseMesh, or None if the file has an irregular layout
+        and should be read line by line.
+
+        """
+
+        # Read file and divide lines by kind (using the first two chars)
+        lines = [line.strip() for line in self._f.read().splitlines()]
+        records = {b"v": [], b"vt": [], b"vn": [], b"f": []}
+        prefixes = {b"v ": records[b"v"], b"vt": records[b"vt"]}
+        prefixes.update({b"vn": records[b"vn"], b"f ": records[b"f"]})
+        others = []
+        for line in lines:
+            prefixes.get(line[:2], others).append(line)
+        del lines
+
+        # Check other lines
+        for line in others:
+            words = line.split(None, 1)
+            kind = words[0] if words else b""
+            if kind in records:
+                return None  # E.g. separated with a tab
+            elif kind == b"mtllib":
+                print("Notice reading .OBJ: material properties are ignored.")
+            elif kind in (b"", b"g", b"s", b"o", b"usemtl") or kind.startswith(b"#"):
+                pass
+            else:
+                line = line.decode("ascii", "ignore")
+                print("Notice reading .OBJ: ignoring %s command." % line)
+
+        # Parse vertices, texture coords and normals
+        v = _parseRecords(records[b"v"], b"v", 3)
+        vt = _parseRecords(records[b"vt"], b"vt", 3)
+        vn = _parseRecords(records[b"vn"], b"vn", 3)
+        if v is None or vt is None or vn is None:
+            return None
+
+        # No faces: use vertices only
+        faceLines = records[b"f"]
+        if not faceLines:
+            return vv.BaseMesh(v.astype(np.float32))
+
+        # Parse faces. All index sets must have the same form.
+        firstSet = faceLines[0].split()[1]
+        m = firstSet.count(b"/") + 1
+        data = b" ".join(faceLines)
+        if b"//" in firstSet:
+            data = data.replace(b"//", b"/0/")  # Texcord index 0 becomes -1
+        data = data.replace(b"/", b" ")
+        words = data.split()
+        n = len(faceLines)
+        k = (len(words) // n - 1) // m
+        if k < 3 or len(words) != n * (1 + k * m) or words.count(b"f") != n:
+            return None
+        if words[:: 1 + k * m].count(b"f") != n:
+            return None
+        del words[:: 1 + k * m]
+        try:
+            indexSets = np.array(words, dtype=np.int64).reshape(n * k, m)
+        except ValueError:
+            return None
+        if indexSets.min() < 0:
+            return None  # Relative indices
+        del words
+
+        # Combine the vertex, texcord and normal indices of each index set
+        sets = np.zeros((n * k, 3), np.int64)
+        sets[:, :m] = indexSets - 1
+        sets[:, m:] = -1
+        if np.any(sets.max(0) >= [len(v), max(len(vt), 1), max(len(vn), 1)]):
+            raise IndexError("Face refers to non-existing vertex.")
+
+        # Each unique index set becomes a final vertex (in order of appearance)
+        n1, n2 = len(vt) + 1, len(vn) + 1
+        if len(v) * n1 * n2 < 2**62:
+            keys = (sets[:, 0] * n1 + sets[:, 1] + 1) * n2 + sets[:, 2] + 1
+        else:
+            keys = np.ascontiguousarray(sets).view(np.dtype((np.void, 24))).ravel()
+        keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        remap = np.empty_like(order)
+        remap[order] = np.arange(len(order))
+        faces = remap[inverse.ravel()].reshape(n, k).astype(np.uint32)
+        sets = sets[first[order]]
+
+        # Store final vertices/normals/texcords
+        vertices = v[sets[:, 0]].astype(np.float32)
+        texcords = normals = None
+        if sets[0, 1] >= 0:
+            texcords = vt[sets[:, 1]].astype(np.float32)
+        if sets[0, 2] >= 0:
+            normals = vn[sets[:, 2]].astype(np.float32)
+
+        return vv.BaseMesh(vertices, faces, normals, texcords)
+
     def readLine(self):
         """The method that reads a line and processes it."""
 
@@ -284,31 +374,39 @@ class WavefrontWriter(object):
         text += "\n"
         self._f.write(text.encode("ascii"))
 
-    def writeTuple(self, val, what):
-        """Writes a tuple of numbers (on one line)."""
+    def writeTuples(self, values, what, chunkSize=10000):
+        """Writes an array of tuples of numbers (one tuple per line)."""
         # Limit to three values. so RGBA data drops the alpha channel
         # Format can handle up to 3 texcords
-        val = val[:3]
-        # Make string
-        val = " ".join([str(v) for v in val])
-        # Write line
-        self.writeLine("%s %s" % (what, val))
-
-    def writeFace(self, val, what="f"):
-        """Write the face info to the net line."""
+        values = values[:, :3]
+        template = what + " %.9g" * values.shape[1] + "\n"
+        self._writeChunked(template, values, chunkSize)
+
+    def writeFaces(self, faces, what="f", chunkSize=10000):
+        """Write the face info, one face per line."""
         # OBJ counts from 1
-        val = [v + 1 for v in val]
-        # Make string
+        faces = faces.astype(np.int64) + 1
+        # Make template
         if self._hasValues and self._hasNormals:
-            val = " ".join(["%i/%i/%i" % (v, v, v) for v in val])
+            setTemplate, repeat = " %i/%i/%i", 3
         elif self._hasNormals:
-            val = " ".join(["%i//%i" % (v, v) for v in val])
+            setTemplate, repeat = " %i//%i", 2
         elif self._hasValues:
-            val = " ".join(["%i/%i" % (v, v) for v in val])
+            setTemplate, repeat = " %i/%i", 2
         else:
-            val = " ".join(["%i" % v for v in val])
-        # Write line
-        self.writeLine("%s %s" % (what, val))
+            setTemplate, repeat = " %i", 1
+        template = what + setTemplate * faces.shape[1] + "\n"
+        faces = np.repeat(faces, repeat, 1)
+        self._writeChunked(template, faces, chunkSize)
+
+    def _writeChunked(self, template, values, chunkSize):
+        """Format each row in the given array with the given template
+        and write the result. The formatting is done in chunks.
+        """
+        for i in range(0, len(values), chunkSize):
+            chunk = values[i : i + chunkSize]
+            text = (template * len(chunk)) % tuple(chunk.ravel().tolist())
+            self._f.write(text.encode("ascii"))
 
     def writeMesh(self, mesh, name=""):
         """Write the given mesh instance."""
@@ -348,14 +446,31 @@ class WavefrontWriter(object):
 
         # Write data
         if True:
-            for i in range(N):
-                self.writeTuple(mesh._vertices[i], "v")
+            self.writeTuples(mesh._vertices, "v")
         if self._hasNormals:
-            for i in range(N):
-                self.writeTuple(mesh._normals[i], "vn")
+            self.writeTuples(mesh._normals, "vn")
         if self._hasValues:
-            for i in range(N):
-                self.writeTuple(mesh._values[i], "vt")
+            self.writeTuples(mesh._values, "vt")
         if True:
-            for i in range(faces.shape[0]):
-                self.writeFace(faces[i])
+            self.writeFaces(faces)
+
+
+def _parseRecords(lines, kind, n):
+    """_parseRecords(lines, kind, n)
+
+    Parse lines that each consist of the given kind and a number of
+    values. Returns an array with (up to n) values per line, or None if
+    the lines do not have the same number of values.
+
+    """
+    if not lines:
+        return np.zeros((0, n), np.float64)
+    words = b" ".join(lines).split()
+    ncols = len(words) // len(lines)
+    if len(words) != ncols * len(lines) or words[::ncols].count(kind) != len(lines):
+        return None
+    try:
+        columns = [words[i::ncols] for i in range(1, min(ncols, n + 1))]
+        return np.array(columns, dtype=np.float64).T
+    except ValueError:
+        return None
@@ -33,13 +33,20 @@ Provides the following functions:
   * readGif & writeGif  -> a movie stored as animated GIF
   * readSwf & writeSwf  -> a movie stored as shockwave flash
   * readAvi & writeAvi  -> a movie stored as compressed video
+    (iterAvi is a generator version of readAvi)
   * readIms & writeIms  -> a movie stored as a series of images
+    (iterIms is a generator version of readIms)
 
 Two additional functions are provided for ease of use, that call
 the right function depending on the used file extension:
   * movieRead
   * movieWrite
 
+Each format also has a streaming writer (GifStreamWriter, SwfStreamWriter,
+AviStreamWriter and ImsStreamWriter) to write a movie one frame at a
+time, without holding all frames in memory. Use movieWriter() to get the
+right one depending on the file extension.
+
 More information about compression and limitations:
   * GIF. Requires PIL. Animated GIF applies a color-table of maximal
     256 colors and applies poor compression. It's widely applicable though.
@@ -49,7 +56,7 @@ More information about compression and limitations:
   * AVI. Requires ffmpeg. Most Linux can obtain it using their package
     manager. Windows users can use the installer at the visvis website.
     Provides excelent mpeg4 (or any other supported by ffmpeg) compression.
-    Not intended for reading very large movies.
+    Frames are streamed to and from ffmpeg through pipes.
   * IMS. Requires PIL. Quality depends on the used image type. Use png for
     lossless compression and jpg otherwise.
 
@@ -62,12 +69,12 @@ import os, time, warnings
 # Python 3 needs absolute import, which makes that this package
 # cannot be a subpackage anymore. We cannot use the dot-notation,
 # because that doesnt work on Python 2.
-from visvis.vvmovie.images2gif import readGif, writeGif
-from visvis.vvmovie.images2swf import readSwf, writeSwf
-from visvis.vvmovie.images2avi import readAvi, writeAvi
-from visvis.vvmovie.images2ims import readIms, writeIms
+from visvis.vvmovie.images2gif import readGif, writeGif, GifStreamWriter
+from visvis.vvmovie.images2swf import readSwf, writeSwf, SwfStreamWriter
+from visvis.vvmovie.images2avi import readAvi, writeAvi, iterAvi, AviStreamWriter
+from visvis.vvmovie.images2ims import readIms, writeIms, iterIms, ImsStreamWriter
 
-videoTypes = ["AVI", "MPG", "MPEG", "MOV", "FLV"]
+videoTypes = ["AVI", "MPG", "MPEG", "MOV", "FLV", "MP4", "MKV", "WEBM"]
 imageTypes = ["JPG", "JPEG", "PNG", "TIF", "TIFF", "BMP"]
 
 
@@ -82,14 +89,18 @@ def movieWrite(filename, images, duration=0.1, repeat=True, **kwargs):
     filename : string
        The name of the file to write the image to. For a series of images,
         the `*` wildcard can be used.
-    images : list
+    images : list or iterable
         Should be a list consisting of PIL images or numpy arrays.
         The latter should be between 0 and 255 for integer types,
-        and between 0 and 1 for float types.
+        and between 0 and 1 for float types. This can also be a
+        generator, in which case the frames are written one at a time
+        (see movieWriter), so that they do not need to be held in
+        memory all at once.
     duration : scalar
         The duration for all frames. For GIF and SWF this can also be a list
         that specifies the duration for each frame. (For swf the durations
-        are rounded to integer amounts of the smallest duration.)
+        are rounded to integer amounts of the smallest duration.) When
+        images is a generator, the duration should be a scalar.
     repeat : bool or integer
         Can be used in GIF and SWF to indicate that the movie should
         loop. For GIF, an integer can be given to specify the number of loops.
@@ -120,9 +131,10 @@ def movieWrite(filename, images, duration=0.1, repeat=True, **kwargs):
 
     Special AVI/MPEG parameters
     ---------------------------
-    encoding : {'mpeg4', 'msmpeg4v2', ...}
+    encoding : {'mpeg4', 'msmpeg4v2', 'libx264', ...}
         The encoding to use. Hint for Windows users: the 'msmpeg4v2' codec
-        is natively supported on Windows.
+        is natively supported on Windows. The container is determined
+        from the file extension.
     inputOptions : string
         See the documentation of ffmpeg
     outputOptions : string
@@ -151,7 +163,7 @@ def movieWrite(filename, images, duration=0.1, repeat=True, **kwargs):
         compression. Reading of SWF files is limited to images stored using
         ZLIB compression. Requires no external libraries.
       * AVI: Requires ffmpeg. Provides excelent mpeg4 (or any other supported
-        by ffmpeg) compression. Not intended for reading very large movies.
+        by ffmpeg) compression. Frames are streamed through pipes.
       * IMS: Requires PIL. Quality depends on the used image type. Use png for
         lossless compression and jpg otherwise.
 
@@ -162,10 +174,11 @@ def movieWrite(filename, images, duration=0.1, repeat=True, **kwargs):
     )
 
     # Test images
-    if not isinstance(images, (tuple, list)):
-        raise ValueError("Images should be a tuple or list.")
-    if not images:
-        raise ValueError("List of images is empty.")
+    if isinstance(images, (tuple, list)):
+        if not images:
+            raise ValueError("List of images is empty.")
+    elif not hasattr(images, "__iter__"):
+        raise ValueError("Images should be a tuple, list or iterable.")
 
     # Get extension
     EXT = os.path.splitext(filename)[1]
@@ -175,7 +188,19 @@ def movieWrite(filename, images, duration=0.1, repeat=True, **kwargs):
     t0 = time.time()
 
     # Write
-    if EXT == "GIF":
+    if not isinstance(images, (tuple, list)):
+        # Stream the frames, peek at the first so that an empty iterable
+        # does not leave a truncated file behind
+        images = iter(images)
+        first = next(images, None)
+        if first is None:
+            raise ValueError("List of images is empty.")
+        with movieWriter(filename, duration, repeat, **kwargs) as writer:
+            writer.AddFrame(first)
+            for im in images:
+                writer.AddFrame(im)
+        count = writer.count
+    elif EXT == "GIF":
         writeGif(filename, images, duration, repeat, **kwargs)
     elif EXT == "SWF":
         writeSwf(filename, images, duration, repeat, **kwargs)
@@ -185,6 +210,8 @@ def movieWrite(filename, images, duration=0.1, repeat=True, **kwargs):
         writeIms(filename, images, **kwargs)
     else:
         raise ValueError("Given file extension not valid: " + EXT)
+    if isinstance(images, (tuple, list)):
+        count = len(images)
 
     # Stop timer
     t1 = time.time()
@@ -193,12 +220,43 @@ def movieWrite(filename, images, duration=0.1, repeat=True, **kwargs):
     # Notify
     print(
         "Wrote %i frames to %s in %1.2f seconds (%1.0f ms/frame)"
-        % (len(images), EXT, dt, 1000 * dt / len(images))
+        % (count, EXT, dt, 1000 * dt / count)
     )
 
 
-def movieRead(filename, asNumpy=True, **kwargs):
-    """movieRead(filename, asNumpy=True)
+def movieWriter(filename, duration=0.1, repeat=True, **kwargs):
+    """movieWriter(filename, duration=0.1, repeat=True, **kwargs)
+
+    Get a streaming writer to write a movie to GIF, SWF, AVI/MPEG, or a
+    series of images (PNG,JPG,TIF,BMP), one frame at a time. See
+    movieWrite() for the meaning of the arguments.
+
+    The returned object has a method AddFrame(im) to add a frame (which
+    is converted to uint8 right away), and a method Close() to finish
+    the movie. It can also be used as a context manager. Only a few
+    frames are held in memory at any time.
+
+    """
+
+    # Get extension
+    EXT = os.path.splitext(filename)[1]
+    EXT = EXT[1:].upper()
+
+    # Get writer
+    if EXT == "GIF":
+        return GifStreamWriter(filename, duration, repeat, **kwargs)
+    elif EXT == "SWF":
+        return SwfStreamWriter(filename, duration, repeat, **kwargs)
+    elif EXT in videoTypes:
+        return AviStreamWriter(filename, duration, **kwargs)
+    elif EXT in imageTypes:
+        return ImsStreamWriter(filename, **kwargs)
+    else:
+        raise ValueError("Given file extension not valid: " + EXT)
+
+
+def movieRead(filename, asNumpy=True, stream=False, **kwargs):
+    """movieRead(filename, asNumpy=True, stream=False)
 
     Read the movie from GIF, SWF, AVI (or MPG), or a series of images (PNG,
     JPG,TIF,BMP).
@@ -211,6 +269,11 @@ def movieRead(filename, asNumpy=True, **kwargs):
     asNumpy : bool
         If True, returns a list of numpy arrays. Otherwise return
         a list if PIL images.
+    stream : bool
+        If True, returns a generator instead of a list. For a series of
+        images and for AVI/MPEG, the images are then read as they are
+        consumed (in parallel, and with only a few images in memory at
+        a time).
 
     Notes
     ------
@@ -228,6 +291,16 @@ def movieRead(filename, asNumpy=True, **kwargs):
     EXT = os.path.splitext(filename)[1]
     EXT = EXT[1:].upper()
 
+    # Stream?
+    if stream:
+        if EXT in imageTypes:
+            return iterIms(filename, asNumpy, **kwargs)
+        elif EXT in videoTypes:
+            return iterAvi(filename, asNumpy, **kwargs)
+        else:
+            kwargs["asNumpy"] = asNumpy
+            return iter(movieRead(filename, **kwargs))
+
     # Start timer
     t0 = time.time()
 
@@ -27,7 +27,9 @@
 
 """Module images2avi
 
-Uses ffmpeg to read and write AVI files. Requires PIL
+Uses ffmpeg to read and write AVI files (or any other video format that
+ffmpeg supports). The frames are streamed to and from ffmpeg as raw
+RGB data via pipes, so no temporary files are used.
 
 I found these sites usefull:
 http://www.catswhocode.com/blog/19-ffmpeg-commands-for-all-needs
@@ -35,99 +37,261 @@ http://linux.die.net/man/1/ffmpeg
 
 """
 
-import os, time
-import subprocess, shutil
+import os
+import re
+import queue
+import shlex
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
 from visvis.vvmovie import images2ims
 
+try:
+    import PIL.Image
+except ImportError:
+    PIL = None
+
+# The ffmpeg executable. Can also be a list (e.g. [python, script]).
+FFMPEG_EXE = "ffmpeg"
+
+
+def _getCommand(*args):
+    """_getCommand(*args)
+    Get the command (as a list) to run ffmpeg with the given arguments.
+    Arguments that are strings are split as in a shell.
+    """
+    exe = FFMPEG_EXE
+    command = [exe] if isinstance(exe, str) else list(exe)
+    for arg in args:
+        if isinstance(arg, str):
+            command.extend(shlex.split(arg))
+        else:
+            command.extend(str(a) for a in arg)
+    return command
+
+
+def _toRGB(im):
+    """_toRGB(im)
+    Get the given image as a contiguous HxWx3 uint8 numpy array.
+    """
+    im = images2ims.checkImage(im)
+    if PIL and isinstance(im, PIL.Image.Image):
+        im = np.asarray(im.convert("RGB"))
+    elif im.ndim == 2:
+        im = np.dstack([im, im, im])
+    return np.ascontiguousarray(im[:, :, :3])
+
+
+class AviStreamWriter:
+    """AviStreamWriter(filename, duration=0.1, encoding='mpeg4',
+                    inputOptions='', outputOptions='', queueSize=8)
 
-def _cleanDir(tempDir):
-    for i in range(3):
+    Write an AVI file (or any format supported by ffmpeg) one frame at a
+    time. See writeAvi() for the meaning of the arguments. Frames are
+    added using AddFrame(). The raw frames are passed to a background
+    thread, which writes them to the stdin of ffmpeg, so that encoding
+    overlaps with producing the frames. At most queueSize frames are
+    queued. Call Close() when done (or use a with-statement).
+
+    """
+
+    def __init__(
+        self,
+        filename,
+        duration=0.1,
+        encoding="mpeg4",
+        inputOptions="",
+        outputOptions="",
+        queueSize=8,
+    ):
+        # Get fps
         try:
-            shutil.rmtree(tempDir)
+            self._fps = float(1.0 / duration)
         except Exception:
-            time.sleep(0.2)  # Give OS time to free sources
+            raise ValueError("Invalid duration parameter for writeAvi.")
+
+        # Store settings
+        self._filename = filename
+        self._encoding = encoding
+        self._inputOptions = inputOptions
+        self._outputOptions = outputOptions
+
+        # The process and writer thread are created at the first frame
+        self._queue = queue.Queue(max(1, int(queueSize)))
+        self._process = None
+        self._thread = None
+        self._error = None
+        self._shape = None
+        self._count = 0
+        self._closed = False
+
+    @property
+    def count(self):
+        """The number of frames added so far."""
+        return self._count
+
+    def _Start(self, shape):
+        """Start ffmpeg and the thread that feeds it."""
+        self._shape = shape
+        codec = ["-vcodec", self._encoding] if self._encoding else []
+        command = _getCommand(
+            ["-y", "-f", "rawvideo", "-pix_fmt", "rgb24"],
+            ["-s", "%ix%i" % (shape[1], shape[0]), "-r", "%.02f" % self._fps],
+            self._inputOptions,
+            ["-i", "-", "-g", "1"] + codec,
+            self._outputOptions,
+            [self._filename],
+        )
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr,
+        )
+        self._thread = threading.Thread(target=self._Feed, name="AviStreamWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _Feed(self):
+        """Write the queued frames to ffmpeg, until None is received."""
+        stdin = self._process.stdin
+        while True:
+            im = self._queue.get()
+            if im is None:
+                break
+            if self._error is None:
+                try:
+                    stdin.write(im)
+                except Exception as err:  # e.g. ffmpeg exited
+                    self._error = err
+        try:
+            stdin.close()
+        except Exception:
+            pass
+
+    def AddFrame(self, im):
+        """AddFrame(im)
+
+        Add a frame (a PIL image or numpy array). All frames must have
+        the same size.
+
+        """
+        if self._closed:
+            raise RuntimeError("This writer is closed.")
+        im = _toRGB(im)
+        if self._process is None:
+            self._Start(im.shape)
+        elif im.shape != self._shape:
+            raise ValueError("All frames of an avi movie must have the same size.")
+        if self._error is not None:
+            message = self._GetErrorMessage()
+            self._Abort()
+            raise RuntimeError("Could not write avi: %s" % message)
+        self._queue.put(im)
+        self._count += 1
+
+    def _GetErrorMessage(self):
+        try:
+            self._stderr.seek(0)
+            return self._stderr.read().decode("utf-8", "ignore").strip()
+        except Exception:
+            return str(self._error)
+
+    def _Finish(self, abort):
+        """Stop the writer thread and wait for ffmpeg to finish."""
+        if self._closed:
+            return None
+        self._closed = True
+        if self._process is None:
+            return None
+        if abort:
+            self._process.kill()
+        self._queue.put(None)
+        self._thread.join()
+        returncode = self._process.wait()
+        message = self._GetErrorMessage() if returncode else ""
+        self._stderr.close()
+        return returncode, message
+
+    def Close(self):
+        """Close()
+
+        Finish encoding the movie and wait for ffmpeg to finish.
+
+        """
+        if not self._closed and self._process is None:
+            self._closed = True
+            raise ValueError("Image list is empty!")
+        result = self._Finish(False)
+        if result and result[0]:
+            print(result[1])
+            raise RuntimeError("Could not write avi.")
+
+    def _Abort(self):
+        """Stop without finishing the movie."""
+        if self._Finish(True) and os.path.isfile(self._filename):
+            try:
+                os.remove(self._filename)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        if type is None:
+            self.Close()
         else:
-            break
-    else:
-        print("Oops, could not fully clean up temporary files.")
+            self._Abort()
 
 
 def writeAvi(
-    filename, images, duration=0.1, encoding="mpeg4", inputOptions="", outputOptions=""
+    filename,
+    images,
+    duration=0.1,
+    encoding="mpeg4",
+    inputOptions="",
+    outputOptions="",
+    queueSize=8,
 ):
     """writeAvi(filename, duration=0.1, encoding='mpeg4',
-                    inputOptions='', outputOptions='')
+                    inputOptions='', outputOptions='', queueSize=8)
 
     Export movie to a AVI file, which is encoded with the given
     encoding. Hint for Windows users: the 'msmpeg4v2' codec is
-    natively supported on Windows.
+    natively supported on Windows. The container is determined by ffmpeg
+    from the extension of the filename (e.g. .avi, .mp4, .mkv), so other
+    containers and codecs (e.g. encoding='libx264') can be used as well.
+    If encoding is None, ffmpeg chooses the codec.
 
     Images should be a list consisting of PIL images or numpy arrays.
     The latter should be between 0 and 255 for integer types, and
-    between 0 and 1 for float types.
+    between 0 and 1 for float types. Can also be a generator. The frames
+    are streamed to ffmpeg (at most queueSize frames are buffered). See
+    AviStreamWriter to write frames one by one.
 
     Requires the "ffmpeg" application:
       * Most linux users can install using their package manager
       * There is a windows installer on the visvis website
 
     """
+    with AviStreamWriter(
+        filename, duration, encoding, inputOptions, outputOptions, queueSize
+    ) as writer:
+        for im in images:
+            writer.AddFrame(im)
 
-    # Get fps
-    try:
-        fps = float(1.0 / duration)
-    except Exception:
-        raise ValueError("Invalid duration parameter for writeAvi.")
-
-    # Determine temp dir and create images
-    tempDir = os.path.join(os.path.expanduser("~"), ".tempIms")
-    images2ims.writeIms(os.path.join(tempDir, "im*.jpg"), images)
-
-    # Determine formatter
-    N = len(images)
-    formatter = "%04d"
-    if N < 10:
-        formatter = "%d"
-    elif N < 100:
-        formatter = "%02d"
-    elif N < 1000:
-        formatter = "%03d"
-
-    # Compile command to create avi
-    command = "ffmpeg -r %i %s " % (int(fps), inputOptions)
-    command += "-i im%s.jpg " % (formatter,)
-    command += "-g 1 -vcodec %s %s " % (encoding, outputOptions)
-    command += "output.avi"
-
-    # Run ffmpeg
-    S = subprocess.Popen(
-        command, shell=True, cwd=tempDir, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-    )
-
-    # Show what ffmpeg has to say
-    outPut = S.stdout.read()
-
-    if S.wait():
-        # An error occured, show
-        print(outPut)
-        print(S.stderr.read())
-        # Clean up
-        _cleanDir(tempDir)
-        raise RuntimeError("Could not write avi.")
-    else:
-        # Copy avi
-        shutil.copy(os.path.join(tempDir, "output.avi"), filename)
-        # Clean up
-        _cleanDir(tempDir)
 
+def iterAvi(filename, asNumpy=True, queueSize=8):
+    """iterAvi(filename, asNumpy=True, queueSize=8)
 
-def readAvi(filename, asNumpy=True):
-    """readAvi(filename, asNumpy=True)
-
-    Read images from an AVI (or MPG) movie.
-
-    Requires the "ffmpeg" application:
-      * Most linux users can install using their package manager
-      * There is a windows installer on the visvis website
+    Generator version of readAvi(). The frames are decoded by ffmpeg and
+    read from its stdout by a background thread, while they are consumed.
+    At most queueSize frames are buffered.
 
     """
 
@@ -135,35 +299,104 @@ def readAvi(filename, asNumpy=True):
     if not os.path.isfile(filename):
         raise IOError("File not found: " + str(filename))
 
-    # Determine temp dir, make sure it exists
-    tempDir = os.path.join(os.path.expanduser("~"), ".tempIms")
-    if not os.path.isdir(tempDir):
-        os.makedirs(tempDir)
-
-    # Copy movie there
-    shutil.copy(filename, os.path.join(tempDir, "input.avi"))
+    # Check PIL
+    if (not asNumpy) and (PIL is None):
+        raise RuntimeError("Need PIL to return as PIL images.")
 
     # Run ffmpeg
-    command = "ffmpeg -i input.avi im%d.jpg"
+    command = _getCommand(["-i", filename, "-f", "rawvideo", "-pix_fmt", "rgb24", "-"])
     S = subprocess.Popen(
-        command, shell=True, cwd=tempDir, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
     )
 
-    # Show what mencodec has to say
-    outPut = S.stdout.read()
+    # Get frame size from what ffmpeg has to say about the output stream
+    # (not the input stream, the video may be rotated by ffmpeg)
+    lines = []
+    shape = None
+    output = False
+    for line in iter(S.stderr.readline, b""):
+        line = line.decode("utf-8", "ignore")
+        lines.append(line)
+        if line.startswith("Output #"):
+            output = True
+        elif output and "Stream" in line and "Video:" in line:
+            match = re.search(r" (\d+)x(\d+)[ ,]", line)
+            if match:
+                shape = int(match.group(2)), int(match.group(1)), 3
+                break
+
+    # Keep reading stderr, so that ffmpeg does not block on it
+    def drain():
+        for line in iter(S.stderr.readline, b""):
+            lines.append(line.decode("utf-8", "ignore"))
+
+    drainThread = threading.Thread(target=drain, name="iterAvi-stderr")
+    drainThread.daemon = True
+    drainThread.start()
+
+    if shape is None:
+        S.kill()
+        S.wait()
+        print("".join(lines))
+        raise RuntimeError("Could not read avi.")
+
+    # Read frames in a thread
+    frames = queue.Queue(max(1, int(queueSize)))
+    stop = threading.Event()
+    framesize = shape[0] * shape[1] * shape[2]
+    data = None
 
-    if S.wait():
-        # An error occured, show
-        print(outPut)
-        print(S.stderr.read())
-        # Clean up
-        _cleanDir(tempDir)
+    def read():
+        try:
+            while not stop.is_set():
+                data = S.stdout.read(framesize)
+                if len(data) < framesize:
+                    break
+                frames.put(data)
+        finally:
+            frames.put(None)
+
+    readThread = threading.Thread(target=read, name="iterAvi")
+    readThread.daemon = True
+    readThread.start()
+
+    try:
+        while True:
+            data = frames.get()
+            if data is None:
+                break
+            im = np.frombuffer(data, np.uint8).reshape(shape)
+            yield im if asNumpy else PIL.Image.fromarray(im)
+    finally:
+        # Stop ffmpeg if the generator is not exhausted
+        if data is not None:
+            stop.set()
+            S.kill()
+            while frames.get() is not None:
+                pass
+        S.wait()
+        S.stdout.close()
+        drainThread.join()
+
+    # Check whether ffmpeg finished ok
+    if S.returncode:
+        print("".join(lines))
         raise RuntimeError("Could not read avi.")
-    else:
-        # Read images
-        images = images2ims.readIms(os.path.join(tempDir, "im*.jpg"), asNumpy)
-        # Clean up
-        _cleanDir(tempDir)
-
-    # Done
-    return images
+
+
+def readAvi(filename, asNumpy=True, queueSize=8):
+    """readAvi(filename, asNumpy=True, queueSize=8)
+
+    Read images from an AVI (or MPG, or any other format supported by
+    ffmpeg) movie. The frames are streamed from ffmpeg as raw data. See
+    iterAvi() to read the frames one by one.
+
+    Requires the "ffmpeg" application:
+      * Most linux users can install using their package manager
+      * There is a windows installer on the visvis website
+
+    """
+    return list(iterAvi(filename, asNumpy, queueSize))
@@ -67,12 +67,13 @@ Useful links
 # todo: This module should be part of imageio (or at least based on)
 
 import os
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import PIL
     from PIL import Image
-    from PIL.GifImagePlugin import getheader, getdata
+    from PIL.GifImagePlugin import getdata
 except ImportError:
     PIL = None
 
@@ -82,6 +83,10 @@ except ImportError:
     np = None
 
 
+# The default number of threads to convert images with
+_MAX_WORKERS = os.cpu_count() or 1
+
+
 def get_cKDTree():
     try:
         from scipy.spatial import cKDTree
@@ -138,13 +143,25 @@ def checkImages(images):
     return images2
 
 
+def _toRGB(im):
+    """_toRGB(im)
+    Get the given (checked) image as an HxWx3 uint8 numpy array.
+    """
+    if isinstance(im, Image.Image):
+        return np.asarray(im.convert("RGB"))
+    elif im.ndim == 2:
+        return np.dstack([im, im, im])
+    else:
+        return im[:, :, :3]
+
+
 def intToBin(i):
     """Integer to two bytes"""
     # devide in two parts (bytes)
     i1 = i % 256
     i2 = int(i / 256)
-    # make string (little endian)
-    return chr(i1) + chr(i2)
+    # make bytes (little endian)
+    return bytes([i1, i2])
 
 
 class GifWriter:
@@ -160,14 +177,14 @@ class GifWriter:
         Get animation header. To replace PILs getheader()[0]
 
         """
-        bb = "GIF89a"
+        bb = b"GIF89a"
         bb += intToBin(im.size[0])
         bb += intToBin(im.size[1])
-        bb += "\x87\x00\x00"
+        bb += b"\x87\x00\x00"
         return bb
 
-    def getImageDescriptor(self, im, xy=None):
-        """getImageDescriptor(im, xy=None)
+    def getImageDescriptor(self, im, xy=None, localPalette=True):
+        """getImageDescriptor(im, xy=None, localPalette=True)
 
         Used for the local color table properties per image.
         Otherwise global color table applies to all frames irrespective of
@@ -184,7 +201,7 @@ class GifWriter:
             xy = (0, 0)
 
         # Image separator,
-        bb = "\x2c"
+        bb = b"\x2c"
 
         # Image position and size
         bb += intToBin(xy[0])  # Left position
@@ -193,8 +210,8 @@ class GifWriter:
         bb += intToBin(im.size[1])  # image height
 
         # packed field: local color table flag1, interlace0, sorted table0,
-        # reserved00, lct size111=7=2^(7 + 1)=256.
-        bb += "\x87"
+        # reserved00, lct size111=7=2^(7 + 1)=256. Or no local color table.
+        bb += b"\x87" if localPalette else b"\x00"
 
         # LZW minimum size code now comes later, begining of [image data] blocks
         return bb
@@ -214,11 +231,11 @@ class GifWriter:
             # to mean an infinite number of loops)
             # Mmm, does not seem to work
         if True:
-            bb = "\x21\xff\x0b"  # application extension
-            bb += "NETSCAPE2.0"
-            bb += "\x03\x01"
+            bb = b"\x21\xff\x0b"  # application extension
+            bb += b"NETSCAPE2.0"
+            bb += b"\x03\x01"
             bb += intToBin(loops)
-            bb += "\x00"  # end
+            bb += b"\x00"  # end
         return bb
 
     def getGraphicsControlExt(self, duration=0.1, dispose=2):
@@ -240,13 +257,13 @@ class GifWriter:
 
         """
 
-        bb = "\x21\xf9\x04"
-        bb += chr((dispose & 3) << 2)  # low bit 1 == transparency,
+        bb = b"\x21\xf9\x04"
+        bb += bytes([(dispose & 3) << 2])  # low bit 1 == transparency,
         # 2nd bit 1 == user input , next 3 bits, the low two of which are used,
         # are dispose.
         bb += intToBin(int(duration * 100))  # in 100th of seconds
-        bb += "\x00"  # no transparant color
-        bb += "\x00"  # end
+        bb += b"\x00"  # no transparant color
+        bb += b"\x00"  # end
         return bb
 
     def handleSubRectangles(self, images, subRectangles):
@@ -299,6 +316,28 @@ class GifWriter:
         # Done
         return images, xy
 
+    def getSubRectangle(self, prev, im):
+        """getSubRectangle(prev, im)
+
+        Calculate the minimal rectangle of im that differs from the
+        previous image. Returns the cropped image and its x-y position.
+
+        """
+        # Get where the image differs, for each column and each row
+        diff = im != prev
+        if diff.ndim == 3:
+            diff = diff.any(2)
+        X = np.flatnonzero(diff.any(0))
+        Y = np.flatnonzero(diff.any(1))
+        # Get rect coordinates
+        if X.size and Y.size:
+            x0, x1 = int(X[0]), int(X[-1] + 1)
+            y0, y1 = int(Y[0]), int(Y[-1] + 1)
+        else:  # No change ... make it minimal
+            x0, x1 = 0, 2
+            y0, y1 = 0, 2
+        return im[y0:y1, x0:x1], (x0, y0)
+
     def getSubRectangles(self, ims):
         """getSubRectangles(ims)
 
@@ -320,84 +359,226 @@ class GifWriter:
         if np is None:
             raise RuntimeError("Need Numpy to calculate sub-rectangles. ")
 
-        # Prepare
-        ims2 = [ims[0]]
-        xy = [(0, 0)]
-        t0 = time.time()  # noqa
-
         # Iterate over images
-        prev = ims[0]
-        for im in ims[1:]:
-            # Get difference, sum over colors
-            diff = np.abs(im - prev)
-            if diff.ndim == 3:
-                diff = diff.sum(2)
-            # Get begin and end for both dimensions
-            X = np.argwhere(diff.sum(0))
-            Y = np.argwhere(diff.sum(1))
-            # Get rect coordinates
-            if X.size and Y.size:
-                x0, x1 = int(X[0]), int(X[-1] + 1)
-                y0, y1 = int(Y[0]), int(Y[-1] + 1)
-            else:  # No change ... make it minimal
-                x0, x1 = 0, 2
-                y0, y1 = 0, 2
-
-            # Cut out and store
-            im2 = im[y0:y1, x0:x1]
-            prev = im
+        ims2, xy = [ims[0]], [(0, 0)]
+        for prev, im in zip(ims[:-1], ims[1:]):
+            im2, xy2 = self.getSubRectangle(prev, im)
             ims2.append(im2)
-            xy.append((x0, y0))
-
-        # Done
-        # print('%1.2f seconds to determine subrectangles of  %i images' %
-        #    (time.time()-t0, len(ims2)))
+            xy.append(xy2)
         return ims2, xy
 
-    def convertImagesToPIL(self, images, dither, nq=0):
-        """convertImagesToPIL(images, nq=0)
+    def convertImageToPIL(self, im, dither, nq=0):
+        """convertImageToPIL(im, dither, nq=0)
 
-        Convert images to Paletted PIL images, which can then be
-        written to a single animaged GIF.
+        Convert an image to a paletted PIL image.
 
         """
 
-        # Convert to PIL images
-        images2 = []
-        for im in images:
-            if isinstance(im, Image.Image):
-                images2.append(im)
-            elif np and isinstance(im, np.ndarray):
-                if im.ndim == 3 and im.shape[2] == 3:
-                    im = Image.fromarray(im, "RGB")
-                elif im.ndim == 3 and im.shape[2] == 4:
-                    im = Image.fromarray(im[:, :, :3], "RGB")
-                elif im.ndim == 2:
-                    im = Image.fromarray(im, "L")
-                images2.append(im)
+        # Convert to PIL image
+        if np and isinstance(im, np.ndarray):
+            if im.ndim == 3 and im.shape[2] == 3:
+                im = Image.fromarray(im, "RGB")
+            elif im.ndim == 3 and im.shape[2] == 4:
+                im = Image.fromarray(im[:, :, :3], "RGB")
+            elif im.ndim == 2:
+                im = Image.fromarray(im, "L")
 
-        # Convert to paletted PIL images
-        images, images2 = images2, []
+        # Convert to paletted PIL image
         if nq >= 1:
             # NeuQuant algorithm
-            for im in images:
-                im = im.convert("RGBA")  # NQ assumes RGBA
-                nqInstance = NeuQuant(im, int(nq))  # Learn colors from image
-                if dither:
-                    im = im.convert("RGB").quantize(palette=nqInstance.paletteImage())
-                else:
-                    # Use to quantize the image itself
-                    im = nqInstance.quantize(im)
-                images2.append(im)
+            im = im.convert("RGBA")  # NQ assumes RGBA
+            nqInstance = NeuQuant(im, int(nq))  # Learn colors from image
+            if dither:
+                return im.convert("RGB").quantize(palette=nqInstance.paletteImage())
+            else:
+                # Use to quantize the image itself
+                return nqInstance.quantize(im)
         else:
             # Adaptive PIL algorithm
-            AD = Image.ADAPTIVE
-            for im in images:
-                im = im.convert("P", palette=AD, dither=dither)
-                images2.append(im)
+            return im.convert("P", palette=Image.ADAPTIVE, dither=dither)
 
-        # Done
-        return images2
+    def convertImagesToPIL(self, images, dither, nq=0, workers=None):
+        """convertImagesToPIL(images, dither, nq=0, workers=None)
+
+        Convert images to Paletted PIL images, which can then be
+        written to a single animaged GIF. The images are converted in
+        parallel using the given number of threads (default the number
+        of cores). Each image is converted independently, so the result
+        does not depend on the number of threads.
+
+        """
+        workers = int(workers or _MAX_WORKERS)
+        if workers <= 1 or len(images) <= 1:
+            return [self.convertImageToPIL(im, dither, nq) for im in images]
+        with ThreadPoolExecutor(workers) as pool:
+            return list(
+                pool.map(lambda im: self.convertImageToPIL(im, dither, nq), images)
+            )
+
+    def getPalette(self, im):
+        """getPalette(im)
+
+        Get the color palette of a paletted PIL image, as 768 bytes.
+
+        """
+        palette = im.getpalette() or []
+        return bytes(palette[:768]).ljust(768, b"\x00")
+
+    def writeHeader(self, fp, im, globalPalette, loops):
+        """writeHeader(fp, im, globalPalette, loops)
+
+        Write the header of the animated GIF, using the size of the
+        given image.
+
+        """
+        fp.write(self.getheaderAnim(im))
+        fp.write(globalPalette)
+        fp.write(self.getAppExt(loops))
+
+    def encodeFrame(self, im):
+        """encodeFrame(im)
+
+        LZW-encode a paletted PIL image. Returns the LZW minimum code size
+        followed by the image data blocks, as bytes.
+
+        """
+        # The encoded data starts with a 10-byte image descriptor
+        return b"".join(getdata(im))[10:]
+
+    def writeFrame(
+        self, fp, im, palette, globalPalette, duration, xy, dispose, data=None
+    ):
+        """writeFrame(fp, im, palette, globalPalette, duration, xy, dispose,
+                    data=None)
+
+        Write a single paletted PIL image to the stream. The encoded image
+        data can be given (see encodeFrame()) if it is already available.
+
+        """
+
+        # Gather info
+        if data is None:
+            data = self.encodeFrame(im)
+        graphext = self.getGraphicsControlExt(duration, dispose)
+
+        # Write local header
+        fp.write(graphext)
+        if palette != globalPalette:
+            # Use local color palette
+            fp.write(self.getImageDescriptor(im, xy))
+            fp.write(palette)  # write local color table
+        else:
+            # Use global color palette
+            fp.write(self.getImageDescriptor(im, xy, False))
+
+        # Write image data
+        fp.write(data)
+
+    def learnPalette(self, images, nq=0, nframes=8, npixels=2**19):
+        """learnPalette(images, nq=0, nframes=8, npixels=2**19)
+
+        Determine a palette that suits all images, based on a sample of
+        (at most) nframes evenly distributed images, which are subsampled
+        so that at most npixels pixels are used. If nq is nonzero, the
+        NeuQuant algorithm is used, otherwise the adaptive PIL algorithm.
+        Returns the palette as a 256x3 uint8 array.
+
+        """
+
+        # Sample frames
+        n = min(nframes, len(images))
+        indices = np.linspace(0, len(images) - 1, n).round().astype(int)
+        frames = [_toRGB(images[i]) for i in sorted(set(indices))]
+
+        # Subsample pixels and combine into a single-row image
+        total = sum(im.shape[0] * im.shape[1] for im in frames)
+        step = max(1, int(np.ceil(np.sqrt(total / npixels))))
+        pixels = np.concatenate([im[::step, ::step].reshape(-1, 3) for im in frames])
+        mosaic = Image.fromarray(pixels.reshape(1, -1, 3), "RGB")
+
+        # Learn palette
+        if nq >= 1 and mosaic.size[0] >= NeuQuant.MAXPRIME:
+            nqInstance = NeuQuant(mosaic.convert("RGBA"), int(nq))
+            palette = nqInstance.colormap[:, :3].ravel().tolist()
+        else:
+            palette = mosaic.convert("P", palette=Image.ADAPTIVE).getpalette()
+        palette = np.array(palette[:768], np.uint8)
+        palette = np.concatenate([palette, np.zeros(768 - len(palette), np.uint8)])
+        return palette.reshape(256, 3)
+
+    def writeGifSharedToFile(
+        self, fp, images, durations, loops, subRectangles, disposes, dither, nq
+    ):
+        """writeGifSharedToFile(fp, images, durations, loops, subRectangles,
+                    disposes, dither, nq)
+
+        Write the images using a single (global) palette for all frames.
+        The frames are quantized using a lookup table, the sub-rectangles
+        are determined on the quantized frames, and the frames are
+        LZW-encoded in parallel, after which they are written in order.
+
+        """
+
+        # Get shared palette
+        colors = self.learnPalette(images, nq)
+        globalPalette = colors.tobytes()
+        paletteLUT = PaletteLUT(colors)
+        paletteImage = Image.new("P", (1, 1), 0)
+        paletteImage.putpalette(colors.ravel().tolist())
+
+        def quantize(im):
+            im = _toRGB(im)
+            if dither:
+                im = Image.fromarray(im, "RGB").quantize(palette=paletteImage)
+                return np.asarray(im)
+            return paletteLUT.lookup(im)
+
+        def encode(indices):
+            im = Image.fromarray(np.ascontiguousarray(indices), "P")
+            im.putpalette(colors.ravel().tolist())
+            return im, self.encodeFrame(im)
+
+        def write(i, future, xy):
+            im, data = future.result()
+            if i == 0:
+                self.writeHeader(fp, im, globalPalette, loops)
+            self.writeFrame(
+                fp,
+                im,
+                globalPalette,
+                globalPalette,
+                durations[i],
+                xy,
+                disposes[i],
+                data,
+            )
+
+        # Quantize (a limited number of frames ahead), get sub-rectangles,
+        # encode and write
+        workers = _MAX_WORKERS
+        ahead = 2 * workers
+        with ThreadPoolExecutor(workers) as pool:
+            quantized = deque(pool.submit(quantize, im) for im in images[:ahead])
+            pending = deque()
+            prev = None
+            for i in range(len(images)):
+                full = quantized.popleft().result()
+                if i + ahead < len(images):
+                    quantized.append(pool.submit(quantize, images[i + ahead]))
+                indices, xy = full, (0, 0)
+                if isinstance(subRectangles, (tuple, list)):
+                    xy = tuple(subRectangles[i]) if i else (0, 0)
+                elif subRectangles and prev is not None:
+                    indices, xy = self.getSubRectangle(prev, full)
+                prev = full
+                pending.append((i, pool.submit(encode, indices), xy))
+                while len(pending) > ahead:
+                    write(*pending.popleft())
+            while pending:
+                write(*pending.popleft())
+
+        fp.write(b";")  # end gif
+        return len(images)
 
     def writeGifToFile(self, fp, images, durations, loops, xys, disposes):
         """writeGifToFile(fp, images, durations, loops, xys, disposes)
@@ -407,79 +588,139 @@ class GifWriter:
         """
 
         # Obtain palette for all images and count each occurance
-        palettes, occur = [], []
-        for im in images:
-            palette = getheader(im)[1]
-            if not palette:
-                palette = PIL.ImagePalette.ImageColor
-                if isinstance(palette, type(os)):
-                    # Older or newer? version of Pil(low)
-                    data = PIL.ImagePalette.ImagePalette().getdata()
-                    palette = data[0].encode("utf-8") + data[1]
-                    # Arg this does not work. Go use imageio
-                    raise RuntimeError(
-                        "Cannot get palette. Maybe you should try imageio instead."
-                    )
-            palettes.append(palette)
-        for palette in palettes:
-            occur.append(palettes.count(palette))
+        palettes = [self.getPalette(im) for im in images]
+        occur = [palettes.count(palette) for palette in palettes]
 
         # Select most-used palette as the global one (or first in case no max)
         globalPalette = palettes[occur.index(max(occur))]
 
+        # Write
+        self.writeHeader(fp, images[0], globalPalette, loops)
+        for i, im in enumerate(images):
+            self.writeFrame(
+                fp, im, palettes[i], globalPalette, durations[i], xys[i], disposes[i]
+            )
+
+        fp.write(b";")  # end gif
+        return len(images)
+
+
+class GifStreamWriter:
+    """GifStreamWriter(filename, duration=0.1, repeat=True, dither=False,
+                    nq=0, subRectangles=True, dispose=None)
+
+    Write an animated gif one frame at a time. See writeGif() for the
+    meaning of the arguments (subRectangles can only be True or False
+    here). Frames are added using AddFrame(), and are converted and
+    written right away; only the previous frame is held in memory (for
+    the sub-rectangles). The palette of the first frame is used as the
+    global palette. Call Close() when done (or use the writer as a
+    context manager).
+
+    """
+
+    def __init__(
+        self,
+        filename,
+        duration=0.1,
+        repeat=True,
+        dither=False,
+        nq=0,
+        subRectangles=True,
+        dispose=None,
+    ):
+        # Check PIL
+        if PIL is None:
+            raise RuntimeError("Need PIL to write animated gif files.")
+        if subRectangles and np is None:
+            raise RuntimeError("Need Numpy to use auto-subRectangles.")
+
+        # Check loops
+        if repeat is False:
+            self._loops = 1
+        elif repeat is True:
+            self._loops = 0  # zero means infinite
+        else:
+            self._loops = int(repeat)
+
+        # Store settings
+        self._duration = duration
+        self._dither = dither
+        self._nq = nq
+        self._subRectangles = bool(subRectangles)
+        if dispose is None:
+            dispose = 1 if subRectangles else 2
+        self._dispose = dispose
+
         # Init
-        frames = 0
-        firstFrame = True
-
-        for im, palette in zip(images, palettes):
-            if firstFrame:
-                # Write header
-
-                # Gather info
-                header = self.getheaderAnim(im)
-                appext = self.getAppExt(loops)
-
-                # Write
-                fp.write(header.encode("utf-8"))
-                fp.write(globalPalette)
-                fp.write(appext.encode("utf-8"))
-
-                # Next frame is not the first
-                firstFrame = False
-
-            if True:
-                # Write palette and image data
-
-                # Gather info
-                data = getdata(im)
-                imdes, data = data[0], data[1:]
-                graphext = self.getGraphicsControlExt(
-                    durations[frames], disposes[frames]
-                )
-                # Make image descriptor suitable for using 256 local color palette
-                lid = self.getImageDescriptor(im, xys[frames])
-
-                # Write local header
-                if (palette != globalPalette) or (disposes[frames] != 2):
-                    # Use local color palette
-                    fp.write(graphext.encode("utf-8"))
-                    fp.write(lid.encode("utf-8"))  # write suitable image descriptor
-                    fp.write(palette)  # write local color table
-                    fp.write("\x08".encode("utf-8"))  # LZW minimum size code
-                else:
-                    # Use global color palette
-                    fp.write(graphext.encode("utf-8"))
-                    fp.write(imdes)  # write suitable image descriptor
+        self._gifWriter = GifWriter()
+        self._globalPalette = None
+        self._prev = None
+        self._count = 0
+        self._fp = open(filename, "wb")
+
+    @property
+    def count(self):
+        """The number of frames added so far."""
+        return self._count
+
+    def AddFrame(self, im, duration=None):
+        """AddFrame(im, duration=None)
+
+        Add a frame (a PIL image or numpy array). If duration is not
+        given, the duration given at initialization is used.
+
+        """
+        if self._fp is None:
+            raise RuntimeError("This writer is closed.")
+        gifWriter = self._gifWriter
+        im = checkImages([im])[0]
+
+        # Determine sub rectangle
+        xy = (0, 0)
+        if self._subRectangles:
+            if isinstance(im, Image.Image):
+                im = np.asarray(im.convert())  # Make without palette
+            if self._prev is not None:
+                ims, xys = gifWriter.getSubRectangles([self._prev, im])
+                self._prev, im, xy = im, ims[1], xys[1]
+            else:
+                self._prev = im
+
+        # Convert to paletted PIL image
+        im = gifWriter.convertImageToPIL(im, self._dither, self._nq)
+        palette = gifWriter.getPalette(im)
+
+        # Write
+        if self._globalPalette is None:
+            self._globalPalette = palette
+            gifWriter.writeHeader(self._fp, im, palette, self._loops)
+        if duration is None:
+            duration = self._duration
+        gifWriter.writeFrame(
+            self._fp, im, palette, self._globalPalette, duration, xy, self._dispose
+        )
+        self._count += 1
+
+    def Close(self):
+        """Close()
+
+        Finish the GIF file and close it.
 
-                # Write image data
-                for d in data:
-                    fp.write(d)
+        """
+        if self._fp is None:
+            return
+        try:
+            self._fp.write(b";")  # end gif
+        finally:
+            self._fp.close()
+            self._fp = None
 
-            # Prepare for next round
-            frames = frames + 1
+    def __enter__(self):
+        return self
 
-        fp.write(";".encode("utf-8"))  # end gif
-        return frames
+    def __exit__(self, type, value, tb):
+        self.Close()
 
 
 ## Exposed functions
@@ -494,9 +735,10 @@ def writeGif(
     nq=0,
     subRectangles=True,
     dispose=None,
+    sharedPalette=False,
 ):
     """writeGif(filename, images, duration=0.1, repeat=True, dither=False,
-                    nq=0, subRectangles=True, dispose=None)
+                    nq=0, subRectangles=True, dispose=None, sharedPalette=False)
 
     Write an animated gif from the specified images.
 
@@ -533,6 +775,13 @@ def writeGif(
         in place. 2 means the background color should be restored after
         each frame. 3 means the decoder should restore the previous frame.
         If subRectangles==False, the default is 2, otherwise it is 1.
+    sharedPalette : bool
+        If True, a single palette is determined from a sample of the
+        frames, and used for all frames (as the global color table).
+        This is much faster, since the frames are quantized with a lookup
+        table and encoded in parallel, and the file is smaller. It is
+        well suited for animations with a consistent color scheme, but
+        can reduce quality if the colors change a lot between frames.
 
     """
 
@@ -563,24 +812,33 @@ def writeGif(
     else:
         duration = [duration for im in images]
 
-    # Check subrectangles
-    if subRectangles:
-        images, xy = gifWriter.handleSubRectangles(images, subRectangles)
-        defaultDispose = 1  # Leave image in place
-    else:
-        # Normal mode
-        xy = [(0, 0) for im in images]
-        defaultDispose = 2  # Restore to background color.
-
     # Check dispose
     if dispose is None:
-        dispose = defaultDispose
+        dispose = 1 if subRectangles else 2  # Leave in place or restore
     if hasattr(dispose, "__len__"):
         if len(dispose) != len(images):
-            raise ValueError("len(xy) doesn't match amount of images.")
+            raise ValueError("len(dispose) doesn't match amount of images.")
     else:
         dispose = [dispose for im in images]
 
+    # Write using a shared palette, handles subrectangles itself
+    if sharedPalette:
+        if isinstance(subRectangles, (tuple, list)):
+            if len(subRectangles) != len(images):
+                raise ValueError("len(xy) doesn't match amount of images.")
+        with open(filename, "wb") as fp:
+            gifWriter.writeGifSharedToFile(
+                fp, images, duration, loops, subRectangles, dispose, dither, nq
+            )
+        return
+
+    # Check subrectangles
+    if subRectangles:
+        images, xy = gifWriter.handleSubRectangles(images, subRectangles)
+    else:
+        # Normal mode
+        xy = [(0, 0) for im in images]
+
     # Make images in a format that we can write easy
     images = gifWriter.convertImagesToPIL(images, dither, nq)
 
@@ -642,6 +900,71 @@ def readGif(filename, asNumpy=True):
     return images
 
 
+class PaletteLUT:
+    """PaletteLUT(colors)
+
+    Lookup table that maps RGB colors with 5 bits per channel (32x32x32
+    entries) to the index of the closest color in the given palette
+    (an Nx3 array, N <= 256). The table is filled lazily, so that only
+    the colors that occur in the images are looked up. No SciPy needed.
+
+    """
+
+    def __init__(self, colors):
+        self.colors = np.asarray(colors)[:, :3].astype(np.float32)
+        self.lut = np.full(32768, -1, np.int16)
+
+    def fill(self, keys):
+        """fill(keys)
+
+        Make sure that the table has entries for the given keys (15 bit
+        colors: r << 10 | g << 5 | b). Filling the table from multiple
+        threads is safe, since all threads would write the same values.
+
+        """
+        keys = keys[self.lut[keys] < 0]
+        if not len(keys):
+            return
+
+        # Get the centers of the bins
+        rgb = np.empty((len(keys), 3), np.float32)
+        rgb[:, 0] = (keys >> 10) & 31
+        rgb[:, 1] = (keys >> 5) & 31
+        rgb[:, 2] = keys & 31
+        rgb = rgb * 8 + 4
+
+        # |rgb - c|^2 = |rgb|^2 - 2 rgb.c + |c|^2, the first is constant
+        colors = self.colors
+        d = np.dot(rgb, -2 * colors.T)
+        d += (colors * colors).sum(1)
+        self.lut[keys] = d.argmin(1)
+
+    def getLUT(self):
+        """getLUT()
+
+        Get the full 32x32x32 lookup table.
+
+        """
+        self.fill(np.arange(32768))
+        return self.lut.reshape(32, 32, 32).astype(np.uint8)
+
+    def lookup(self, im):
+        """lookup(im)
+
+        Get the palette indices (as a uint8 array) for the given HxWx3
+        (or HxW grayscale) uint8 image.
+
+        """
+        if im.ndim == 2:
+            im = np.dstack([im, im, im])
+        im = im[:, :, :3] >> 3
+        keys = im[:, :, 0].astype(np.int32) << 10
+        keys |= im[:, :, 1].astype(np.int32) << 5
+        keys |= im[:, :, 2]
+        self.fill(np.flatnonzero(np.bincount(keys.ravel(), minlength=32768)))
+        return self.lut[keys].astype(np.uint8)
+
+
 class NeuQuant:
     """NeuQuant(image, samplefac=10, colors=256)
 
@@ -721,7 +1044,10 @@ class NeuQuant:
     pixels = None
     samplefac = None
 
-    a_s = None
+    lut = None
+
+    # The number of samples that is processed at once during learning
+    BATCHSIZE = 64
 
     def setconstants(self, samplefac, colors):
         self.NCYCLES = 100  # Number of learning cycles
@@ -759,7 +1085,7 @@ class NeuQuant:
         self.pixels = None
         self.samplefac = samplefac
 
-        self.a_s = {}
+        self.lut = None
 
     def __init__(self, image, samplefac=10, colors=256):
         # Check Numpy
@@ -772,9 +1098,9 @@ class NeuQuant:
         if image.mode != "RGBA":
             raise IOError("Image mode should be RGBA.")
 
-        # Initialize
+        # Initialize (the pixels as an Nx4 RGBA array)
         self.setconstants(samplefac, colors)
-        self.pixels = np.fromstring(image.tostring(), np.uint32)
+        self.pixels = np.asarray(image).reshape(-1, 4)
         self.setUpArrays()
 
         self.learn()
@@ -792,129 +1118,86 @@ class NeuQuant:
         return self.NETSIZE
 
     def setUpArrays(self):
-        self.network[0, 0] = 0.0  # Black
-        self.network[0, 1] = 0.0
-        self.network[0, 2] = 0.0
-
-        self.network[1, 0] = 255.0  # White
-        self.network[1, 1] = 255.0
-        self.network[1, 2] = 255.0
-
+        self.network[0] = 0.0  # Black
+        self.network[1] = 255.0  # White
         # RESERVED self.BGCOLOR # Background
 
-        for i in range(self.SPECIALS):
-            self.freq[i] = 1.0 / self.NETSIZE
-            self.bias[i] = 0.0
+        i = np.arange(self.SPECIALS, self.NETSIZE)
+        self.network[self.SPECIALS :] = (255.0 * (i - self.SPECIALS))[:, None]
+        self.network[self.SPECIALS :] /= self.CUTNETSIZE
 
-        for i in range(self.SPECIALS, self.NETSIZE):
-            p = self.network[i]
-            p[:] = (255.0 * (i - self.SPECIALS)) / self.CUTNETSIZE
-
-            self.freq[i] = 1.0 / self.NETSIZE
-            self.bias[i] = 0.0
+        self.freq[:] = 1.0 / self.NETSIZE
+        self.bias[:] = 0.0
 
     # Omitted: setPixels
 
-    def altersingle(self, alpha, i, b, g, r):
-        """Move neuron i towards biased (b, g, r) by factor alpha"""
-        n = self.network[i]  # Alter hit neuron
-        n[0] -= alpha * (n[0] - b)
-        n[1] -= alpha * (n[1] - g)
-        n[2] -= alpha * (n[2] - r)
+    def learnBatch(self, samples, alpha, rad):
+        """learnBatch(samples, alpha, rad)
 
-    def geta(self, alpha, rad):
-        try:
-            return self.a_s[(alpha, rad)]
-        except KeyError:
-            length = rad * 2 - 1
-            mid = int(length // 2)
-            q = np.array(list(range(mid - 1, -1, -1)) + list(range(-1, mid)))
-            a = alpha * (rad * rad - q * q) / (rad * rad)
-            a[mid] = 0
-            self.a_s[(alpha, rad)] = a
-            return a
-
-    def alterneigh(self, alpha, rad, i, b, g, r):
-        if i - rad >= self.SPECIALS - 1:
-            lo = i - rad
-            start = 0
-        else:
-            lo = self.SPECIALS - 1
-            start = self.SPECIALS - 1 - (i - rad)
+        Process a batch of samples (an Nx3 float32 array) at once. For each
+        sample, the best neuron is found (contest), taking into account
+        the bias, and the winning neurons and their neighbours (within
+        rad) are moved towards the sample by a factor that depends on
+        alpha. The updates of all samples in the batch are based on the
+        same state of the network, and are combined.
 
-        if i + rad <= self.NETSIZE:
-            hi = i + rad
-            end = rad * 2 - 1
-        else:
-            hi = self.NETSIZE
-            end = self.NETSIZE - (i + rad)
-
-        a = self.geta(alpha, rad)[start:end]
-
-        p = self.network[lo + 1 : hi]
-        p -= np.transpose(np.transpose(p - np.array([b, g, r])) * a)
-
-    # def contest(self, b, g, r):
-    #    """ Search for biased BGR values
-    #            Finds closest neuron (min dist) and updates self.freq
-    #            finds best neuron (min dist-self.bias) and returns position
-    #            for frequently chosen neurons, self.freq[i] is high and self.bias[i] is negative
-    #            self.bias[i] = self.GAMMA * ((1/self.NETSIZE)-self.freq[i])"""
-    #
-    #    i, j = self.SPECIALS, self.NETSIZE
-    #    dists = abs(self.network[i:j] - np.array([b, g, r])).sum(1)
-    #    bestpos = i + np.argmin(dists)
-    #    biasdists = dists - self.bias[i:j]
-    #    bestbiaspos = i + np.argmin(biasdists)
-    #    self.freq[i:j] -= self.BETA * self.freq[i:j]
-    #    self.bias[i:j] += self.BETAGAMMA * self.freq[i:j]
-    #    self.freq[bestpos] += self.BETA
-    #    self.bias[bestpos] -= self.BETAGAMMA
-    #    return bestbiaspos
-    def contest(self, b, g, r):
-        """Search for biased BGR values
-        Finds closest neuron (min dist) and updates self.freq
-        finds best neuron (min dist-self.bias) and returns position
-        for frequently chosen neurons, self.freq[i] is high and self.bias[i]
-        is negative self.bias[i] = self.GAMMA * ((1/self.NETSIZE)-self.freq[i])
         """
         i, j = self.SPECIALS, self.NETSIZE
-        dists = abs(self.network[i:j] - np.array([b, g, r])).sum(1)
-        bestpos = i + np.argmin(dists)
-        biasdists = dists - self.bias[i:j]
-        bestbiaspos = i + np.argmin(biasdists)
-        self.freq[i:j] *= 1 - self.BETA
-        self.bias[i:j] += self.BETAGAMMA * self.freq[i:j]
-        self.freq[bestpos] += self.BETA
-        self.bias[bestpos] -= self.BETAGAMMA
-        return bestbiaspos
-
-    def specialFind(self, b, g, r):
-        for i in range(self.SPECIALS):
-            n = self.network[i]
-            if n[0] == b and n[1] == g and n[2] == r:
-                return i
-        return -1
+
+        # Don't learn for specials
+        isSpecial = np.zeros(len(samples), bool)
+        for k in range(self.SPECIALS):
+            isSpecial |= (samples == self.network[k]).all(1)
+        samples = samples[~isSpecial]
+        if not len(samples):
+            return
+
+        # Contest: find closest neuron and best biased neuron per sample
+        network = self.network[i:j].astype(np.float32)
+        dists = np.abs(network[None, :, 0] - samples[:, 0, None])
+        for c in (1, 2):
+            dists += np.abs(network[None, :, c] - samples[:, c, None])
+        bestpos = dists.argmin(1)
+        bestbiaspos = (dists - self.bias[i:j]).argmin(1)
+
+        # Update freq and bias for all samples at once
+        n = len(samples)
+        hits = np.bincount(bestpos, minlength=j - i)
+        self.freq[i:j] *= (1 - self.BETA) ** n
+        self.bias[i:j] += self.BETAGAMMA * self.freq[i:j] * n
+        self.freq[i:j] += self.BETA * hits
+        self.bias[i:j] -= self.BETAGAMMA * hits
+
+        # Get weights of all neurons for each sample: alpha for the winner,
+        # and decreasing with the distance for its neighbours
+        q = np.arange(i, j)[None, :] - (bestbiaspos[:, None] + i)
+        if rad > 1:
+            weights = alpha * np.clip(rad * rad - q * q, 0, None) / (rad * rad)
+            weights[q == 0] = alpha
+        else:
+            weights = alpha * (q == 0)
+
+        # Move neurons towards the (weighted mean of) the samples
+        wsum = weights.sum(0)
+        delta = np.dot(weights.T, samples) - wsum[:, None] * self.network[i:j]
+        self.network[i:j] += delta / np.maximum(wsum, 1.0)[:, None]
 
     def learn(self):
+        """learn()
+
+        Train the network on a sample of the pixels. The pixels are
+        sampled with a fixed stride, and processed in batches, so that
+        the result is deterministic.
+
+        """
         biasRadius = self.INITBIASRADIUS
         alphadec = 30 + ((self.samplefac - 1) / 3)
-        lengthcount = self.pixels.size
-        samplepixels = lengthcount / self.samplefac
-        delta = samplepixels / self.NCYCLES
+        lengthcount = len(self.pixels)
+        samplepixels = int(lengthcount / self.samplefac)
+        delta = max(1, samplepixels // self.NCYCLES)
         alpha = self.INITALPHA
 
-        i = 0
-        rad = biasRadius * 2**self.RADIUSBIASSHIFT
-        if rad <= 1:
-            rad = 0
-
-        print(
-            "Beginning 1D learning: samplepixels = %1.2f  rad = %i"
-            % (samplepixels, rad)
-        )
-        step = 0
-        pos = 0
+        # Get sample positions
         if lengthcount % NeuQuant.PRIME1 != 0:
             step = NeuQuant.PRIME1
         elif lengthcount % NeuQuant.PRIME2 != 0:
@@ -923,84 +1206,39 @@ class NeuQuant:
             step = NeuQuant.PRIME3
         else:
             step = NeuQuant.PRIME4
-
-        i = 0
-        printed_string = ""
-        while i < samplepixels:
-            if i % 100 == 99:
-                tmp = "\b" * len(printed_string)
-                printed_string = str((i + 1) * 100 / samplepixels) + "%\n"
-                print(tmp + printed_string)
-            p = self.pixels[pos]
-            r = (p >> 16) & 0xFF
-            g = (p >> 8) & 0xFF
-            b = (p) & 0xFF
-
-            if i == 0:  # Remember background colour
-                self.network[self.BGCOLOR] = [b, g, r]
-
-            j = self.specialFind(b, g, r)
-            if j < 0:
-                j = self.contest(b, g, r)
-
-            if j >= self.SPECIALS:  # Don't learn for specials
-                a = (1.0 * alpha) / self.INITALPHA
-                self.altersingle(a, j, b, g, r)
-                if rad > 0:
-                    self.alterneigh(a, rad, j, b, g, r)
-
-            pos = (pos + step) % lengthcount
-
-            i += 1
-            if i % delta == 0:
-                alpha -= alpha / alphadec
-                biasRadius -= biasRadius / self.RADIUSDEC
-                rad = biasRadius * 2**self.RADIUSBIASSHIFT
-                if rad <= 1:
-                    rad = 0
-
-        finalAlpha = (1.0 * alpha) / self.INITALPHA
-        print("Finished 1D learning: final alpha = %1.2f!" % finalAlpha)
+        pos = (np.arange(samplepixels, dtype=np.int64) * step) % lengthcount
+        samples = self.pixels[pos, :3].astype(np.float32)
+
+        # Remember background colour
+        self.network[self.BGCOLOR] = samples[0]
+
+        # Learn, the parameters are decreased each delta samples
+        for cycle in range(0, samplepixels, delta):
+            rad = biasRadius / self.RADIUSBIAS
+            a = (1.0 * alpha) / self.INITALPHA
+            for k in range(cycle, min(cycle + delta, samplepixels), self.BATCHSIZE):
+                end = min(k + self.BATCHSIZE, cycle + delta, samplepixels)
+                self.learnBatch(samples[k:end], a, rad)
+            alpha -= alpha / alphadec
+            biasRadius -= biasRadius / self.RADIUSDEC
 
     def fix(self):
-        for i in range(self.NETSIZE):
-            for j in range(3):
-                x = int(0.5 + self.network[i, j])
-                x = max(0, x)
-                x = min(255, x)
-                self.colormap[i, j] = x
-            self.colormap[i, 3] = i
+        colormap = np.floor(0.5 + self.network)
+        self.colormap[:, :3] = np.clip(colormap, 0, 255)
+        self.colormap[:, 3] = np.arange(self.NETSIZE)
 
     def inxbuild(self):
-        previouscol = 0
-        startpos = 0
-        for i in range(self.NETSIZE):
-            p = self.colormap[i]
-            q = None
-            smallpos = i
-            smallval = p[1]  # Index on g
-            # Find smallest in i..self.NETSIZE-1
-            for j in range(i + 1, self.NETSIZE):
-                q = self.colormap[j]
-                if q[1] < smallval:  # Index on g
-                    smallpos = j
-                    smallval = q[1]  # Index on g
-
-            q = self.colormap[smallpos]
-            # Swap p (i) and q (smallpos) entries
-            if i != smallpos:
-                p[:], q[:] = q, p.copy()
-
-            # smallval entry is now in position i
-            if smallval != previouscol:
-                self.netindex[previouscol] = (startpos + i) >> 1
-                for j in range(previouscol + 1, smallval):
-                    self.netindex[j] = i
-                previouscol = smallval
-                startpos = i
-        self.netindex[previouscol] = (startpos + self.MAXNETPOS) >> 1
-        for j in range(previouscol + 1, 256):  # Really 256
-            self.netindex[j] = self.MAXNETPOS
+        """inxbuild()
+
+        Sort the colormap on green, and build an index into it for
+        each green value.
+
+        """
+        order = np.argsort(self.colormap[:, 1], kind="stable")
+        self.colormap[:] = self.colormap[order]
+        self.netindex[:] = np.searchsorted(self.colormap[:, 1], np.arange(256))
+        self.netindex[:] = np.minimum(self.netindex, self.MAXNETPOS)
+        self.lut = None
 
     def paletteImage(self):
         """PIL weird interface for making a paletted image: create an image
@@ -1018,13 +1256,27 @@ class NeuQuant:
             self.pimage.putpalette(palette)
         return self.pimage
 
+    def getLUT(self):
+        """getLUT()
+
+        Get the 32x32x32 lookup table that maps RGB colors (with 5 bits
+        per channel) to the index of the closest color in the colormap.
+
+        """
+        if self.lut is None:
+            self.lut = PaletteLUT(self.colormap)
+        return self.lut.getLUT()
+
     def quantize(self, image):
-        """Use a kdtree to quickly find the closest palette colors for the pixels"""
-        if get_cKDTree():
-            return self.quantize_with_scipy(image)
-        else:
-            print("Scipy not available, falling back to slower version.")
-            return self.quantize_without_scipy(image)
+        """Use a lookup table to quickly find the closest palette colors
+        for the pixels. Returns a paletted PIL image."""
+        if self.lut is None:
+            self.lut = PaletteLUT(self.colormap)
+        indices = self.lut.lookup(np.asarray(image))
+
+        im = Image.fromarray(indices, "P")
+        im.putpalette(self.paletteImage().getpalette())
+        return im
 
     def quantize_with_scipy(self, image):
         w, h = image.size
@@ -1040,24 +1292,6 @@ class NeuQuant:
 
         return Image.fromarray(px).convert("RGB").quantize(palette=self.paletteImage())
 
-    def quantize_without_scipy(self, image):
-        """ " This function can be used if no scipy is availabe.
-        It's 7 times slower though.
-        """
-        w, h = image.size
-        px = np.asarray(image).copy()
-        memo = {}
-        for j in range(w):
-            for i in range(h):
-                key = (px[i, j, 0], px[i, j, 1], px[i, j, 2])
-                try:
-                    val = memo[key]
-                except KeyError:
-                    val = self.convert(*key)
-                    memo[key] = val
-                px[i, j, 0], px[i, j, 1], px[i, j, 2] = val
-        return Image.fromarray(px).convert("RGB").quantize(palette=self.paletteImage())
-
     def convert(self, *color):
         i = self.inxsearch(*color)
         return self.colormap[i, :3]
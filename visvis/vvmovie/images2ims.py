@@ -29,9 +29,16 @@
 
 Use PIL to create a series of images.
 
+Reading and writing is done in parallel using a pool of threads (PIL
+releases the GIL while encoding and decoding). The frames are delivered
+in order, and only a limited number of frames is held in memory, so that
+long sequences can be processed as a stream.
+
 """
 
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import numpy as np
@@ -44,50 +51,80 @@ try:
 except ImportError:
     PIL = None
 
+# The default number of threads to read and write images with
+_MAX_WORKERS = os.cpu_count() or 1
+
+
+def checkImage(im):
+    """checkImage(im)
+    Check a numpy image and correct intensity range etc. Returns a
+    PIL image or a uint8 numpy array.
+    """
+    if PIL and isinstance(im, PIL.Image.Image):
+        # We assume PIL images are allright
+        return im
+
+    elif np and isinstance(im, np.ndarray):
+        # Check size
+        if im.ndim == 2:
+            pass  # ok
+        elif im.ndim == 3:
+            if im.shape[2] not in [3, 4]:
+                raise ValueError("This array can not represent an image.")
+        else:
+            raise ValueError("This array can not represent an image.")
+        # Check and convert dtype
+        if im.dtype == np.uint8:
+            return im  # Ok
+        elif im.dtype in [np.float32, np.float64]:
+            theMax = im.max()
+            if theMax > 128 and theMax < 300:
+                pass  # assume 0:255
+            else:
+                im = np.clip(im, 0, 1) * 255
+            return im.astype(np.uint8)
+        else:
+            return im.astype(np.uint8)
+    else:
+        raise ValueError("Invalid image type: " + str(type(im)))
+
 
 def checkImages(images):
     """checkImages(images)
     Check numpy images and correct intensity range etc.
     The same for all movie formats.
     """
-    # Init results
-    images2 = []
-
-    for im in images:
-        if PIL and isinstance(im, PIL.Image.Image):
-            # We assume PIL images are allright
-            images2.append(im)
-
-        elif np and isinstance(im, np.ndarray):
-            # Check and convert dtype
-            if im.dtype == np.uint8:
-                images2.append(im)  # Ok
-            elif im.dtype in [np.float32, np.float64]:
-                theMax = im.max()
-                if theMax > 128 and theMax < 300:
-                    pass  # assume 0:255
-                else:
-                    im = im.copy()
-                    im[im < 0] = 0
-                    im[im > 1] = 1
-                    im *= 255
-                images2.append(im.astype(np.uint8))
-            else:
-                im = im.astype(np.uint8)
-                images2.append(im)
-            # Check size
-            if im.ndim == 2:
-                pass  # ok
-            elif im.ndim == 3:
-                if im.shape[2] not in [3, 4]:
-                    raise ValueError("This array can not represent an image.")
-            else:
-                raise ValueError("This array can not represent an image.")
-        else:
-            raise ValueError("Invalid image type: " + str(type(im)))
+    return [checkImage(im) for im in images]
+
 
-    # Done
-    return images2
+def orderedMap(func, iterable, workers=None):
+    """orderedMap(func, iterable, workers=None)
+
+    Generator that applies func to each element of iterable using a pool
+    of threads, and yields the results in order. The iterable is consumed
+    lazily, and at most twice the number of workers elements are in
+    progress at any time, which bounds the memory use.
+
+    """
+    workers = int(workers or _MAX_WORKERS)
+    if workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    pool = ThreadPoolExecutor(workers)
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown()
 
 
 def _getFilenameParts(filename):
@@ -126,8 +163,129 @@ def _getSequenceNumber(filename, part1, part2):
     return int(seq2)
 
 
-def writeIms(filename, images):
-    """writeIms(filename, images)
+def _getSequenceFilenames(filename):
+    """_getSequenceFilenames(filename)
+
+    Get the (sorted) list of filenames of the image series.
+
+    """
+    # Get dirname and filename
+    filename = os.path.abspath(filename)
+    dirname, filename = os.path.split(filename)
+
+    # Check dir exists
+    if not os.path.isdir(dirname):
+        raise IOError("Directory not found: " + str(dirname))
+
+    # Get two parts of the filename
+    part1, part2 = _getFilenameParts(filename)
+
+    # Get all files in directory and sort by sequence number
+    filenames = []
+    for fname in os.listdir(dirname):
+        if fname.startswith(part1) and fname.endswith(part2):
+            try:
+                nr = _getSequenceNumber(fname, part1, part2)
+            except ValueError:
+                continue  # Not part of the sequence
+            filenames.append((nr, os.path.join(dirname, fname)))
+    filenames.sort()
+    return [fname for nr, fname in filenames]
+
+
+class ImsStreamWriter:
+    """ImsStreamWriter(filename, N=None, workers=None)
+
+    Write a series of image files, one frame at a time. See writeIms()
+    for how the filename is used. N is the (expected) number of images,
+    which determines the number of digits of the sequence number (four
+    if not given).
+
+    Frames are added using AddFrame(). Each frame is converted to uint8
+    right away, and written by a pool of threads; at most twice the
+    number of workers frames are held in memory. Call Close() when done
+    (or use the writer as a context manager).
+
+    """
+
+    def __init__(self, filename, N=None, workers=None):
+        # Check PIL
+        if PIL is None:
+            raise RuntimeError("Need PIL to write series of image files.")
+
+        # Get dirname and filename
+        filename = os.path.abspath(filename)
+        dirname, filename = os.path.split(filename)
+
+        # Create dir(s) if we need to
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        # Insert formatter
+        filename = _getFilenameWithFormatter(filename, N or 9999)
+        self._filename = os.path.join(dirname, filename)
+
+        # Init
+        self._workers = int(workers or _MAX_WORKERS)
+        self._pool = None
+        if self._workers > 1:
+            self._pool = ThreadPoolExecutor(self._workers)
+        self._pending = deque()
+        self._count = 0
+
+    @property
+    def count(self):
+        """The number of frames added so far."""
+        return self._count
+
+    def _WriteFrame(self, fname, frame):
+        if np and isinstance(frame, np.ndarray):
+            frame = PIL.Image.fromarray(frame)
+        frame.save(fname)
+
+    def AddFrame(self, im):
+        """AddFrame(im)
+
+        Add a frame (a PIL image or numpy array).
+
+        """
+        if self._pending is None:
+            raise RuntimeError("This writer is closed.")
+        im = checkImage(im)
+        self._count += 1
+        fname = self._filename % self._count
+        if self._pool is None:
+            self._WriteFrame(fname, im)
+        else:
+            self._pending.append(self._pool.submit(self._WriteFrame, fname, im))
+            if len(self._pending) >= 2 * self._workers:
+                self._pending.popleft().result()
+
+    def Close(self):
+        """Close()
+
+        Wait until all frames are written.
+
+        """
+        if self._pending is None:
+            return
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            self._pending = None
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.Close()
+
+
+def writeIms(filename, images, workers=None):
+    """writeIms(filename, images, workers=None)
 
     Export movie to a series of image files. If the filenenumber
     contains an asterix, a sequence number is introduced at its
@@ -139,45 +297,54 @@ def writeIms(filename, images):
 
     Images should be a list consisting of PIL images or numpy arrays.
     The latter should be between 0 and 255 for integer types, and
-    between 0 and 1 for float types.
-
-    """
+    between 0 and 1 for float types. Images can also be a generator
+    (or any other iterable); the frames are then consumed as they
+    are written. The number of digits of the sequence number is four
+    if the number of images is not known.
 
-    # Check PIL
-    if PIL is None:
-        raise RuntimeError("Need PIL to write series of image files.")
+    The images are converted and written using the given number of
+    threads (default the number of cores). Returns the number of
+    images written. See ImsStreamWriter to write frames one by one.
 
-    # Check images
-    images = checkImages(images)
+    """
+    N = len(images) if hasattr(images, "__len__") else None
+    with ImsStreamWriter(filename, N, workers) as writer:
+        for im in images:
+            writer.AddFrame(im)
+    return writer.count
 
-    # Get dirname and filename
-    filename = os.path.abspath(filename)
-    dirname, filename = os.path.split(filename)
 
-    # Create dir(s) if we need to
-    if not os.path.isdir(dirname):
-        os.makedirs(dirname)
-
-    # Insert formatter
-    filename = _getFilenameWithFormatter(filename, len(images))
-
-    # Write
-    seq = 0
-    for frame in images:
-        seq += 1
-        # Get filename
-        fname = os.path.join(dirname, filename % seq)
-        # Write image
-        if np and isinstance(frame, np.ndarray):
-            frame = PIL.Image.fromarray(frame)
-        frame.save(fname)
+def _readIm(fname, asNumpy=True):
+    """_readIm(fname, asNumpy=True)
 
+    Read a single image, as a numpy array or PIL image.
 
-def readIms(filename, asNumpy=True):
-    """readIms(filename, asNumpy=True)
+    """
+    # Get Pil image and store copy (to prevent keeping the file)
+    with PIL.Image.open(fname) as im:
+        im = im.copy()
 
-    Read images from a series of images in a single directory. Returns a
-    list of numpy arrays, or, if asNumpy is false, a list if PIL images.
+    # Convert to numpy if needed
+    if asNumpy:
+        # Make without palette
+        if im.mode == "P":
+            im = im.convert()
+        # Make numpy array
+        a = np.asarray(im)
+        if len(a.shape) == 0:
+            raise MemoryError("Too little memory to convert PIL image to array")
+        return a
+    return im
+
+
+def iterIms(filename, asNumpy=True, workers=None):
+    """iterIms(filename, asNumpy=True, workers=None)
+
+    Generator that reads the images from a series of images in a single
+    directory. Yields numpy arrays, or, if asNumpy is false, PIL images.
+    The images are read ahead in parallel using the given number of
+    threads (default the number of cores), but only a few images are
+    held in memory at any time.
 
     """
 
@@ -189,47 +356,17 @@ def readIms(filename, asNumpy=True):
     if asNumpy and np is None:
         raise RuntimeError("Need Numpy to return numpy arrays.")
 
-    # Get dirname and filename
-    filename = os.path.abspath(filename)
-    dirname, filename = os.path.split(filename)
-
-    # Check dir exists
-    if not os.path.isdir(dirname):
-        raise IOError("Directory not found: " + str(dirname))
-
-    # Get two parts of the filename
-    part1, part2 = _getFilenameParts(filename)
+    filenames = _getSequenceFilenames(filename)
+    return orderedMap(lambda fname: _readIm(fname, asNumpy), filenames, workers)
 
-    # Init images
-    images = []
 
-    # Get all files in directory
-    for fname in os.listdir(dirname):
-        if fname.startswith(part1) and fname.endswith(part2):
-            # Get sequence number
-            nr = _getSequenceNumber(fname, part1, part2)
-            # Get Pil image and store copy (to prevent keeping the file)
-            im = PIL.Image.open(os.path.join(dirname, fname))
-            images.append((im.copy(), nr))
+def readIms(filename, asNumpy=True, workers=None):
+    """readIms(filename, asNumpy=True, workers=None)
 
-    # Sort images
-    images.sort(key=lambda x: x[1])
-    images = [im[0] for im in images]
+    Read images from a series of images in a single directory. Returns a
+    list of numpy arrays, or, if asNumpy is false, a list if PIL images.
+    The images are read in parallel using the given number of threads
+    (default the number of cores). See iterIms() for a generator version.
 
-    # Convert to numpy if needed
-    if asNumpy:
-        images2 = images
-        images = []
-        for im in images2:
-            # Make without palette
-            if im.mode == "P":
-                im = im.convert()
-            # Make numpy array
-            a = np.asarray(im)
-            if len(a.shape) == 0:
-                raise MemoryError("Too little memory to convert PIL image to array")
-            # Add
-            images.append(a)
-
-    # Done
-    return images
+    """
+    return list(iterIms(filename, asNumpy, workers))
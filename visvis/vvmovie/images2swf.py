@@ -67,9 +67,10 @@ sources and tools:
 
 """
 
+import io
 import os
+import struct
 import sys
-import time
 import zlib
 
 try:
@@ -154,77 +155,59 @@ def checkImages(images):
 
 
 class BitArray:
-    """Dynamic array of bits that automatically resizes
-    with factors of two.
-    Append bits using .Append() or +=
+    """Dynamic array of bits, packed in an integer.
+    Append bits using .Append(), .AppendInt() or +=
     You can reverse bits using .Reverse()
     """
 
     def __init__(self, initvalue=None):
-        self.data = np.zeros((16,), dtype=np.uint8)
+        self._value = 0
         self._len = 0
         if initvalue is not None:
             self.Append(initvalue)
 
     def __len__(self):
-        return self._len  # self.data.shape[0]
+        return self._len
 
     def __repr__(self):
-        return self.data[: self._len].tostring().decode("ascii")
-
-    def _checkSize(self):
-        # check length... grow if necessary
-        arraylen = self.data.shape[0]
-        if self._len >= arraylen:
-            tmp = np.zeros((arraylen * 2,), dtype=np.uint8)
-            tmp[: self._len] = self.data[: self._len]
-            self.data = tmp
+        if not self._len:
+            return ""
+        return bin(self._value)[2:].rjust(self._len, "0")
 
     def __add__(self, value):
         self.Append(value)
         return self
 
     def Append(self, bits):
-        # check input
+        """Append bits, given as a BitArray or as a string of 0's and
+        1's (integers are interpreted as such a string)."""
         if isinstance(bits, BitArray):
-            bits = str(bits)
+            self.AppendInt(bits._value, bits._len)
+            return
         if isinstance(bits, int):
             bits = str(bits)
         if not isinstance(bits, string_types):
             raise ValueError("Append bits as strings or integers!")
+        if bits:
+            self.AppendInt(int(bits, 2), len(bits))
 
-        # add bits
-        for bit in bits:
-            self.data[self._len] = ord(bit)
-            self._len += 1
-            self._checkSize()
+    def AppendInt(self, value, n):
+        """Append the n least significant bits of the given integer."""
+        self._value = (self._value << n) | (int(value) & ((1 << n) - 1))
+        self._len += n
 
     def Reverse(self):
         """In-place reverse."""
-        tmp = self.data[: self._len].copy()
-        self.data[: self._len] = np.flipud(tmp)
+        bits = bin(self._value)[2:].rjust(self._len, "0")
+        self._value = int(bits[::-1] or "0", 2)
 
     def ToBytes(self):
         """Convert to bytes. If necessary,
         zeros are padded to the end (right side).
         """
-        bits = str(self)
-
-        # determine number of bytes
-        nbytes = 0
-        while nbytes * 8 < len(bits):
-            nbytes += 1
-        # pad
-        bits = bits.ljust(nbytes * 8, "0")
-
-        # go from bits to bytes
-        bb = binary_type()
-        for i in range(nbytes):
-            tmp = int(bits[i * 8 : (i + 1) * 8], 2)
-            bb += intToUint8(tmp)
-
-        # done
-        return bb
+        nbytes = (self._len + 7) // 8
+        value = self._value << (nbytes * 8 - self._len)
+        return value.to_bytes(nbytes, "big")
 
 
 if PY3:
@@ -263,68 +246,33 @@ else:
 def intToBits(i, n=None):
     """convert int to a string of bits (0's and 1's in a string),
     pad to n elements. Convert back using int(ss,2)."""
-    ii = i
-
-    # make bits
+    i = int(i)
+    if n is None:
+        n = i.bit_length()
+    elif i.bit_length() > n:
+        raise ValueError("intToBits fail: len larger than padlength.")
     bb = BitArray()
-    while ii > 0:
-        bb += str(ii % 2)
-        ii = ii >> 1
-    bb.Reverse()
-
-    # justify
-    if n is not None:
-        if len(bb) > n:
-            raise ValueError("intToBits fail: len larger than padlength.")
-        bb = str(bb).rjust(n, "0")
-
-    # done
-    return BitArray(bb)
+    bb.AppendInt(i, n)
+    return bb
 
 
 def bitsToInt(bb, n=8):
-    # Init
-    value = ""
-
-    # Get value in bits
-    for i in range(len(bb)):
-        b = bb[i : i + 1]
-        tmp = bin(ord(b))[2:]
-        # value += tmp.rjust(8,'0')
-        value = tmp.rjust(8, "0") + value
-
-    # Make decimal
-    return int(value[:n], 2)
+    """Interpret the given bytes as a little endian integer, and
+    return the value of the n most significant bits."""
+    return int.from_bytes(bb, "little") >> (len(bb) * 8 - n)
 
 
 def getTypeAndLen(bb):
     """bb should be 6 bytes at least
     Return (type, length, length_of_full_tag)
     """
-    # Init
-    value = ""
-
-    # Get first 16 bits
-    for i in range(2):
-        b = bb[i : i + 1]
-        tmp = bin(ord(b))[2:]
-        # value += tmp.rjust(8,'0')
-        value = tmp.rjust(8, "0") + value
-
-    # Get type and length
-    type = int(value[:10], 2)
-    L = int(value[10:], 2)
+    value = int.from_bytes(bb[:2], "little")
+    type, L = value >> 6, value & 63
     L2 = L + 2
 
     # Long tag header?
     if L == 63:  # '111111'
-        value = ""
-        for i in range(2, 6):
-            b = bb[i : i + 1]  # becomes a single-byte bytes() on both PY3 and PY2
-            tmp = bin(ord(b))[2:]
-            # value += tmp.rjust(8,'0')
-            value = tmp.rjust(8, "0") + value
-        L = int(value, 2)
+        L = int.from_bytes(bb[2:6], "little")
         L2 = L + 6
 
     # Done
@@ -336,33 +284,15 @@ def signedIntToBits(i, n=None):
     pad to n elements. Negative numbers are stored in 2's complement bit
     patterns, thus positive numbers always start with a 0.
     """
-
-    # negative number?
-    ii = i
-    if i < 0:
-        # A negative number, -n, is represented as the bitwise opposite of
-        ii = abs(ii) - 1  # the positive-zero number n-1.
-
-    # make bits
+    i = int(i)
+    nmin = (i if i >= 0 else -i - 1).bit_length() + 1  # need the sign bit
+    if n is None:
+        n = nmin
+    elif nmin > n:
+        raise ValueError("signedIntToBits fail: len larger than padlength.")
     bb = BitArray()
-    while ii > 0:
-        bb += str(ii % 2)
-        ii = ii >> 1
-    bb.Reverse()
-
-    # justify
-    bb = "0" + str(bb)  # always need the sign bit in front
-    if n is not None:
-        if len(bb) > n:
-            raise ValueError("signedIntToBits fail: len larger than padlength.")
-        bb = bb.rjust(n, "0")
-
-    # was it negative? (then opposite bits)
-    if i < 0:
-        bb = bb.replace("0", "x").replace("1", "0").replace("x", "1")
-
-    # done
-    return BitArray(bb)
+    bb.AppendInt(i, n)  # masking gives the 2's complement
+    return bb
 
 
 def twitsToBits(arr):
@@ -401,7 +331,7 @@ def floatsToBits(arr):
         i1 = int(i)
         i2 = i - i1
         bits += intToBits(i1, 15)
-        bits += intToBits(i2 * 2**16, 16)
+        bits += intToBits(int(i2 * 2**16), 16)
     return bits
 
 
@@ -433,21 +363,21 @@ class Tag:
     def GetTag(self):
         """Calls processTag and attaches the header."""
         self.ProcessTag()
+        return self._GetHeader() + self.bytes
 
-        # tag to binary
-        bits = intToBits(self.tagtype, 10)
-
-        # complete header uint16 thing
-        bits += "1" * 6  # = 63 = 0x3f
-        # make uint16
-        bb = intToUint16(int(str(bits), 2))
-
-        # now add 32bit length descriptor
-        bb += intToUint32(len(self.bytes))
+    def WriteTag(self, fp):
+        """Calls processTag and writes the header and the tag to the
+        given file, without joining them first."""
+        self.ProcessTag()
+        fp.write(self._GetHeader())
+        fp.write(self.bytes)
 
-        # done, attach and return
-        bb += self.bytes
-        return bb
+    def _GetHeader(self, n=None):
+        # tag type in 10 bits, and 63 (0x3f) for a long length descriptor,
+        # followed by the 32bit length
+        if n is None:
+            n = len(self.bytes)
+        return struct.pack("<HI", (self.tagtype << 6) | 63, n)
 
     def MakeRectRecord(self, xmin, xmax, ymin, ymax):
         """Simply uses makeCompactArray to produce
@@ -457,7 +387,7 @@ class Tag:
     def MakeMatrixRecord(self, scale_xy=None, rot_xy=None, trans_xy=None):
         # empty matrix?
         if scale_xy is None and rot_xy is None and trans_xy is None:
-            return "0" * 8
+            return BitArray("0" * 8)
 
         # init
         bits = BitArray()
@@ -577,38 +507,53 @@ class BitmapTag(DefinitionTag):
         # more data is required for storing (25% or so, and less than 10%
         # when storing RGB as ARGB).
 
-        if len(im.shape) == 3:
-            if im.shape[2] in [3, 4]:
-                tmp = np.ones((im.shape[0], im.shape[1], 4), dtype=np.uint8) * 255
-                for i in range(3):
-                    tmp[:, :, i + 1] = im[:, :, i]
-                if im.shape[2] == 4:
-                    tmp[:, :, 0] = im[:, :, 3]  # swap channel where alpha is in
-            else:
-                raise ValueError("Invalid shape to be an image.")
-
-        elif len(im.shape) == 2:
-            tmp = np.ones((im.shape[0], im.shape[1], 4), dtype=np.uint8) * 255
-            for i in range(3):
-                tmp[:, :, i + 1] = im[:, :]
-        else:
-            raise ValueError("Invalid shape to be an image.")
+        tmp = _toARGB(im)
 
         # we changed the image to uint8 4 channels.
         # now compress!
-        self._data = zlib.compress(tmp.tostring(), zlib.DEFLATED)
+        self._data = zlib.compress(tmp, zlib.DEFLATED)
         self.imshape = im.shape
 
     def ProcessTag(self):
-        # build tag
-        bb = binary_type()
-        bb += intToUint16(self.id)  # CharacterID
-        bb += intToUint8(5)  # BitmapFormat
-        bb += intToUint16(self.imshape[1])  # BitmapWidth
-        bb += intToUint16(self.imshape[0])  # BitmapHeight
-        bb += self._data  # ZlibBitmapData
+        self.bytes = self._GetInfo() + self._data
+
+    def WriteTag(self, fp):
+        # Write the parts separately to avoid copying the bitmap data
+        info = self._GetInfo()
+        fp.write(self._GetHeader(len(info) + len(self._data)))
+        fp.write(info)
+        fp.write(self._data)
+
+    def _GetInfo(self):
+        # CharacterID, BitmapFormat, BitmapWidth and BitmapHeight
+        return struct.pack("<HBHH", self.id, 5, self.imshape[1], self.imshape[0])
+
+
+def _toARGB(im):
+    """Get the given image (HxW, HxWx3 or HxWx4 uint8 array) as an
+    HxWx4 array in ARGB format. For RGBA images, each pixel is rotated
+    as a 32 bit integer, rather than copying the channels one by one."""
+    if im.ndim == 3 and im.shape[2] == 4:
+        rgba = np.ascontiguousarray(im).view("<u4")
+        return ((rgba << 8) | (rgba >> 24)).view(np.uint8)
+    elif im.ndim == 3 and im.shape[2] == 3:
+        tmp = np.empty(im.shape[:2] + (4,), np.uint8)
+        tmp[:, :, 0] = 255
+        tmp[:, :, 1:] = im
+        return tmp
+    elif im.ndim == 2:
+        tmp = np.empty(im.shape + (4,), np.uint8)
+        tmp[:, :, 0] = 255
+        tmp[:, :, 1:] = im[:, :, None]
+        return tmp
+    else:
+        raise ValueError("Invalid shape to be an image.")
 
-        self.bytes = bb
+
+def _fromARGB(a):
+    """Inverse of _toARGB: get an HxWx4 ARGB array as RGBA."""
+    argb = np.ascontiguousarray(a).view("<u4")
+    return ((argb >> 8) | (argb << 24)).view(np.uint8)
 
 
 class PlaceObjectTag(ControlTag):
@@ -765,10 +710,8 @@ class ShapeTag(DefinitionTag):
 
 
 ## Last few functions
-def buildFile(fp, taglist, nframes=1, framesize=(500, 500), fps=10, version=8):
-    """Give the given file (as bytes) a header."""
-
-    # compose header
+def buildHeader(nframes=1, framesize=(500, 500), fps=10, version=8):
+    """Get the header of an swf file (with the FileLength left open)."""
     bb = binary_type()
     bb += "F".encode("ascii")  # uncompressed
     bb += "WS".encode("ascii")  # signature bytes
@@ -777,11 +720,18 @@ def buildFile(fp, taglist, nframes=1, framesize=(500, 500), fps=10, version=8):
     bb += Tag().MakeRectRecord(0, framesize[0], 0, framesize[1]).ToBytes()
     bb += intToUint8(0) + intToUint8(fps)  # FrameRate
     bb += intToUint16(nframes)
-    fp.write(bb)
+    return bb
+
+
+def buildFile(fp, taglist, nframes=1, framesize=(500, 500), fps=10, version=8):
+    """Give the given file (as bytes) a header."""
+
+    # compose header
+    fp.write(buildHeader(nframes, framesize, fps, version))
 
     # produce all tags
     for tag in taglist:
-        fp.write(tag.GetTag())
+        tag.WriteTag(fp)
 
     # finish with end tag
     fp.write("\x00\x00".encode("ascii"))
@@ -792,6 +742,111 @@ def buildFile(fp, taglist, nframes=1, framesize=(500, 500), fps=10, version=8):
     fp.write(intToUint32(sze))
 
 
+class SwfStreamWriter:
+    """SwfStreamWriter(filename, duration=0.1, repeat=True)
+
+    Write an swf-file one frame at a time. The given duration determines
+    the frame rate; frames added with a longer duration are shown for an
+    integer amount of frames. Frames are added using AddFrame(), and are
+    compressed and written right away. If repeat is False, the movie is
+    finished with a stop action. Call Close() when done (or use the
+    writer as a context manager).
+
+    """
+
+    def __init__(self, filename, duration=0.1, repeat=True):
+        # Check Numpy
+        if np is None:
+            raise RuntimeError("Need Numpy to write an SWF file.")
+
+        self._duration = float(duration)
+        self._repeat = repeat
+        self._count = 0
+        self._nframes = 0
+        self._nframesPos = None
+        self._fp = open(filename, "wb")
+
+    @property
+    def count(self):
+        """The number of frames added so far."""
+        return self._count
+
+    def AddFrame(self, im, duration=None):
+        """AddFrame(im, duration=None)
+
+        Add a frame (a PIL image or numpy array). If duration is not
+        given, the duration given at initialization is used.
+
+        """
+        if self._fp is None:
+            raise RuntimeError("This writer is closed.")
+
+        # Check image (make Numpy)
+        im = checkImages([im])[0]
+        if PIL and isinstance(im, PIL.Image.Image):
+            if im.mode == "P":
+                im = im.convert()
+            im = np.asarray(im)
+            if len(im.shape) == 0:
+                raise MemoryError("Too little memory to convert PIL image to array")
+        wh = (im.shape[1], im.shape[0])
+
+        # Write header with the size of the first image
+        if self._count == 0:
+            header = buildHeader(0, wh, 1.0 / self._duration)
+            self._fp.write(header)
+            self._nframesPos = len(header) - 2
+            for tag in [FileAttributesTag(), SetBackgroundTag(0, 0, 0)]:
+                tag.WriteTag(self._fp)
+
+        # Get number of frames to show this image
+        if duration is None:
+            duration = self._duration
+        delay = max(1, int(round(duration / self._duration)))
+
+        # Produce tags for the image
+        bm = BitmapTag(im)
+        sh = ShapeTag(bm.id, (0, 0), wh)
+        po = PlaceObjectTag(1, sh.id, move=self._count > 0)
+        for tag in [bm, sh, po] + [ShowFrameTag() for i in range(delay)]:
+            tag.WriteTag(self._fp)
+        self._count += 1
+        self._nframes += delay
+
+    def Close(self):
+        """Close()
+
+        Finish the swf file and close it.
+
+        """
+        if self._fp is None:
+            return
+        fp, self._fp = self._fp, None
+        try:
+            if not self._count:
+                raise ValueError("Image list is empty!")
+            if not self._repeat:
+                DoActionTag("stop").WriteTag(fp)
+
+            # finish with end tag
+            fp.write("\x00\x00".encode("ascii"))
+
+            # set size and number of frames
+            sze = fp.tell()
+            fp.seek(4)
+            fp.write(intToUint32(sze))
+            fp.seek(self._nframesPos)
+            fp.write(intToUint16(self._nframes))
+        finally:
+            fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.Close()
+
+
 def writeSwf(filename, images, duration=0.1, repeat=True):
     """Write an swf-file from the specified images. If repeat is False,
     the movie is finished with a stop action. Duration may also
@@ -800,76 +855,28 @@ def writeSwf(filename, images, duration=0.1, repeat=True):
 
     Images should be a list consisting of PIL images or numpy arrays.
     The latter should be between 0 and 255 for integer types, and
-    between 0 and 1 for float types.
+    between 0 and 1 for float types. See SwfStreamWriter to write
+    frames one by one.
 
     """
 
-    # Check Numpy
-    if np is None:
-        raise RuntimeError("Need Numpy to write an SWF file.")
-
-    # Check images (make all Numpy)
-    images2 = []
-    images = checkImages(images)
+    # Check images
     if not images:
         raise ValueError("Image list is empty!")
-    for im in images:
-        if PIL and isinstance(im, PIL.Image.Image):
-            if im.mode == "P":
-                im = im.convert()
-            im = np.asarray(im)
-            if len(im.shape) == 0:
-                raise MemoryError("Too little memory to convert PIL image to array")
-        images2.append(im)
-
-    # Init
-    taglist = [FileAttributesTag(), SetBackgroundTag(0, 0, 0)]
 
     # Check duration
     if hasattr(duration, "__len__"):
-        if len(duration) == len(images2):
+        if len(duration) == len(images):
             duration = [d for d in duration]
         else:
             raise ValueError("len(duration) doesn't match amount of images.")
     else:
-        duration = [duration for im in images2]
+        duration = [duration for im in images]
 
-    # Build delays list
-    minDuration = float(min(duration))
-    delays = [round(d / minDuration) for d in duration]
-    delays = [max(1, int(d)) for d in delays]
-
-    # Get FPS
-    fps = 1.0 / minDuration
-
-    # Produce series of tags for each image
-    t0 = time.time()  # noqa
-    nframes = 0
-    for im in images2:
-        bm = BitmapTag(im)
-        wh = (im.shape[1], im.shape[0])
-        sh = ShapeTag(bm.id, (0, 0), wh)
-        po = PlaceObjectTag(1, sh.id, move=nframes > 0)
-        taglist.extend([bm, sh, po])
-        for i in range(delays[nframes]):
-            taglist.append(ShowFrameTag())
-        nframes += 1
-
-    if not repeat:
-        taglist.append(DoActionTag("stop"))
-
-    # Build file
-    t1 = time.time()  # noqa
-    fp = open(filename, "wb")
-    try:
-        buildFile(fp, taglist, nframes=nframes, framesize=wh, fps=fps)
-    except Exception:
-        raise
-    finally:
-        fp.close()
-    t2 = time.time()  # noqa
-
-    # print("Writing SWF took %1.2f and %1.2f seconds" % (t1-t0, t2-t1) )
+    # Write, using the minimum duration to get the FPS
+    with SwfStreamWriter(filename, min(duration), repeat) as writer:
+        for im, d in zip(images, duration):
+            writer.AddFrame(im, d)
 
 
 def _readPixels(bb, i, tagType, L1):
@@ -880,14 +887,8 @@ def _readPixels(bb, i, tagType, L1):
         raise RuntimeError("Need Numpy to read an SWF file.")
 
     # Get info
-    _charId = bb[i : i + 2]
-    i += 2
-    format = ord(bb[i : i + 1])
-    i += 1
-    width = bitsToInt(bb[i : i + 2], 16)
-    i += 2
-    height = bitsToInt(bb[i : i + 2], 16)
-    i += 2
+    _charId, format, width, height = struct.unpack("<HBHH", bb[i : i + 7])
+    i += 7
 
     # If we can, get pixeldata and make nunmpy array
     if format != 5:
@@ -910,15 +911,8 @@ def _readPixels(bb, i, tagType, L1):
                 # Byte align stuff might cause troubles
                 print("Cannot read image due to byte alignment")
         if tagType == 36:
-            # DefineBitsLossless2 - ARGB data
-            a.shape = height, width, 4
-            # Swap alpha channel to make RGBA
-            b = a
-            a = np.zeros_like(a)
-            a[:, :, 0] = b[:, :, 1]
-            a[:, :, 1] = b[:, :, 2]
-            a[:, :, 2] = b[:, :, 3]
-            a[:, :, 3] = b[:, :, 0]
+            # DefineBitsLossless2 - ARGB data, swap alpha channel to make RGBA
+            a = _fromARGB(a.reshape(height, width, 4))
 
         return a
 
@@ -946,65 +940,56 @@ def readSwf(filename, asNumpy=True):
     # Init images
     images = []
 
-    # Open file and read all
+    # Open file, tags are read one by one
     fp = open(filename, "rb")
-    bb = fp.read()
 
     try:
         # Check opening tag
+        bb = _readFrom(fp, 8)
         tmp = bb[0:3].decode("ascii", "ignore")
         if tmp.upper() == "FWS":
-            pass  # ok
+            f = fp  # ok
         elif tmp.upper() == "CWS":
             # Decompress movie
-            bb = bb[:8] + zlib.decompress(bb[8:])
+            f = io.BytesIO(zlib.decompress(fp.read()))
         else:
             raise IOError("Not a valid SWF file: " + str(filename))
 
-        # Set filepointer at first tag (skipping framesize RECT and two uin16's
-        i = 8
-        nbits = bitsToInt(bb[i : i + 1], 5)  # skip FrameSize
+        # Skip framesize RECT and two uin16's
+        nbits = bitsToInt(_readFrom(f, 1), 5)
         nbits = 5 + nbits * 4
-        Lrect = nbits / 8.0
-        if Lrect % 1:
-            Lrect += 1
-        Lrect = int(Lrect)
-        i += Lrect + 4
+        Lrect = (nbits + 7) // 8
+        f.seek(Lrect - 1 + 4, 1)
 
         # Iterate over the tags
-        counter = 0
         while True:
-            counter += 1
-
             # Get tag header
-            head = bb[i : i + 6]
-            if not head:
+            head = _readFrom(f, 2)
+            if len(head) < 2:
                 break  # Done (we missed end tag)
+            if head[0] & 63 == 63:
+                head += _readFrom(f, 4)
 
             # Determine type and length
             T, L1, L2 = getTypeAndLen(head)
             if not L2:
                 print("Invalid tag length, could not proceed")
                 break
-            # print(T, L2)
 
-            # Read image if we can
+            # Read image if we can, skip other tags
             if T in [20, 36]:
-                im = _readPixels(bb, i + 6, T, L1)
+                im = _readPixels(_readFrom(f, L1), 0, T, L1)
                 if im is not None:
                     images.append(im)
-            elif T in [6, 21, 35, 90]:
-                print("Ignoring JPEG image: cannot read JPEG.")
             else:
-                pass  # Not an image tag
+                if T in [6, 21, 35, 90]:
+                    print("Ignoring JPEG image: cannot read JPEG.")
+                f.seek(L1, 1)
 
             # Detect end tag
             if T == 0:
                 break
 
-            # Next tag!
-            i += L2
-
     finally:
         fp.close()
 
@@ -22,3 +22,5 @@ from visvis.wobjects.textures import MotionTexture2D, MotionTexture3D
 from visvis.wobjects.sliceTextures import SliceTexture, SliceTextureProxy
 from visvis.wobjects.polygonalModeling import Mesh, OrientableMesh
 from visvis.wobjects.motion import MotionDataContainer, MotionMixin, MotionSyncer
+from visvis.wobjects.instancedMesh import InstancedMesh
+from visvis.wobjects.meshBatch import MeshBatch
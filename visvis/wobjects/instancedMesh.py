@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012, Almar Klein
+#
+# Visvis is distributed under the terms of the (new) BSD License.
+# The full license can be found in 'license.txt'.
+
+"""Module instancedMesh
+
+Defines the InstancedMesh wobject, which draws one mesh many times with
+per-instance translation, scaling, rotation and color.
+
+"""
+
+import numpy as np
+import OpenGL.GL as gl
+
+import visvis as vv
+from visvis.core.misc import DrawAfter, getOpenGlCapable
+from visvis.core import shaders
+from visvis import Wobject
+from visvis.wobjects.polygonalModeling import BaseMesh, Mesh, processing
+
+
+def rotateByQuaternions(pp, qq):
+    """rotateByQuaternions(pp, qq)
+
+    Rotate the Nx3 vectors pp using the Nx4 unit quaternions qq (w, x, y, z).
+    The arrays should be broadcastable against each-other.
+
+    """
+    w, u = qq[..., :1], qq[..., 1:]
+    t = 2.0 * np.cross(u, pp)
+    return pp + w * t + np.cross(u, t)
+
+
+def _checkInstanceArray(value, n, ncols, name):
+    """Coerce value in a float32 array of n rows and ncols columns."""
+    value = np.asarray(value, dtype=np.float32)
+    if value.ndim == 0:
+        value = np.full((n, ncols), value, np.float32)  # scalar for all
+    elif value.ndim == 1 and value.size == ncols:
+        value = np.tile(value, (n, 1))  # one value for all instances
+    elif value.ndim == 1 and value.size == n and ncols == 3:
+        value = np.repeat(value.reshape(n, 1), 3, 1)  # isotropic scaling
+    elif value.shape == (n, 1) and ncols == 3:
+        value = np.repeat(value, 3, 1)  # isotropic scaling, unambiguous
+    if value.shape != (n, ncols):
+        raise ValueError("The %s should be an array of %i x %i." % (name, n, ncols))
+    return np.ascontiguousarray(value)
+
+
+class InstancedMesh(Mesh):
+    """InstancedMesh(parent, baseMesh, translations, scalings=None,
+                        rotations=None, colors=None)
+
+    An InstancedMesh draws one base mesh many times, each instance with
+    its own translation, scaling, rotation and color. This is much more
+    efficient than creating a separate Mesh object for each instance,
+    since all instances are drawn with a single draw call.
+
+    If the OpenGl version is 3.3 or higher, hardware instancing is
+    used. Otherwise the instances are merged into one large mesh on
+    the CPU. The material and shading properties are shared by all
+    instances (see the Mesh class).
+
+    Parameters
+    ----------
+    baseMesh : BaseMesh
+        The mesh to draw for each instance.
+    translations : Nx3 numpy array
+        The position of each instance. This also defines the number of
+        instances.
+    scalings : (optional) scalar, N, Nx1 or Nx3 numpy array
+        The scaling of each instance. Default 1. Note that an array of
+        3 values is applied to all instances if there are 3 instances;
+        use an Nx1 array to specify an isotropic scaling per instance.
+    rotations : (optional) Nx4 numpy array
+        The rotation of each instance, expressed as a unit quaternion
+        (w, x, y, z). See vv.Quaternion. Default no rotation.
+    colors : (optional) Nx3 or Nx4 numpy array
+        The color of each instance. If not given, the faceColor (and the
+        values of the base mesh) are used.
+
+    """
+
+    def __init__(self, parent, baseMesh, translations, **kwargs):
+        # Make sure that the base mesh has normals
+        baseMesh = BaseMesh(baseMesh)
+        if baseMesh._normals is None:
+            processing.calculateNormals(baseMesh)
+        self._baseMesh = baseMesh
+
+        # Init instance data
+        self._translations = np.zeros((0, 3), np.float32)
+        self._scalings = self._translations
+        self._rotations = np.zeros((0, 4), np.float32)
+        self._instanceColors = None
+
+        # Whether to use hardware instancing. Determined on first draw.
+        self._useInstancing = None
+        self._dataIsDirty = True
+
+        # Init as a mesh. The actual data is set at drawing time.
+        Mesh.__init__(self, parent, baseMesh)
+        for shader in [self.faceShader, self.edgeShader, self.shapeShader]:
+            shader.vertex.AddPart(shaders.SH_MV_INSTANCING)
+
+        # Set instance data
+        self.SetInstances(translations, **kwargs)
+
+    @DrawAfter
+    def SetBaseMesh(self, baseMesh):
+        """SetBaseMesh(baseMesh)
+
+        Set the mesh that is drawn for each instance.
+
+        """
+        baseMesh = BaseMesh(baseMesh)
+        if baseMesh._normals is None:
+            processing.calculateNormals(baseMesh)
+        self._baseMesh = baseMesh
+        self._dataIsDirty = True
+
+    @DrawAfter
+    def SetInstances(
+        self, translations=None, scalings=None, rotations=None, colors=None
+    ):
+        """SetInstances(translations=None, scalings=None, rotations=None,
+                        colors=None)
+
+        Set the per-instance data. Arguments that are not given are left
+        unchanged, unless translations changes the number of instances,
+        in which case they are reset to their defaults (colors are reset
+        to None). To remove the per-instance colors, use SetInstances(
+        colors=False).
+
+        """
+        n = len(self._translations)
+
+        # Translations determine the number of instances
+        if translations is not None:
+            translations = np.asarray(translations, dtype=np.float32)
+            if translations.ndim != 2 or translations.shape[1] != 3:
+                raise ValueError("The translations should be an Nx3 array.")
+            if len(translations) != n:
+                n = len(translations)
+                self._scalings = np.ones((n, 3), np.float32)
+                self._rotations = np.zeros((n, 4), np.float32)
+                self._rotations[:, 0] = 1.0
+                self._instanceColors = None
+            self._translations = np.ascontiguousarray(translations)
+
+        # Other data
+        if scalings is not None:
+            self._scalings = _checkInstanceArray(scalings, n, 3, "scalings")
+        if rotations is not None:
+            rotations = _checkInstanceArray(rotations, n, 4, "rotations")
+            norms = np.sqrt((rotations**2).sum(1)).reshape(n, 1)
+            if (norms == 0).any():
+                raise ValueError("Quaternions cannot have 0-length.")
+            self._rotations = rotations / norms
+        if colors is False:
+            self._instanceColors = None
+        elif colors is not None:
+            colors = np.asarray(colors, dtype=np.float32)
+            if colors.shape[-1:] == (3,):
+                alpha = np.ones(colors.shape[:-1] + (1,), np.float32)
+                colors = np.concatenate([colors, alpha], -1)
+            self._instanceColors = _checkInstanceArray(colors, n, 4, "colors")
+
+        self._dataIsDirty = True
+
+    @property
+    def instanceCount(self):
+        """Get the number of instances."""
+        return len(self._translations)
+
+    @property
+    def translations(self):
+        """Get the Nx3 array of translations of the instances.
+        Use SetInstances() to change.
+        """
+        return self._translations
+
+    @property
+    def scalings(self):
+        """Get the Nx3 array of scalings of the instances.
+        Use SetInstances() to change.
+        """
+        return self._scalings
+
+    @property
+    def rotations(self):
+        """Get the Nx4 array of rotations (quaternions) of the instances.
+        Use SetInstances() to change.
+        """
+        return self._rotations
+
+    @property
+    def instanceColors(self):
+        """Get the Nx4 array of colors of the instances, or None.
+        Use SetInstances() to change.
+        """
+        return self._instanceColors
+
+    ## Producing the data to draw
+
+    def _GetMergedData(self):
+        """_GetMergedData()
+
+        Get the vertices, faces, normals and values of all instances
+        merged together in one mesh.
+
+        """
+        base = self._baseMesh
+        n, nv = len(self._translations), len(base._vertices)
+        tt = self._translations.reshape(n, 1, 3)
+        ss = self._scalings.reshape(n, 1, 3)
+        qq = self._rotations.reshape(n, 1, 4)
+
+        # Transform vertices and normals. Normals are scaled with the
+        # adjugate of the scale matrix, which also works for zero scales.
+        vertices = rotateByQuaternions(base._vertices * ss, qq) + tt
+        ss_adj = ss[..., [1, 2, 0]] * ss[..., [2, 0, 1]]
+        normals = rotateByQuaternions(base._normals * ss_adj, qq)
+        vertices = vertices.reshape(n * nv, 3).astype(np.float32)
+        normals = normals.reshape(n * nv, 3).astype(np.float32)
+
+        # Offset face indices for each instance
+        if base._faces is None:
+            faces = None
+        else:
+            offsets = np.arange(n, dtype=np.uint32).reshape(n, 1) * nv
+            faces = (base._faces.astype(np.uint32) + offsets).ravel()
+
+        # Colors or values
+        if self._instanceColors is not None:
+            values = np.repeat(self._instanceColors, nv, 0)
+        elif base._values is not None:
+            values = np.tile(base._values, (n, 1))
+        else:
+            values = None
+
+        return vertices, faces, normals, values
+
+    def _UpdateData(self):
+        """_UpdateData()
+
+        Prepare the data to draw. Called at the start of drawing.
+
+        """
+
+        # Determine whether we can use hardware instancing
+        if self._useInstancing is None:
+            self._useInstancing = bool(
+                self.faceShader.isUsable
+                and not self.useNativeShading
+                and getOpenGlCapable("3.3")
+            )
+            if not self._useInstancing:
+                self._DisableInstancing()
+
+        if not self._dataIsDirty:
+            return
+        self._dataIsDirty = False
+
+        base = self._baseMesh
+        if self._useInstancing:
+            # Draw the base mesh, per-instance data is applied in the shader
+            vertices, faces, normals = base._vertices, base._faces, base._normals
+            values = base._values
+            if self._instanceColors is not None:
+                # Colors come from the instances, these are multiplied
+                values = np.ones((len(vertices), 4), np.float32)
+        else:
+            vertices, faces, normals, values = self._GetMergedData()
+
+        # Set data directly (the set methods call Draw() and check the data)
+        self._verticesPerFace = base._verticesPerFace
+        self._vertices, self._faces, self._normals = vertices, faces, normals
+        self._flatNormals = None
+        self.SetValues(values)
+
+    def _DisableInstancing(self):
+        """Fall back to drawing the instances as one merged mesh."""
+        self._useInstancing = False
+        self._dataIsDirty = True
+        for shader in [self.faceShader, self.edgeShader, self.shapeShader]:
+            shader.vertex.RemovePart(shaders.SH_MV_INSTANCING)
+
+    def _Draw(self, shading, refColor, shader):
+        if not len(self._translations):
+            return
+        self._UpdateData()
+        Mesh._Draw(self, shading, refColor, shader)
+
+    def _DrawPrimitives(self, shader):
+        # Use the merged mesh if not instancing
+        if not self._useInstancing:
+            return Mesh._DrawPrimitives(self, shader)
+
+        # If the shader did not compile, fall back to the merged mesh
+        program = shader.program
+        if not program._IsCompiled():
+            self._DisableInstancing()
+            vv.callLater(0.0, self.Draw)
+            return
+
+        # Set per-instance attributes
+        n = len(self._translations)
+        locs = []
+        attributes = [
+            ("instanceTranslation", 3, self._translations),
+            ("instanceScale", 3, self._scalings),
+            ("instanceRotation", 4, np.roll(self._rotations, -1, 1)),  # xyzw
+            ("instanceColor", 4, self._instanceColors),
+        ]
+        for name, size, data in attributes:
+            loc = gl.glGetAttribLocation(program._programId, name.encode("ascii"))
+            if loc < 0:
+                continue  # Optimized away
+            if data is None:
+                gl.glVertexAttrib4f(loc, 1.0, 1.0, 1.0, 1.0)
+                continue
+            gl.glEnableVertexAttribArray(loc)
+            gl.glVertexAttribPointer(loc, size, gl.GL_FLOAT, gl.GL_FALSE, 0, data)
+            gl.glVertexAttribDivisor(loc, 1)
+            locs.append(loc)
+
+        # Draw
+        type = {3: gl.GL_TRIANGLES, 4: gl.GL_QUADS}[self._verticesPerFace]
+        if self._faces is None:
+            gl.glDrawArraysInstanced(type, 0, self._vertices.shape[0], n)
+        else:
+            if self._faces.dtype == np.uint8:
+                face_dtype = gl.GL_UNSIGNED_BYTE
+            elif self._faces.dtype == np.uint16:
+                face_dtype = gl.GL_UNSIGNED_SHORT
+            else:
+                face_dtype = gl.GL_UNSIGNED_INT
+            N = self._faces.size
+            gl.glDrawElementsInstanced(type, N, face_dtype, self._faces, n)
+
+        # Clean up
+        for loc in locs:
+            gl.glVertexAttribDivisor(loc, 0)
+            gl.glDisableVertexAttribArray(loc)
+
+    def _GetLimits(self):
+        """_GetLimits()
+
+        Get the limits in world coordinates between which the object exists.
+
+        """
+        n = len(self._translations)
+        v = self._baseMesh._vertices
+        if not n or v is None or not len(v):
+            return None
+
+        # Get the corners of the base mesh for each instance
+        mi, ma = np.nanmin(v, 0), np.nanmax(v, 0)
+        corners = np.array(
+            [
+                (x, y, z)
+                for x in (mi[0], ma[0])
+                for y in (mi[1], ma[1])
+                for z in (mi[2], ma[2])
+            ],
+            dtype=np.float64,
+        )
+        ss = self._scalings.reshape(n, 1, 3)
+        qq = self._rotations.reshape(n, 1, 4).astype(np.float64)
+        pp = rotateByQuaternions(corners * ss, qq) + self._translations.reshape(n, 1, 3)
+        pp = pp.reshape(n * 8, 3)
+
+        # There we are
+        x1, y1, z1 = pp.min(0)
+        x2, y2, z2 = pp.max(0)
+        return Wobject._GetLimits(self, x1, x2, y1, y2, z1, z2)
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012, Almar Klein
+#
+# Visvis is distributed under the terms of the (new) BSD License.
+# The full license can be found in 'license.txt'.
+
+"""Module meshBatch
+
+Defines the MeshBatch wobject, a container that draws its (static) child
+meshes merged into a few large meshes.
+
+"""
+
+import weakref
+
+import numpy as np
+import OpenGL.GL as gl
+
+from visvis import Wobject
+from visvis.core.base import DRAW_NORMAL, DRAW_FAST, DRAW_SHAPE
+from visvis.core.misc import Transform_Scale, Transform_Rotate
+from visvis.utils.pypoints import Quaternion
+from visvis.wobjects.polygonalModeling import Mesh, processing
+
+
+def _TransformNormals(wobject, normals):
+    """_TransformNormals(wobject, normals)
+
+    Apply the transformations of the given wobject (only) to the normals
+    in the given Nx3 array. Translations do not affect normals, scalings
+    are applied using the adjugate of the scale matrix. Returns a new array.
+
+    """
+    normals = np.array(normals, dtype=np.float64)
+    for t in reversed(wobject._transformations):
+        if isinstance(t, Transform_Scale):
+            normals *= (t.sy * t.sz, t.sx * t.sz, t.sx * t.sy)
+        elif isinstance(t, Transform_Rotate):
+            angle = float(t.angle * np.pi / 180.0)
+            q = Quaternion.create_from_axis_angle(angle, t.ax, t.ay, t.az)
+            w, u = q.w, np.array([q.x, q.y, q.z])
+            uv = np.cross(u, normals)
+            normals += 2.0 * w * uv + 2.0 * np.cross(u, uv)
+    return normals
+
+
+def _isScalar(value):
+    return isinstance(value, (int, float))
+
+
+class _Batch(Mesh):
+    """_Batch(owner, refMesh)
+
+    A mesh that holds the merged data of a group of meshes in a MeshBatch
+    that share the same material. It is not part of the object tree, but
+    draws in the axes of its owner.
+
+    """
+
+    def __init__(self, owner, refMesh):
+        self._owner = weakref.ref(owner)
+        Mesh.__init__(self, None, np.zeros((0, 3), np.float32))
+
+        # The parts and per-part vertex ranges
+        self._parts = []
+        self._counts = np.zeros((0,), np.int64)
+        self._visibility = None
+
+        # Copy material from the reference mesh
+        self._bakeColors = _Batch.CanBakeColors(refMesh)
+        self._verticesPerFace = refMesh._verticesPerFace
+        self._ambient = refMesh._ambient
+        self._diffuse = refMesh._diffuse
+        self._specular = refMesh._specular
+        self._shininess = refMesh._shininess
+        self._emission = refMesh._emission
+        self._edgeColor = refMesh._edgeColor
+        self._cullFaces = refMesh._cullFaces
+        self._useNativeShading = refMesh._useNativeShading
+        self._faceShading = refMesh._faceShading
+        self._edgeShading = refMesh._edgeShading
+        self._SetShading(self._faceShading, self.faceShader)
+        self._SetShading(self._edgeShading, self.edgeShader)
+        if self._bakeColors:
+            self._faceColor = (1.0, 1.0, 1.0, 1.0)
+        else:
+            self._faceColor = refMesh._faceColor
+
+    @staticmethod
+    def CanBakeColors(mesh):
+        """Get whether the faceColor of the given mesh can be multiplied
+        into its vertex colors without changing its appearance.
+        """
+        return (
+            _isScalar(mesh._ambient)
+            and _isScalar(mesh._diffuse)
+            and _isScalar(mesh._emission)
+            and mesh._emission == 0
+        )
+
+    @staticmethod
+    def GetKey(mesh):
+        """Get the key that identifies the batch that the given mesh
+        can be part of, or None if the mesh cannot be batched.
+        """
+
+        # Only plain meshes without texture, colormap or children
+        if not isinstance(mesh, Mesh) or isinstance(mesh, _Batch):
+            return None
+        if type(mesh)._Draw is not Mesh._Draw or type(mesh).OnDraw is not Mesh.OnDraw:
+            return None
+        if mesh._children or mesh._texture is not None or mesh._vertices is None:
+            return None
+        if mesh._values is not None and mesh._values.shape[1] not in (3, 4):
+            return None
+
+        # Material and shading
+        key = (
+            mesh._verticesPerFace,
+            mesh._faceShading,
+            mesh._edgeShading,
+            tuple(mesh._edgeColor),
+            mesh._ambient,
+            mesh._diffuse,
+            mesh._specular,
+            mesh._shininess,
+            mesh._emission,
+            mesh._cullFaces,
+            bool(mesh.useNativeShading),
+        )
+        if _Batch.CanBakeColors(mesh):
+            return key
+        else:
+            # Need same reference color, and vertex colors all or nothing
+            valuesKind = None if mesh._values is None else mesh._values.shape[1]
+            return key + (tuple(mesh._faceColor), valuesKind)
+
+    def Draw(self, fast=False):
+        # Changes are tracked by the owner, so there is no need to redraw
+        pass
+
+    def GetAxes(self):
+        owner = self._owner()
+        if owner is not None:
+            return owner.GetAxes()
+
+    def GetFigure(self):
+        owner = self._owner()
+        if owner is not None:
+            return owner.GetFigure()
+
+    def SetParts(self, parts):
+        """SetParts(parts)
+
+        Merge the data of the given meshes. The meshes are unwound, so
+        that each mesh occupies a contiguous range of vertices.
+
+        """
+        self._parts = parts
+        verticesList, normalsList, valuesList = [], [], []
+        for mesh in parts:
+            if mesh._normals is None:
+                processing.calculateNormals(mesh)
+            vertices, normals = mesh._vertices, mesh._normals
+            values = mesh._values2
+            if mesh._faces is not None:
+                vertices, normals = vertices[mesh._faces], normals[mesh._faces]
+                if values is not None:
+                    values = values[mesh._faces]
+            verticesList.append(mesh._TransformPoints(vertices))
+            normalsList.append(_TransformNormals(mesh, normals))
+            # Colors
+            if self._bakeColors:
+                clr = np.array(mesh._faceColor, np.float32)
+                if values is None:
+                    values = np.tile(clr, (len(vertices), 1))
+                elif values.shape[1] == 3:
+                    values = np.column_stack([values * clr[:3], np.ones(len(values))])
+                else:
+                    values = values * clr  # Like the shader, alpha from values
+            if values is not None:
+                valuesList.append(values)
+
+        # Store merged data (set directly, the set methods call Draw())
+        self._counts = np.array([len(v) for v in verticesList], np.int64)
+        self._vertices = np.concatenate(verticesList).astype(np.float32)
+        self._normals = np.concatenate(normalsList).astype(np.float32)
+        self._faces = None
+        self._flatNormals = None
+        if valuesList:
+            self._values = np.concatenate(valuesList).astype(np.float32)
+        else:
+            self._values = None
+        self._values2 = self._values
+
+        # Calculate flat normals now, while we have no faces
+        if "flat" in (self._faceShading, self._edgeShading):
+            processing.calculateFlatNormals(self)
+
+        # Force updating visibility
+        self._visibility = None
+        self.UpdateVisibility()
+
+    def UpdateVisibility(self):
+        """UpdateVisibility()
+
+        Update the faces so that only the visible parts are drawn.
+
+        """
+        visibility = tuple(mesh._visible for mesh in self._parts)
+        if visibility == self._visibility:
+            return
+        self._visibility = visibility
+        if all(visibility):
+            self._faces = None
+        else:
+            self._faces = self._GetIndices(np.array(visibility, bool))
+
+    def _GetIndices(self, mask):
+        """Get the vertex indices of the parts selected in the mask."""
+        vertexMask = np.repeat(mask, self._counts)
+        return np.arange(len(self._vertices), dtype=np.uint32)[vertexMask]
+
+    def DrawShape(self, pickerHelper, ownerColor=None):
+        """DrawShape(pickerHelper, ownerColor=None)
+
+        Draw the shape of each visible part that is pickable in the color
+        that corresponds to its id. Other parts are drawn in ownerColor,
+        or not at all if it is None.
+
+        """
+        # Get color for each part
+        colors = np.zeros((len(self._parts), 4), np.float32)
+        mask = np.zeros((len(self._parts),), bool)
+        for i, mesh in enumerate(self._parts):
+            if not mesh._visible:
+                continue
+            if mesh._hitTest:
+                colors[i, :3] = pickerHelper.GetColorFromId(mesh._id)
+            elif ownerColor is not None:
+                colors[i, :3] = ownerColor
+            else:
+                continue
+            colors[i, 3] = 1.0
+            mask[i] = True
+        if not mask.any():
+            return
+
+        # Draw with per-vertex colors
+        values, faces = self._values, self._faces
+        try:
+            self._values = self._values2 = np.repeat(colors, self._counts, 0)
+            self._faces = None if mask.all() else self._GetIndices(mask)
+            self._Draw("plain", (1, 1, 1, 1), self.shapeShader)
+        finally:
+            self._values = self._values2 = values
+            self._faces = faces
+
+
+class MeshBatch(Wobject):
+    """MeshBatch(parent)
+
+    A MeshBatch is a container for (many) static Mesh objects. Instead of
+    drawing each mesh separately, it merges the child meshes that share
+    the same material and shading properties into large shared arrays,
+    which are drawn with a single draw call. This greatly improves the
+    performance for scenes with thousands of small meshes.
+
+    The child meshes stay regular wobjects: their properties can be changed,
+    they can be made invisible, and they can be picked (i.e. receive mouse
+    events) individually. When a child mesh changes (i.e. its Draw() method
+    is called, as happens when its data or properties are set), only the
+    batch that it belongs to is rebuilt. After modifying the data of a
+    child mesh in place, call its Draw() method. Changing the visibility
+    of a child mesh does not require a rebuild. The transformations of
+    the child meshes are applied when merging them; changing them (also
+    without calling Draw()) rebuilds the batch.
+
+    Meshes that use a colormap or texture, that have children of their
+    own, or that are not plain Mesh objects are drawn as usual.
+
+    """
+
+    def __init__(self, parent):
+        Wobject.__init__(self, parent)
+
+        # The batches: key -> _Batch
+        self._batches = {}
+
+        # The signature of each batched child mesh: mesh -> signature
+        self._signatures = {}
+
+        # Whether the batches need to be checked for changes
+        self._needSync = True
+
+    @property
+    def batchCount(self):
+        """Get the number of batches (i.e. the number of draw calls
+        for the batched meshes).
+        """
+        self._CheckSync()
+        return len(self._batches)
+
+    def _GetSignature(self, mesh):
+        """Get the signature for the given mesh. The first element is
+        the key of the batch. Returns None if the mesh cannot be batched.
+        """
+        key = _Batch.GetKey(mesh)
+        if key is None:
+            return None
+        arrays = mesh._vertices, mesh._faces, mesh._normals, mesh._values2
+        return (
+            key,
+            arrays,
+            tuple(mesh._faceColor),
+            mesh._GetTransformationsKey(),
+            mesh._changeCount,
+        )
+
+    def _SignatureChanged(self, sig1, sig2):
+        if sig1 is None or sig2 is None:
+            return sig1 is not sig2
+        if sig1[0] != sig2[0] or sig1[2:] != sig2[2:]:
+            return True
+        return any(a is not b for a, b in zip(sig1[1], sig2[1]))
+
+    def _SyncBatches(self):
+        """_SyncBatches()
+
+        Detect which child meshes have changed, and rebuild the batches
+        that they belong to (or belonged to).
+
+        """
+        self._needSync = False
+
+        # Get new signatures and collect the keys of batches that changed
+        signatures = {}
+        dirtyKeys = set()
+        for mesh in self._children:
+            sig = self._GetSignature(mesh)
+            if sig is None:
+                continue
+            signatures[mesh] = sig
+            oldSig = self._signatures.get(mesh, None)
+            if self._SignatureChanged(sig, oldSig):
+                dirtyKeys.add(sig[0])
+                if oldSig is not None:
+                    dirtyKeys.add(oldSig[0])
+        for mesh, oldSig in self._signatures.items():
+            if mesh not in signatures:
+                dirtyKeys.add(oldSig[0])
+        self._signatures = signatures
+
+        # Rebuild dirty batches
+        for key in dirtyKeys:
+            parts = [m for m in self._children if signatures.get(m, (None,))[0] == key]
+            batch = self._batches.get(key, None)
+            if not parts:
+                self._batches.pop(key)
+                batch.Destroy()
+                continue
+            elif batch is None:
+                batch = self._batches[key] = _Batch(self, parts[0])
+            batch.SetParts(parts)
+
+        # Update visibility of the other batches
+        for batch in self._batches.values():
+            batch.UpdateVisibility()
+
+    def _GetLimits(self, *args):
+        # The cached limits are invalidated when Draw() is called on a
+        # child, or when the transformations of a child change, which is
+        # our cue to check for changes.
+        self._needSync = True
+        return Wobject._GetLimits(self, *args)
+
+    def _CheckSync(self):
+        """Rebuild the batches if a child may have changed."""
+        self._GetCachedLimits()
+        if self._needSync:
+            self._SyncBatches()
+
+    def _DrawTree(self, mode=DRAW_NORMAL, pickerHelper=None):
+        """Draw the batches and the children that are not batched."""
+
+        # are we alive and visible
+        if self._destroyed:
+            print("Warning, cannot draw destroyed object: %s" % str(self))
+            return
+        if not self.visible:
+            return
+
+        # Rebuild batches if necessary
+        self._CheckSync()
+
+        # transform
+        gl.glPushMatrix()
+        self._Transform()
+
+        # draw batches and children
+        self._isbeingdrawn = True
+        try:
+            if mode in (DRAW_NORMAL, DRAW_FAST):
+                for batch in self._batches.values():
+                    if batch._faces is None or len(batch._faces):
+                        batch.OnDraw()
+            elif mode == DRAW_SHAPE:
+                ownerColor = None
+                if self._hitTest:
+                    ownerColor = pickerHelper.GetColorFromId(self._id)
+                for batch in self._batches.values():
+                    batch.DrawShape(pickerHelper, ownerColor)
+            for item in self._children:
+                if item not in self._signatures:
+                    item._DrawTree(mode, pickerHelper)
+        finally:
+            self._isbeingdrawn = False
+
+        # transform back
+        gl.glPopMatrix()
+
+    def OnDestroyGl(self):
+        for batch in self._batches.values():
+            batch.DestroyGl(False)
+
+    def OnDestroy(self):
+        Wobject.OnDestroy(self)
+        for batch in self._batches.values():
+            batch.Destroy(False)
+        self._batches = {}
+        self._signatures = {}
@@ -16,7 +16,7 @@ import numpy as np
 import OpenGL.GL as gl
 
 from visvis.utils.pypoints import is_Pointset
-from visvis.core.misc import PropWithDraw, DrawAfter, basestring
+from visvis.core.misc import Property, PropWithDraw, DrawAfter, basestring
 from visvis import Wobject, Colormapable, OrientationForWobjects_mixClass
 from visvis.core.light import _testColor, _getColor
 from visvis.wobjects.textures import TextureObjectToVisualize
@@ -868,6 +868,35 @@ class Mesh(Wobject, BaseMesh, Colormapable):
 
     ## Method implementations to function as a proper wobject
 
+    # Counts the calls to Draw(), so that a MeshBatch can detect changes,
+    # also when the data is modified in place.
+    _changeCount = 0
+
+    def Draw(self, fast=False):
+        """Draw(fast=False)
+
+        Calls Draw on the axes that contains this object. Call this method
+        after modifying the data of the mesh in place.
+
+        """
+        self._changeCount += 1
+        return Wobject.Draw(self, fast)
+
+    @Property
+    def visible():
+        """Get/Set whether the object should be drawn or not.
+        If set to False, the hittest is also not performed.
+        """
+
+        def fget(self):
+            return self._visible
+
+        def fset(self, value):
+            self._visible = bool(value)
+            Wobject.Draw(self)  # The data did not change
+
+        return locals()
+
     def _GetLimits(self):
         """_GetLimits()
 
@@ -1057,20 +1086,7 @@ class Mesh(Wobject, BaseMesh, Colormapable):
                 shader.EnableTextureOnly("texture")
 
         # Draw
-        type = {3: gl.GL_TRIANGLES, 4: gl.GL_QUADS}[self._verticesPerFace]
-        if self._faces is None:
-            gl.glDrawArrays(type, 0, self._vertices.shape[0])
-        else:
-            # Get data type
-            if self._faces.dtype == np.uint8:
-                face_dtype = gl.GL_UNSIGNED_BYTE
-            elif self._faces.dtype == np.uint16:
-                face_dtype = gl.GL_UNSIGNED_SHORT
-            else:
-                face_dtype = gl.GL_UNSIGNED_INT
-            # Go
-            N = self._faces.size
-            gl.glDrawElements(type, N, face_dtype, self._faces)
+        self._DrawPrimitives(shader)
 
         # Clean up
         gl.glFlush()
@@ -1088,6 +1104,28 @@ class Mesh(Wobject, BaseMesh, Colormapable):
         gl.glDisable(gl.GL_NORMALIZE)
         gl.glDisable(gl.GL_CULL_FACE)
 
+    def _DrawPrimitives(self, shader):
+        """_DrawPrimitives(shader)
+
+        Issue the draw call for the faces, using the arrays that have been
+        set up by _Draw(). The given shader is enabled if GLSL is used.
+
+        """
+        type = {3: gl.GL_TRIANGLES, 4: gl.GL_QUADS}[self._verticesPerFace]
+        if self._faces is None:
+            gl.glDrawArrays(type, 0, self._vertices.shape[0])
+        else:
+            # Get data type
+            if self._faces.dtype == np.uint8:
+                face_dtype = gl.GL_UNSIGNED_BYTE
+            elif self._faces.dtype == np.uint16:
+                face_dtype = gl.GL_UNSIGNED_SHORT
+            else:
+                face_dtype = gl.GL_UNSIGNED_INT
+            # Go
+            N = self._faces.size
+            gl.glDrawElements(type, N, face_dtype, self._faces)
+
     def _EnsureRightNumberOfLights(self, axes, shader):
         # Check number of lights in axes
         nlights = 1
@@ -24,6 +24,7 @@ import OpenGL.GL as gl
 import numpy as np
 
 from visvis.utils.pypoints import Pointset
+from visvis.utils.volumeSource import VolumeSource
 
 #
 from visvis import Range, Wobject, Colormapable
@@ -55,10 +56,15 @@ climCorrection = {
 def minmax(data):
     """minmax(data)
 
-    Get the min and max of the data, ignoring inf and nan.
+    Get the min and max of the data, ignoring inf and nan. For a
+    VolumeSource, the min and max are estimated from a few slices.
 
     """
 
+    # Do not read all data of a VolumeSource
+    if isinstance(data, VolumeSource):
+        return data.GetRange()
+
     # Check for inf and nan
     M1 = np.isnan(data)
     M2 = np.isinf(data)
@@ -207,7 +213,7 @@ class BaseTexture(Wobject, Colormapable):
 
     def __init__(self, parent, data):
         # Check data first
-        if not isinstance(data, np.ndarray):
+        if not isinstance(data, (np.ndarray, VolumeSource)):
             raise ValueError("Textures can only be described using Numpy arrays.")
 
         # Instantiate as wobject (after making "sure" this texture can be ok)